@@ -0,0 +1,24 @@
+import hmac
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+# Operator endpoints under /api/admin, for scripts rather than browsers.
+#
+# They take `Authorization: Bearer <ADMIN_TOKEN>` instead of a login session.
+# With ADMIN_TOKEN unset (the default) they answer 404, as if they did not
+# exist.
+
+
+def token_required(view):
+    """Allow the request only with the configured ADMIN_TOKEN."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('ADMIN_TOKEN')
+        if not token:
+            return jsonify({'error': 'Not found'}), 404
+        scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(given.encode(), token.encode()):
+            return jsonify({'error': 'Invalid admin token'}), 401, {'WWW-Authenticate': 'Bearer'}
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Date, cast, func, literal, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+
+from dashboard import SENTIMENTS
+from models import db, User, Feedback, FeedbackArchive, SentimentRollup
+
+# Sentiment trend analytics (GET /api/analytics/sentiment-trend).
+#
+# sentiment_rollup holds one count per (manager, granularity, bucket,
+# employee, sentiment). Write routes update the affected cells in the same
+# transaction as the Feedback change, with one upsert per request, so a trend
+# reads at most employees x periods x sentiments rows whatever the size of
+# the feedback table. A feedback row stays in the bucket of its created_at;
+# editing its sentiment moves one count between sentiments in that bucket.
+#
+# Archiving feedback (archive.py) leaves the rollup as it is, and
+# `flask backfill-sentiment-rollup` rebuilds it from Feedback and
+# FeedbackArchive together.
+
+GRANULARITIES = ('week', 'month')
+DEFAULT_PERIODS = 12
+MAX_PERIODS = 104
+ROLLUP_COLUMNS = ['manager_id', 'granularity', 'bucket_start', 'employee_id', 'sentiment', 'count']
+
+
+def bucket_start(granularity, moment):
+    """First day of the week (Monday) or month containing `moment`."""
+    day = moment.date() if isinstance(moment, datetime) else moment
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def bucket_starts(granularity, today, periods):
+    """The last `periods` bucket starts up to and including today's, oldest first."""
+    current = bucket_start(granularity, today)
+    if granularity == 'week':
+        return [current - timedelta(weeks=n) for n in range(periods - 1, -1, -1)]
+    months = current.year * 12 + current.month - 1
+    return [date((months - n) // 12, (months - n) % 12 + 1, 1) for n in range(periods - 1, -1, -1)]
+
+
+def _insert(dialect_name):
+    return postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+
+
+def _apply(deltas):
+    """Add count deltas keyed by rollup cell in one INSERT ... ON CONFLICT."""
+    rows = [dict(zip(ROLLUP_COLUMNS, (*cell, delta))) for cell, delta in deltas.items() if delta]
+    if not rows:
+        return
+    insert = _insert(db.session.get_bind().dialect.name)
+    statement = insert(SentimentRollup).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=ROLLUP_COLUMNS[:-1],
+        set_={'count': SentimentRollup.count + statement.excluded['count']}
+    ))
+
+
+def _add(deltas, manager_id, employee_id, created_at, sentiment, delta):
+    if sentiment not in SENTIMENTS:
+        return
+    for granularity in GRANULARITIES:
+        deltas[(manager_id, granularity, bucket_start(granularity, created_at), employee_id, sentiment)] += delta
+
+
+def record_created(feedback):
+    """Count a newly added Feedback row. Call before committing."""
+    db.session.flush()  # assigns created_at
+    record_created_many([{
+        'manager_id': feedback.manager_id,
+        'employee_id': feedback.employee_id,
+        'created_at': feedback.created_at,
+        'sentiment': feedback.sentiment,
+    }])
+
+
+def record_created_many(rows):
+    """Count inserted feedback given as dicts with manager_id, employee_id,
+    created_at and sentiment. One statement whatever the batch size."""
+    deltas = defaultdict(int)
+    for row in rows:
+        _add(deltas, row['manager_id'], row['employee_id'], row['created_at'], row['sentiment'], 1)
+    _apply(deltas)
+
+
+def record_sentiment_change(feedback, old_sentiment):
+    """Move one count between sentiments of the feedback's buckets."""
+    if old_sentiment == feedback.sentiment:
+        return
+    deltas = defaultdict(int)
+    _add(deltas, feedback.manager_id, feedback.employee_id, feedback.created_at, old_sentiment, -1)
+    _add(deltas, feedback.manager_id, feedback.employee_id, feedback.created_at, feedback.sentiment, 1)
+    _apply(deltas)
+
+
+def trend_query(manager_id, granularity, since, employee_id=None):
+    query = select(
+        SentimentRollup.employee_id, User.username, SentimentRollup.bucket_start,
+        SentimentRollup.sentiment, SentimentRollup.count
+    ).join(User, User.id == SentimentRollup.employee_id).where(
+        SentimentRollup.manager_id == manager_id,
+        SentimentRollup.granularity == granularity,
+        SentimentRollup.bucket_start >= since
+    )
+    if employee_id is not None:
+        query = query.where(SentimentRollup.employee_id == employee_id)
+    return query
+
+
+def _series(buckets, counts):
+    return [{'bucket_start': bucket, **counts[bucket], 'total': sum(counts[bucket].values())}
+            for bucket in buckets]
+
+
+def sentiment_trend(manager_id, granularity, periods=DEFAULT_PERIODS, employee_id=None):
+    """Sentiment counts of the feedback a manager gave, per bucket, for the
+    whole team and per employee. Buckets without feedback are zero-filled."""
+    buckets = bucket_starts(granularity, datetime.utcnow().date(), periods)
+
+    def empty():
+        return {bucket: dict.fromkeys(SENTIMENTS, 0) for bucket in buckets}
+
+    team = empty()
+    employees = {}
+    for employee, name, bucket, sentiment, count in db.session.execute(
+            trend_query(manager_id, granularity, buckets[0], employee_id)):
+        if bucket not in team:
+            continue  # clock skew: a bucket after today's
+        if employee not in employees:
+            employees[employee] = (name, empty())
+        employees[employee][1][bucket][sentiment] += count
+        team[bucket][sentiment] += count
+    return {
+        'bucket': granularity,
+        'team': _series(buckets, team),
+        'employees': [{'employee_id': employee, 'employee_name': name, 'series': _series(buckets, counts)}
+                      for employee, (name, counts) in sorted(employees.items())],
+    }
+
+
+def _bucket_column(granularity, column, dialect_name):
+    # SQL for bucket_start(); SQLite's 'weekday 0' moves to the next Sunday
+    if dialect_name == 'postgresql':
+        return cast(func.date_trunc(granularity, column), Date)
+    if granularity == 'week':
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.date(column, 'start of month')
+
+
+def rebuild_rollup(connection):
+    """Recompute sentiment_rollup from hot and archived feedback, one
+    INSERT ... SELECT per granularity. Takes a Connection or Session;
+    returns the number of cells."""
+    bind = connection.get_bind() if hasattr(connection, 'get_bind') else connection
+    rollup = SentimentRollup.__table__
+    columns = ('manager_id', 'employee_id', 'created_at', 'sentiment')
+    feedback = union_all(
+        select(*[Feedback.__table__.c[name] for name in columns]),
+        select(*[FeedbackArchive.__table__.c[name] for name in columns])
+    ).subquery('all_feedback')
+    connection.execute(rollup.delete())
+    cells = 0
+    for granularity in GRANULARITIES:
+        bucket = _bucket_column(granularity, feedback.c.created_at, bind.dialect.name)
+        result = connection.execute(rollup.insert().from_select(
+            ROLLUP_COLUMNS,
+            select(feedback.c.manager_id, literal(granularity), bucket, feedback.c.employee_id,
+                   feedback.c.sentiment, func.count())
+            .where(feedback.c.sentiment.in_(SENTIMENTS))
+            .group_by(feedback.c.manager_id, bucket, feedback.c.employee_id, feedback.c.sentiment)
+        ))
+        cells += result.rowcount
+    return cells
+
+
+@click.command('backfill-sentiment-rollup')
+@with_appcontext
+def backfill_sentiment_rollup_command():
+    """Rebuild the sentiment trend rollup from hot and archived feedback."""
+    cells = rebuild_rollup(db.session)
+    db.session.commit()
+    print(f"Rebuilt sentiment rollup ({cells} cells)")
+
+
+def init_app(app):
+    app.cli.add_command(backfill_sentiment_rollup_command)
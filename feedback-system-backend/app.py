@@ -1,21 +1,37 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify
+import click
 from db import db
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin
+import analytics
+import archive
+import compression
+import events
+import hashing
+import identity_cache
+import importer
+import instrumentation
+import jobs
+import orgchart
+import profiling
+import replica
+import response_cache
+import serializers
+from seed import seed_demo_data
+from flask.cli import with_appcontext
+from flask_login import LoginManager
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
 import os
-from flask_migrate import Migrate
+from flask_migrate import Migrate, upgrade
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = Flask(__name__)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
 
-# Database configuration for production
-database_url = os.environ.get('DATABASE_URL')
-if database_url and ('postgresql' in database_url or 'postgres' in database_url):
+migrate = Migrate(directory=MIGRATIONS_DIR)
+login_manager = LoginManager()
+
+
+def postgres_url(database_url):
     # Fix for Render/Heroku postgres URLs that use postgres:// instead of postgresql://
     if database_url.startswith('postgres://'):
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
@@ -23,204 +39,278 @@ if database_url and ('postgresql' in database_url or 'postgres' in database_url)
     # Use pg8000 driver for better Python 3.13 compatibility
     if 'postgresql://' in database_url and '+pg8000' not in database_url:
         database_url = database_url.replace('postgresql://', 'postgresql+pg8000://', 1)
-
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-    print("Using PostgreSQL database with pg8000 driver")
-else:
-    # Development: Use SQLite with relative path
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///instance/feedback_system.db'
+    return database_url
+
+
+def database_uri():
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url and ('postgresql' in database_url or 'postgres' in database_url):
+        print("Using PostgreSQL database with pg8000 driver")
+        return postgres_url(database_url)
+    if database_url and database_url.startswith('sqlite'):
+        # Explicit SQLite file, e.g. a generated benchmark database
+        print("Using SQLite database from DATABASE_URL")
+        return database_url
+    # Development: relative SQLite paths live in the instance folder
     print("Using SQLite database")
+    return 'sqlite:///feedback_system.db'
+
+
+def create_app():
+    """Build the Flask app. Does no database I/O, so it is cheap for every
+    gunicorn worker to call; schema and seed data are set up once by
+    `flask --app app bootstrap` at deploy time."""
+    app = Flask(__name__)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Connection pool sizing; checkout waits and overflow show up in /metrics
+    pool_options = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    }
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**pool_options, 'poolclass': instrumentation.timed_pool('primary')}
+
+    # Optional read replica for read-only endpoints (see replica.py)
+    replica_url = os.environ.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        print("Routing read-only endpoints to DATABASE_REPLICA_URL")
+        app.config['SQLALCHEMY_BINDS'] = {
+            replica.REPLICA: {'url': postgres_url(replica_url), **pool_options,
+                              'poolclass': instrumentation.timed_pool(replica.REPLICA)},
+        }
+    app.config['REPLICA_STICKY_SECONDS'] = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
+    # Compression of API responses (see compression.py)
+    app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+    app.config['COMPRESS_GZIP_LEVEL'] = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+    # Bearer token for the /api/admin endpoints (see admin.py); unset disables them
+    app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
+
+    # Sampling profiler for live requests (see profiling.py); requests with
+    # `X-Profile: <ADMIN_TOKEN>` are always profiled
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    app.config['PROFILE_INTERVAL_MS'] = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    app.config['PROFILE_MAX_SECONDS'] = float(os.environ.get('PROFILE_MAX_SECONDS', 30))
+    app.config['PROFILE_BUFFER_SIZE'] = int(os.environ.get('PROFILE_BUFFER_SIZE', 100))
+
+    # Threads for the blocking endpoints when served by `uvicorn asgi:application` (see asgi.py)
+    app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', 32))
+
+    # Requests over either budget are logged and counted in /metrics
+    app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 500))
+    app.config['SLOW_REQUEST_QUERIES'] = int(os.environ.get('SLOW_REQUEST_QUERIES', 50))
+
+    # Seconds a logged-in user's row is served from the per-process cache (0 disables)
+    app.config['IDENTITY_CACHE_TTL'] = float(os.environ.get('IDENTITY_CACHE_TTL', 30))
+
+    # Password hashing pool and cost parameters (see hashing.py)
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 8))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+    # Server-sent events fan-out (see events.py); 'sqlite' shares events across workers
+    app.config['EVENTS_BACKEND'] = os.environ.get('EVENTS_BACKEND', 'memory')
+    if os.environ.get('EVENTS_BROKER_PATH'):
+        app.config['EVENTS_BROKER_PATH'] = os.environ['EVENTS_BROKER_PATH']
+    app.config['EVENTS_HEARTBEAT'] = float(os.environ.get('EVENTS_HEARTBEAT', 15))
+    app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get('EVENTS_MAX_STREAMS', 50))
+
+    # Cached dashboard, feedback and team responses (see response_cache.py);
+    # 'sqlite' shares entries and invalidations across workers
+    app.config['RESPONSE_CACHE_TTL'] = float(os.environ.get('RESPONSE_CACHE_TTL', 60))
+    app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    app.config['RESPONSE_CACHE_BACKEND'] = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+    if os.environ.get('RESPONSE_CACHE_PATH'):
+        app.config['RESPONSE_CACHE_PATH'] = os.environ['RESPONSE_CACHE_PATH']
+
+    # Background job queue and `flask worker` (see jobs.py)
+    app.config['JOBS_MAX_ATTEMPTS'] = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+    app.config['JOBS_BACKOFF_BASE'] = float(os.environ.get('JOBS_BACKOFF_BASE', 2))
+    app.config['JOBS_BACKOFF_MAX'] = float(os.environ.get('JOBS_BACKOFF_MAX', 300))
+    app.config['JOBS_POLL_INTERVAL'] = float(os.environ.get('JOBS_POLL_INTERVAL', 1))
+    app.config['JOBS_LEASE'] = float(os.environ.get('JOBS_LEASE', 300))
+    app.config['JOBS_CONCURRENCY'] = int(os.environ.get('JOBS_CONCURRENCY', 2))
+
+    # `flask archive-feedback` moves acknowledged feedback older than this (see archive.py)
+    app.config['FEEDBACK_ARCHIVE_AFTER_DAYS'] = int(os.environ.get('FEEDBACK_ARCHIVE_AFTER_DAYS', 365))
+    app.config['FEEDBACK_ARCHIVE_BATCH_SIZE'] = int(os.environ.get('FEEDBACK_ARCHIVE_BATCH_SIZE', 1000))
+
+    # Production settings
+    if os.environ.get('FLASK_ENV') == 'production':
+        app.config['SESSION_COOKIE_SAMESITE'] = 'None'
+        app.config['SESSION_COOKIE_SECURE'] = True
+    else:
+        app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+        app.config['SESSION_COOKIE_SECURE'] = False
+
+    serializers.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    instrumentation.init_app(app)
+    hashing.init_app(app)
+    login_manager.init_app(app)
+    identity_cache.init_app(app)
+    events.init_app(app)
+    replica.init_app(app)
+    orgchart.init_app(app)
+    jobs.init_app(app)
+    analytics.init_app(app)
+    response_cache.init_app(app)
+    archive.init_app(app)
+    importer.init_app(app)
+    compression.init_app(app)
+    profiling.init_app(app)
+
+    # CORS configuration
+    # Detect if running locally or in production
+    is_local = os.environ.get('FLASK_ENV') != 'production' and not os.environ.get('DATABASE_URL')
+
+    if is_local:
+        # Local development - use localhost
+        default_frontend = 'http://localhost:3000'
+        print("Running locally - using localhost for CORS")
+    else:
+        # Production - use Vercel link
+        default_frontend = 'https://team-feedback-portal.vercel.app'
+        print("Running in production - using Vercel link for CORS")
+
+    frontend_origin = os.environ.get('FRONTEND_ORIGIN', default_frontend)
+
+    # Simple CORS configuration - allow specific origins
+    allowed_origins = [
+        'http://localhost:3000',
+        'http://localhost:3001',
+        'https://team-feedback-portal.vercel.app'
+    ]
+
+    # Add the environment-specified origin if different
+    if frontend_origin and frontend_origin not in allowed_origins:
+        allowed_origins.append(frontend_origin)
+
+    CORS(app,
+         origins=allowed_origins,
+         supports_credentials=True,
+         allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'],
+         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
+
+    print(f"Primary frontend origin: {frontend_origin}")
+    print(f"Allowed CORS origins: {allowed_origins}")
+    print("Additional validation for *.vercel.app domains enabled")
+
+    # Health check endpoint
+    @app.route('/health', methods=['GET'])
+    def health_check():
+        try:
+            return jsonify({
+                'status': 'healthy',
+                'message': 'Server is running',
+                'environment': 'local' if is_local else 'production',
+                'database_configured': bool(os.environ.get('DATABASE_URL'))
+            }), 200
+        except Exception as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 500
+
+    # Prometheus metrics: per-route latency, SQL time and count, pool state
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    # Test database connection
+    @app.route('/test-db', methods=['GET'])
+    def test_db():
+        try:
+            from models import User
+            user_count = User.query.count()
+            return jsonify({
+                'status': 'database connected',
+                'user_count': user_count,
+                'database_url': 'configured' if os.environ.get('DATABASE_URL') else 'not configured'
+            }), 200
+        except Exception as e:
+            return jsonify({
+                'status': 'database error',
+                'error': str(e)
+            }), 500
+
+    from routes import routes
+
+    app.register_blueprint(routes, url_prefix='/api')
+
+    app.cli.add_command(bootstrap_command)
+    app.cli.add_command(check_query_plans_command)
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        print(f"500 Error: {error}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': 'Internal server error', 'details': str(error)}), 500
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({'error': 'Not found'}), 404
 
-# Production settings
-if os.environ.get('FLASK_ENV') == 'production':
-    app.config['SESSION_COOKIE_SAMESITE'] = 'None'
-    app.config['SESSION_COOKIE_SECURE'] = True
-else:
-    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-    app.config['SESSION_COOKIE_SECURE'] = False
+    return app
 
-db.init_app(app)
-migrate = Migrate(app, db)
-login_manager = LoginManager()
-login_manager.init_app(app)
 
-# Import models after db initialization to avoid circular imports
-from models import User, Feedback, FeedbackRequest
+@login_manager.user_loader
+def load_user(user_id):
+    return identity_cache.load_user(int(user_id))
 
-# Initialize database tables and seed data
-with app.app_context():
-    try:
-        # Create instance directory if it doesn't exist
-        import os
-        from pathlib import Path
-        from werkzeug.security import generate_password_hash
-
-        instance_dir = Path("instance")
-        instance_dir.mkdir(exist_ok=True)
-
-        db.create_all()
-        print("Database tables created successfully")
-
-        # Seed database if empty
-        if not User.query.first():
-            print("Seeding database with initial data...")
-
-            # Create a manager
-            manager = User(
-                username='TheManager',
-                email='manager1@company.com',
-                password_hash=generate_password_hash('@12345'),
-                role='manager'
-            )
-            db.session.add(manager)
-            db.session.commit()
-
-            # Create employees
-            employee1 = User(
-                username='Jack',
-                email='jack@company.com',
-                password_hash=generate_password_hash('@123456'),
-                role='employee',
-                manager_id=manager.id
-            )
-            employee2 = User(
-                username='Alex',
-                email='Alex@company.com',
-                password_hash=generate_password_hash('@1234567'),
-                role='employee',
-                manager_id=manager.id
-            )
-            db.session.add_all([employee1, employee2])
-            db.session.commit()
-
-            # Create sample feedback
-            feedback1 = Feedback(
-                manager_id=manager.id,
-                employee_id=employee1.id,
-                strengths='Great communication skills and team collaboration',
-                areas_to_improve='Could work on time management',
-                sentiment='positive'
-            )
-            feedback2 = Feedback(
-                manager_id=manager.id,
-                employee_id=employee2.id,
-                strengths='Excellent technical skills',
-                areas_to_improve='Needs to improve documentation',
-                sentiment='neutral'
-            )
-            db.session.add_all([feedback1, feedback2])
-            db.session.commit()
 
+def bootstrap(seed=True):
+    """Apply migrations and seed demo data if the database is empty."""
+    upgrade(directory=MIGRATIONS_DIR)
+    print("Database schema is up to date")
+    if seed:
+        if seed_demo_data():
             print("Database seeded successfully with sample data")
         else:
             print("Database already contains data, skipping seeding")
 
-    except Exception as e:
-        print(f"Database initialization error: {e}")
-
-# CORS configuration
-# Detect if running locally or in production
-is_local = os.environ.get('FLASK_ENV') != 'production' and not os.environ.get('DATABASE_URL')
-
-if is_local:
-    # Local development - use localhost
-    default_frontend = 'http://localhost:3000'
-    print("Running locally - using localhost for CORS")
-else:
-    # Production - use Vercel link
-    default_frontend = 'https://team-feedback-portal.vercel.app'
-    print("Running in production - using Vercel link for CORS")
-
-frontend_origin = os.environ.get('FRONTEND_ORIGIN', default_frontend)
-
-# Simple CORS configuration - allow specific origins
-allowed_origins = [
-    'http://localhost:3000',
-    'http://localhost:3001',
-    'https://team-feedback-portal.vercel.app'
-]
-
-# Add the environment-specified origin if different
-if frontend_origin and frontend_origin not in allowed_origins:
-    allowed_origins.append(frontend_origin)
-
-CORS(app,
-     origins=allowed_origins,
-     supports_credentials=True,
-     allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'],
-     methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
-
-print(f"Primary frontend origin: {frontend_origin}")
-print(f"Allowed CORS origins: {allowed_origins}")
-print("Additional validation for *.vercel.app domains enabled")
-
-# Health check endpoint
-@app.route('/health', methods=['GET'])
-def health_check():
-    try:
-        return jsonify({
-            'status': 'healthy',
-            'message': 'Server is running',
-            'environment': 'local' if is_local else 'production',
-            'database_configured': bool(os.environ.get('DATABASE_URL'))
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
-
-# Test database connection
-@app.route('/test-db', methods=['GET'])
-def test_db():
-    try:
-        from models import User
-        user_count = User.query.count()
-        return jsonify({
-            'status': 'database connected',
-            'user_count': user_count,
-            'database_url': 'configured' if os.environ.get('DATABASE_URL') else 'not configured'
-        }), 200
-    except Exception as e:
-        return jsonify({
-            'status': 'database error',
-            'error': str(e)
-        }), 500
 
-from routes import routes
+@click.command('bootstrap')
+@click.option('--no-seed', is_flag=True, help='Only apply migrations.')
+@with_appcontext
+def bootstrap_command(no_seed):
+    """Run once per deploy: migrate the schema and seed an empty database."""
+    bootstrap(seed=not no_seed)
 
-app.register_blueprint(routes, url_prefix='/api')
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-@app.errorhandler(404)
-def not_found(e):
-    if request.path.startswith('/api/'):
-        return jsonify({'error': 'Not found'}), 404
-    return e
+@click.command('check-query-plans')
+@click.option('--verbose', is_flag=True, help='Print the plan of every query.')
+def check_query_plans_command(verbose):
+    """Fail if any route query falls back to a full table scan."""
+    from query_plans import check_query_plans
+    failures = check_query_plans(verbose=verbose)
+    for name, step in failures:
+        print(f"Full scan in '{name}': {step}")
+    if failures:
+        raise SystemExit(1)
+    print("All route queries are served by an index")
 
-@app.errorhandler(500)
-def internal_error(error):
-    print(f"500 Error: {error}")
-    import traceback
-    traceback.print_exc()
-    return jsonify({'error': 'Internal server error', 'details': str(error)}), 500
 
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({'error': 'Not found'}), 404
+# Module-level app for `gunicorn app:app` and `flask --app app`
+app = create_app()
 
 if __name__ == '__main__':
     try:
+        # The development server is a single process, so it can bootstrap itself
+        with app.app_context():
+            bootstrap()
         port = int(os.environ.get('PORT', 5000))
         print(f"Starting server on port {port}")
         app.run(debug=False, host='0.0.0.0', port=port)
     except Exception as e:
         print(f"Failed to start server: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
@@ -0,0 +1,106 @@
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, literal, literal_column, select, true, union_all
+
+import etags
+import response_cache
+from models import db, Feedback, FeedbackArchive
+
+# Hot/cold split of the feedback table.
+#
+# `flask archive-feedback` moves acknowledged feedback older than
+# FEEDBACK_ARCHIVE_AFTER_DAYS (default 365) from feedback to feedback_archive,
+# FEEDBACK_ARCHIVE_BATCH_SIZE rows (default 1000) per transaction, oldest
+# first, so each batch holds locks briefly and can be interrupted safely. Run
+# it from cron. Rows keep their ids; archived feedback is read-only.
+#
+# Routes read the hot table only, unless ?include_archived=1 asks for a
+# UNION ALL of both (hot_and_cold()). Dashboard counters and the sentiment
+# rollup are not touched by archiving: they count archived feedback too.
+
+ARCHIVED_COLUMNS = ['id', 'manager_id', 'employee_id', 'strengths', 'areas_to_improve', 'sentiment',
+                    'created_at', 'updated_at', 'acknowledged']
+
+
+def include_archived(args):
+    return args.get('include_archived', '').lower() in ('1', 'true')
+
+
+def hot_and_cold(hot, cold):
+    """UNION ALL of two selects with the same labelled columns (including
+    created_at and id), in (created_at, id) order. Each side is read in index
+    order and merged, so a LIMIT stops both early."""
+    return union_all(hot, cold).order_by(literal_column('created_at'), literal_column('id'))
+
+
+def candidates_query(cutoff, batch_size):
+    # The newest feedback row always stays hot: SQLite hands out max(id) + 1
+    # as the next id, which must never be an id already in the archive.
+    newest = select(func.max(Feedback.id)).scalar_subquery()
+    return select(Feedback.id, Feedback.manager_id, Feedback.employee_id) \
+        .where(Feedback.acknowledged == true(), Feedback.created_at < cutoff, Feedback.id < newest) \
+        .order_by(Feedback.created_at, Feedback.id) \
+        .limit(batch_size)
+
+
+def archive_batch(cutoff, batch_size):
+    """Move up to batch_size archivable rows in one transaction; returns
+    (rows moved, ids of the users whose listings changed)."""
+    rows = db.session.execute(candidates_query(cutoff, batch_size)).all()
+    if not rows:
+        return 0, set()
+    ids = [row.id for row in rows]
+    db.session.execute(insert(FeedbackArchive).from_select(
+        ARCHIVED_COLUMNS + ['archived_at'],
+        select(*[getattr(Feedback, name) for name in ARCHIVED_COLUMNS], literal(datetime.utcnow()))
+        .where(Feedback.id.in_(ids))
+    ))
+    db.session.execute(delete(Feedback).where(Feedback.id.in_(ids)).execution_options(synchronize_session=False))
+    users = {row.manager_id for row in rows} | {row.employee_id for row in rows}
+    etags.bump(*users)
+    db.session.commit()
+    response_cache.invalidate_users(*users)
+    return len(ids), users
+
+
+def archive_feedback(cutoff, batch_size, max_batches=0, pause=0.0):
+    """Archive in batches until nothing is left or max_batches (0 = no limit) ran."""
+    moved = batches = 0
+    while not max_batches or batches < max_batches:
+        count, _ = archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+        if pause:
+            time.sleep(pause)
+    return moved, batches
+
+
+@click.command('archive-feedback')
+@click.option('--older-than-days', type=int, default=None,
+              help='Archive acknowledged feedback older than this (default FEEDBACK_ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (default FEEDBACK_ARCHIVE_BATCH_SIZE).')
+@click.option('--max-batches', type=int, default=0, help='Stop after this many batches (0 = until done).')
+@click.option('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+@with_appcontext
+def archive_feedback_command(older_than_days, batch_size, max_batches, pause):
+    """Move old, acknowledged feedback to the archive table."""
+    config = current_app.config
+    days = older_than_days if older_than_days is not None else config['FEEDBACK_ARCHIVE_AFTER_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    started = time.perf_counter()
+    moved, batches = archive_feedback(cutoff, batch_size or config['FEEDBACK_ARCHIVE_BATCH_SIZE'],
+                                      max_batches, pause)
+    print(f"Archived {moved} feedback rows older than {cutoff:%Y-%m-%d} in {batches} batches "
+          f"({time.perf_counter() - started:.1f}s)")
+
+
+def init_app(app):
+    app.config.setdefault('FEEDBACK_ARCHIVE_AFTER_DAYS', 365)
+    app.config.setdefault('FEEDBACK_ARCHIVE_BATCH_SIZE', 1000)
+    app.cli.add_command(archive_feedback_command)
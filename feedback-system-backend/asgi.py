@@ -0,0 +1,261 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util import await_only, greenlet_spawn
+from werkzeug.exceptions import HTTPException
+
+import hashing
+import instrumentation
+from app import app as flask_app
+from db import db, async_engines
+
+# ASGI entry point: `uvicorn asgi:application`.
+#
+# Serves the same Flask app, with the same routes, login sessions and
+# cookies, but waits on the database without holding a thread. Each request
+# runs the Flask app inside a SQLAlchemy greenlet (greenlet_spawn), with
+# db.RoutingSession swapping every engine for an async one (aiosqlite for
+# SQLite, asyncpg for Postgres) built from the same URL and pool settings.
+# A query suspends the request and lets the event loop run others, so one
+# worker serves many concurrent requests whose time goes into database round
+# trips; the Python work itself still runs one request at a time.
+#
+# Endpoints that block on something other than the database run on a thread
+# pool with the sync engines instead, as under gunicorn: password hashing
+# (login, register, seeding), server-sent event streams and the streamed CSV
+# import. Each open event stream holds one of these threads. The SQLite files
+# of the events broker and the response cache are reached through
+# db.run_blocking(), which hands each call to the loop's default thread pool.
+#
+#   ASGI_THREADS  threads for those endpoints (default 32)
+#
+# Needs `pip install -r requirements-asgi.txt`. Schema and seed data are
+# still set up by `flask --app app bootstrap`.
+
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg'}
+
+THREADED_ENDPOINTS = {
+    'routes.login', 'routes.register', 'routes.init_db', 'routes.seed_db',
+    'routes.event_stream', 'routes.import_org',
+}
+
+
+def async_url(url):
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for '{backend}' databases")
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def create_async_engines(app):
+    """An async engine for each of the app's engines, keyed by the engine it
+    stands in for."""
+    options = {key: value for key, value in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items()
+               if key != 'poolclass'}
+    engines = {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            label = f"{key or 'primary'}_async"
+            async_engine = create_async_engine(
+                async_url(engine.url), poolclass=instrumentation.timed_pool(label, AsyncAdaptedQueuePool), **options
+            )
+            instrumentation.instrument_engine(label, async_engine.sync_engine)
+            engines[engine] = async_engine
+    return engines
+
+
+def build_environ(scope):
+    """WSGI environ of an ASGI http scope, without wsgi.input."""
+    server = scope.get('server') or ('localhost', 80)
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI strings carry the raw bytes as latin-1
+        'SCRIPT_NAME': root_path.encode().decode('latin-1'),
+        'PATH_INFO': path.encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        if key in environ:
+            value = f"{environ[key]}{'; ' if key == 'HTTP_COOKIE' else ','}{value}"
+        environ[key] = value
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def respond(wsgi_app, environ, send, disconnected=None):
+    """Run wsgi_app and pass its response to send(), a blocking function
+    taking ASGI messages. Stops early once disconnected is set."""
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]),
+                      [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+        return lambda data: send_body(data)
+
+    def send_start():
+        if started and started[0] is not None:
+            send({'type': 'http.response.start', 'status': started[0], 'headers': started[1]})
+            started[0] = None
+
+    def send_body(data):
+        send_start()
+        send({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+    body = wsgi_app(environ, start_response)
+    try:
+        for chunk in body:
+            if disconnected is not None and disconnected.is_set():
+                return
+            if chunk:
+                send_body(chunk)
+        send_start()
+        send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+
+class _Receiver(io.RawIOBase):
+    """wsgi.input for a thread: reads the body from the event loop as the app
+    consumes it."""
+
+    def __init__(self, chunks, loop):
+        self._chunks = chunks
+        self._loop = loop
+        self._pending = b''
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending and not self._done:
+            chunk = asyncio.run_coroutine_threadsafe(self._chunks.get(), self._loop).result()
+            if chunk is None:
+                self._done = True
+            else:
+                self._pending = chunk
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class ASGIApp:
+    def __init__(self, app):
+        app.config.setdefault('ASGI_THREADS', 32)
+        self.app = app
+        self.engines = create_async_engines(app)
+        self._swap = {engine: async_engine.sync_engine for engine, async_engine in self.engines.items()}
+        self.executor = ThreadPoolExecutor(app.config['ASGI_THREADS'], thread_name_prefix='asgi-blocking')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'")
+        environ = build_environ(scope)
+        try:
+            endpoint = self.app.url_map.bind_to_environ(environ).match()[0]
+        except HTTPException:
+            endpoint = None  # Flask answers the 404, 405 or redirect
+        if endpoint in THREADED_ENDPOINTS:
+            await self._threaded(environ, receive, send)
+        else:
+            await self._on_loop(environ, receive, send)
+
+    async def _on_loop(self, environ, receive, send):
+        environ['wsgi.input'] = io.BytesIO(await read_body(receive))
+        token = async_engines.set(self._swap)
+        try:
+            # The greenlet runs in this task's context, so it sees the swap;
+            # await_only() suspends it while send() waits on the client
+            await greenlet_spawn(respond, self.app, environ, lambda message: await_only(send(message)))
+        finally:
+            async_engines.reset(token)
+
+    async def _threaded(self, environ, receive, send):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=8)
+        disconnected = threading.Event()
+
+        async def pump():
+            # Feed the body to the thread, then watch for the client leaving
+            # (an event stream only notices at its next heartbeat otherwise)
+            more = True
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+                    if more:
+                        await chunks.put(None)
+                    return
+                if more:
+                    await chunks.put(message.get('body', b''))
+                    more = message.get('more_body', False)
+                    if not more:
+                        await chunks.put(None)
+
+        environ['wsgi.input'] = io.BufferedReader(_Receiver(chunks, loop))
+        pumping = asyncio.ensure_future(pump())
+        try:
+            await loop.run_in_executor(
+                self.executor, respond, self.app, environ,
+                lambda message: asyncio.run_coroutine_threadsafe(send(message), loop).result(),
+                disconnected
+            )
+        finally:
+            pumping.cancel()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines.values():
+                    await engine.dispose()
+                self.executor.shutdown(wait=False)
+                # uvicorn re-raises SIGTERM after shutting down, skipping
+                # the atexit hook that would stop the hashing processes
+                await asyncio.get_running_loop().run_in_executor(None, hashing.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+# Module-level app for `uvicorn asgi:application`
+application = ASGIApp(flask_app)
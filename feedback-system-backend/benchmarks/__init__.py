@@ -0,0 +1,31 @@
+"""Load generation and latency benchmarks for the feedback backend.
+
+    python -m benchmarks.orggen --url sqlite:///bench.db --managers 500 \\
+        --employees 50000 --feedback 2000000 --requests 100000
+    python -m benchmarks.run --url sqlite:///bench.db --sessions 16 \\
+        --duration 60 --output results.json
+    python -m benchmarks.orgtree --url sqlite:///org.db
+    python -m benchmarks.serialize --rows 10000
+    python -m benchmarks.startup --samples 10 --output startup.json
+    python -m benchmarks.sse --connections 500
+    python -m benchmarks.archive --years 1,2,4,8 --per-year 25000
+    python -m benchmarks.wire --sizes 50,500,5000 --link-mbps 2
+    python -m benchmarks.concurrency --url sqlite:///bench.db --users 1000 \\
+        --db-latency-ms 5
+
+Run from the feedback-system-backend directory.
+"""
+import os
+
+
+def normalize_url(url):
+    """Apply the same driver and path rules as app.py to a database URL."""
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    if url.startswith('postgresql://'):
+        url = url.replace('postgresql://', 'postgresql+pg8000://', 1)
+    if url.startswith('sqlite:///') and not url.startswith('sqlite:////'):
+        # Flask-SQLAlchemy resolves relative SQLite paths against the
+        # instance folder; pin them to the current directory instead.
+        url = 'sqlite:///' + os.path.abspath(url[len('sqlite:///'):])
+    return url
@@ -0,0 +1,110 @@
+"""Time feedback listings and dashboards as history grows, with and without archiving.
+
+For each --years value, generates an organisation with --per-year feedback
+rows per year of history (benchmarks.orggen), then times a manager's
+
+    list      GET /api/feedback?limit=500 (the largest page)
+    page      GET /api/feedback?limit=50
+    dashboard GET /api/dashboard
+
+first with every row in the feedback table, then again after archive.py has
+moved acknowledged feedback older than --keep-days to feedback_archive.
+With archiving, the hot table holds about --keep-days of feedback whatever
+the history, so the archived timings should stay flat as --years grows.
+The response cache is disabled so every request reaches the database.
+
+    python -m benchmarks.archive --years 1,2,4,8 --per-year 25000
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import normalize_url
+from benchmarks.orggen import BENCH_PASSWORD, generate_org
+from benchmarks.run import git_revision
+
+ENDPOINTS = {
+    'list': '/api/feedback?limit=500',
+    'page': '/api/feedback?limit=50',
+    'dashboard': '/api/dashboard',
+}
+
+
+def timed(client, url, samples):
+    times = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        response = client.get(url)
+        times.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f'{url} returned {response.status_code}')
+    return statistics.median(times)
+
+
+def measure(app, samples):
+    client = app.test_client()
+    response = client.post('/api/login', json={'username': 'manager1', 'password': BENCH_PASSWORD})
+    if response.status_code != 200:
+        raise SystemExit('could not log in as manager1')
+    return {name: timed(client, url, samples) for name, url in ENDPOINTS.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='sqlite:///archive-bench.db',
+                        help='scratch database URL (regenerated for every --years value)')
+    parser.add_argument('--years', default='1,2,4,8', help='comma-separated history lengths')
+    parser.add_argument('--per-year', type=int, default=25000, help='feedback rows per year of history')
+    parser.add_argument('--managers', type=int, default=50)
+    parser.add_argument('--employees', type=int, default=1000)
+    parser.add_argument('--keep-days', type=int, default=365, help='archive acknowledged feedback older than this')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--samples', type=int, default=20, help='requests per endpoint; the median is reported')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    url = normalize_url(args.url)
+    os.environ['DATABASE_URL'] = url
+    os.environ['RESPONSE_CACHE_TTL'] = '0'
+    from sqlalchemy import func, select
+    from app import app
+    from models import db, Feedback, FeedbackArchive
+    import archive
+
+    results = []
+    header = ' '.join(f'{name:>10} {"archived":>9}' for name in ENDPOINTS)
+    print(f"{'years':>5} {'rows':>8} {'hot':>8} {header}")
+    for years in [int(value) for value in args.years.split(',')]:
+        rows = args.per_year * years
+        generate_org(url, args.managers, args.employees, rows, 0, history_days=365 * years)
+        with app.app_context():
+            db.engine.dispose()
+            before = measure(app, args.samples)
+            started = time.perf_counter()
+            moved, batches = archive.archive_feedback(
+                datetime.utcnow() - timedelta(days=args.keep_days), args.batch_size)
+            archive_seconds = time.perf_counter() - started
+            hot = db.session.scalar(select(func.count(Feedback.id)))
+            cold = db.session.scalar(select(func.count(FeedbackArchive.id)))
+            if hot + cold != rows:
+                raise SystemExit(f'{rows} rows generated but {hot} hot and {cold} archived')
+            db.session.remove()
+            after = measure(app, args.samples)
+        timings = ' '.join(f'{before[name]:>8.1f}ms {after[name]:>7.1f}ms' for name in ENDPOINTS)
+        print(f"{years:>5} {rows:>8} {hot:>8} {timings}")
+        results.append({'years': years, 'rows': rows, 'hot_rows': hot, 'archived_rows': moved,
+                        'archive_batches': batches, 'archive_seconds': archive_seconds,
+                        'before_ms': before, 'archived_ms': after})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {'git_revision': git_revision(), 'url': args.url, 'per_year': args.per_year,
+                                'keep_days': args.keep_days}, 'histories': results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
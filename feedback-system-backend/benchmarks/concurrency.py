@@ -0,0 +1,261 @@
+"""Compare the sync (gunicorn) and async (uvicorn asgi:application) servers under many concurrent users.
+
+For each --modes entry, starts the server on a database generated by
+benchmarks.orggen,
+
+    sync   gunicorn -k gthread -w --workers --threads --threads app:app
+    asgi   uvicorn --workers --workers asgi:application
+
+logs in --accounts users (half managers, half employees), then runs --users
+simulated users from one asyncio client, each on its own keep-alive
+connection, cycling through the read routes of their role (dashboard,
+feedback page, team, feedback requests) with a random think time around
+--think-ms. After --warmup seconds, requests finishing in the next
+--duration seconds are counted for throughput and latency.
+
+--db-latency-ms adds that much delay to every SQL statement on the server,
+standing in for the round trip to a database on another host (SQLite on
+the same disk answers in microseconds, which hides what the async server is
+for). Under asgi the delay suspends the request like real network I/O.
+The response cache is off (unless --cache) so every request reaches the
+database. The client shares the host with the server, so on a small
+machine it takes CPU from it.
+
+    python -m benchmarks.orggen --url sqlite:///bench.db --managers 50 --employees 2000 --feedback 50000
+    python -m benchmarks.concurrency --url sqlite:///bench.db --users 1000 --db-latency-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from benchmarks import normalize_url
+from benchmarks.orggen import BENCH_PASSWORD
+from benchmarks.run import git_revision, percentile
+from benchmarks.sse import login
+
+MIX = {
+    'manager': [(4, '/api/dashboard'), (3, '/api/feedback?limit=50'), (2, '/api/users'),
+                (2, '/api/feedback-requests')],
+    'employee': [(4, '/api/dashboard'), (3, '/api/feedback?limit=50'), (1, '/api/users')],
+}
+
+
+def _add_latency(engines, seconds, cooperative=False):
+    from sqlalchemy import event
+
+    if cooperative:
+        from sqlalchemy.util import await_only
+
+        def delay(*_):
+            await_only(asyncio.sleep(seconds))
+    else:
+        def delay(*_):
+            time.sleep(seconds)
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', delay)
+
+
+def sync_app():
+    """gunicorn 'benchmarks.concurrency:sync_app()'"""
+    from app import app
+    from models import db
+    seconds = float(os.environ.get('BENCH_DB_LATENCY_MS', 0)) / 1000
+    if seconds:
+        with app.app_context():
+            _add_latency(db.engines.values(), seconds)
+    return app
+
+
+def asgi_app():
+    """uvicorn --factory benchmarks.concurrency:asgi_app"""
+    from asgi import application
+    seconds = float(os.environ.get('BENCH_DB_LATENCY_MS', 0)) / 1000
+    if seconds:
+        # The sync engines still serve the threaded endpoints (login)
+        _add_latency(application.engines.keys(), seconds)
+        _add_latency([engine.sync_engine for engine in application.engines.values()], seconds, cooperative=True)
+    return application
+
+
+def server_command(mode, port, args):
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '-k', 'gthread',
+                '--threads', str(args.threads), '--worker-connections', str(args.users * 2),
+                '--keep-alive', '75', '--backlog', '4096', '-b', f'127.0.0.1:{port}',
+                '--log-level', 'warning', 'benchmarks.concurrency:sync_app()']
+    return [sys.executable, '-m', 'uvicorn', '--factory', 'benchmarks.concurrency:asgi_app',
+            '--workers', str(args.workers), '--port', str(port), '--timeout-keep-alive', '75',
+            '--backlog', '4096', '--log-level', 'warning']
+
+
+def start_server(mode, port, args):
+    env = dict(os.environ, DATABASE_URL=normalize_url(args.url), DB_POOL_SIZE=str(args.pool_size),
+               BENCH_DB_LATENCY_MS=str(args.db_latency_ms))
+    if not args.cache:
+        env['RESPONSE_CACHE_TTL'] = '0'
+    # A file rather than a pipe: slow request warnings would fill an unread
+    # pipe and stall the server
+    log = tempfile.TemporaryFile('w+')
+    server = subprocess.Popen(server_command(mode, port, args), env=env, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            log.seek(0)
+            raise SystemExit(f'{mode} server exited:\n{log.read()}')
+        try:
+            with urlopen(f'http://127.0.0.1:{port}/health', timeout=1):
+                return server
+        except (URLError, OSError):
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit(f'{mode} server did not start')
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection; reconnects after errors."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path, cookie):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection('127.0.0.1', self.port)
+        self.writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nCookie: {cookie}\r\n\r\n'.encode())
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ', 2)[1])
+        headers = {name.lower(): value.strip() for name, _, value in
+                   (line.partition(':') for line in lines[1:] if line)}
+        if headers.get('transfer-encoding') == 'chunked':
+            while size := int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16):
+                await self.reader.readexactly(size + 2)
+            await self.reader.readuntil(b'\r\n')
+        else:
+            await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection') == 'close':
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def simulate(index, port, accounts, args, window, results):
+    rng = random.Random(args.seed + index)
+    role, cookie = accounts[index % len(accounts)]
+    weights, paths = zip(*MIX[role])
+    connection = Connection(port)
+    # Spread the first requests over one think time
+    await asyncio.sleep(rng.uniform(0, args.think_ms / 1000))
+    while time.perf_counter() < window[1]:
+        started = time.perf_counter()
+        try:
+            status = await connection.get(rng.choices(paths, weights)[0], cookie)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            connection.close()
+            status = None
+        finished = time.perf_counter()
+        if window[0] <= finished < window[1]:
+            if status == 200:
+                results['latencies'].append(finished - started)
+            else:
+                results['errors'] += 1
+        await asyncio.sleep(rng.uniform(0, 2 * args.think_ms / 1000))
+    connection.close()
+
+
+async def load(port, accounts, args):
+    now = time.perf_counter()
+    window = (now + args.warmup, now + args.warmup + args.duration)
+    results = {'latencies': [], 'errors': 0}
+    await asyncio.gather(*[simulate(index, port, accounts, args, window, results) for index in range(args.users)])
+    return results
+
+
+def run_mode(mode, port, args):
+    server = start_server(mode, port, args)
+    try:
+        accounts = []
+        for i in range(args.accounts):
+            role = 'manager' if i % 2 == 0 else 'employee'
+            # orggen numbers managers from 1 and employees from 0
+            username = f'manager{i // 2 + 1}' if role == 'manager' else f'employee{i // 2}'
+            accounts.append((role, login('127.0.0.1', port, username, BENCH_PASSWORD)))
+        results = asyncio.run(load(port, accounts, args))
+    finally:
+        stop_server(server)
+    latencies = sorted(results['latencies'])
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': results['errors'],
+        'throughput_rps': len(latencies) / args.duration,
+        'p50_ms': percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p95_ms': percentile(latencies, 0.95) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 0.99) * 1000 if latencies else None,
+        'max_ms': latencies[-1] * 1000 if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='sqlite:///bench.db', help='database generated by benchmarks.orggen')
+    parser.add_argument('--modes', default='sync,asgi')
+    parser.add_argument('--users', type=int, default=1000, help='concurrent simulated users')
+    parser.add_argument('--accounts', type=int, default=20, help='distinct logins the users share')
+    parser.add_argument('--think-ms', type=float, default=500, help='mean pause between a user\'s requests')
+    parser.add_argument('--warmup', type=float, default=5.0)
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--workers', type=int, default=1, help='server processes in either mode')
+    parser.add_argument('--threads', type=int, default=16, help='threads per sync worker')
+    parser.add_argument('--pool-size', type=int, default=32, help='DB_POOL_SIZE in either mode')
+    parser.add_argument('--db-latency-ms', type=float, default=0.0, help='added delay per SQL statement')
+    parser.add_argument('--cache', action='store_true', help='leave the response cache on')
+    parser.add_argument('--port', type=int, default=8950)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'mode':<6} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'errors':>7}")
+    for mode in args.modes.split(','):
+        result = run_mode(mode, args.port, args)
+        results.append(result)
+        if result['requests']:
+            print(f"{mode:<6} {result['throughput_rps']:>8.1f} {result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms "
+                  f"{result['p99_ms']:>7.1f}ms {result['max_ms']:>7.1f}ms {result['errors']:>7}")
+        else:
+            print(f"{mode:<6} no successful requests, {result['errors']} errors")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {'git_revision': git_revision(), 'url': args.url, 'users': args.users,
+                                'think_ms': args.think_ms, 'workers': args.workers, 'threads': args.threads,
+                                'pool_size': args.pool_size, 'db_latency_ms': args.db_latency_ms,
+                                'cache': args.cache, 'cpus': os.cpu_count()},
+                       'results': results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
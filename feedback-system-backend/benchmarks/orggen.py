@@ -0,0 +1,183 @@
+"""Generate a synthetic organisation into SQLite or PostgreSQL.
+
+Every generated user has the password BENCH_PASSWORD. Managers are named
+manager<N> and employees employee<N>, so benchmark sessions can log in as
+any of them.
+
+With --manager-fanout N the managers form a tree, each with up to N
+managers reporting to them (manager1 at the top), so 500 managers with a
+fanout of 2 make nine management levels above the employees.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, create_engine, func, insert, literal, select, text
+from werkzeug.security import generate_password_hash
+
+from benchmarks import normalize_url
+from models import db, User, Feedback, FeedbackRequest, FeedbackSummary
+from analytics import rebuild_rollup
+from orgchart import rebuild_closure
+
+BENCH_PASSWORD = 'bench-password'
+SENTIMENTS = ('positive', 'neutral', 'negative')
+CHUNK_SIZE = 10000
+
+STRENGTHS = [
+    'Great communication skills and team collaboration',
+    'Excellent technical skills',
+    'Takes ownership of incidents and follows through',
+    'Writes clear documentation and design notes',
+    'Mentors new joiners patiently',
+]
+AREAS = [
+    'Could work on time management',
+    'Needs to improve documentation',
+    'Should delegate more often',
+    'Could speak up earlier in planning meetings',
+    'Needs to break large changes into smaller reviews',
+]
+
+
+def _insert_chunked(connection, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK_SIZE:
+            connection.execute(insert(table), batch)
+            batch = []
+    if batch:
+        connection.execute(insert(table), batch)
+
+
+def _rebuild_summaries(connection):
+    # The counters dashboard.py keeps up to date, for every user at once
+    summary = FeedbackSummary.__table__
+    feedback = Feedback.__table__
+    connection.execute(summary.delete())
+    for scope, column in (('manager', feedback.c.manager_id), ('employee', feedback.c.employee_id)):
+        columns = [
+            column,
+            literal(scope),
+            func.count(feedback.c.id),
+            *[func.sum(case((feedback.c.sentiment == s, 1), else_=0)) for s in SENTIMENTS],
+            func.sum(case((feedback.c.acknowledged.is_(True), 0), else_=1)),
+        ]
+        connection.execute(summary.insert().from_select(
+            ['user_id', 'scope', 'total', *SENTIMENTS, 'unacknowledged'],
+            select(*columns).group_by(column)
+        ))
+
+
+def _reset_sequences(connection):
+    # Rows were inserted with explicit ids; move Postgres sequences past them
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in (User.__table__, Feedback.__table__, FeedbackRequest.__table__):
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{table.name}\"), 1))"
+        ))
+
+
+def generate_org(url, managers, employees, feedback, requests, history_days=1095, seed=42,
+                 manager_fanout=0):
+    rng = random.Random(seed)
+    engine = create_engine(normalize_url(url))
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+
+    # Hash once; every generated user shares the same password
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    with engine.begin() as connection:
+        _insert_chunked(connection, User.__table__, ({
+            'id': i,
+            'username': f'manager{i}',
+            'email': f'manager{i}@bench.example',
+            'password_hash': password_hash,
+            'role': 'manager',
+            # Heap layout: manager i reports to manager (i - 2) // fanout + 1
+            'manager_id': (i - 2) // manager_fanout + 1 if manager_fanout and i > 1 else None,
+        } for i in range(1, managers + 1)))
+
+        # Employees are spread round-robin over managers, ids follow the managers
+        first_employee = managers + 1
+        _insert_chunked(connection, User.__table__, ({
+            'id': first_employee + i,
+            'username': f'employee{i}',
+            'email': f'employee{i}@bench.example',
+            'password_hash': password_hash,
+            'role': 'employee',
+            'manager_id': 1 + i % managers,
+        } for i in range(employees)))
+        print(f"users: {managers} managers, {employees} employees")
+
+        def feedback_rows():
+            for i in range(feedback):
+                employee_index = rng.randrange(employees)
+                created_at = now - timedelta(seconds=rng.randrange(history_days * 86400))
+                yield {
+                    'id': i + 1,
+                    'manager_id': 1 + employee_index % managers,
+                    'employee_id': first_employee + employee_index,
+                    'strengths': rng.choice(STRENGTHS),
+                    'areas_to_improve': rng.choice(AREAS),
+                    'sentiment': rng.choice(SENTIMENTS),
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                    # Older feedback has almost always been read
+                    'acknowledged': created_at < now - timedelta(days=30) or rng.random() < 0.3,
+                }
+        _insert_chunked(connection, Feedback.__table__, feedback_rows())
+        print(f"feedback: {feedback} rows")
+
+        def request_rows():
+            for i in range(requests):
+                employee_index = rng.randrange(employees)
+                yield {
+                    'id': i + 1,
+                    'employee_id': first_employee + employee_index,
+                    'manager_id': 1 + employee_index % managers,
+                    'message': 'Could we go over my last project?',
+                    'created_at': now - timedelta(seconds=rng.randrange(history_days * 86400)),
+                    'status': 'pending' if rng.random() < 0.2 else 'completed',
+                }
+        _insert_chunked(connection, FeedbackRequest.__table__, request_rows())
+        print(f"feedback requests: {requests} rows")
+
+        _rebuild_summaries(connection)
+        print(f"sentiment rollup: {rebuild_rollup(connection)} cells")
+        levels = rebuild_closure(connection)
+        print(f"org: {levels + 1} levels")
+        _reset_sequences(connection)
+        # Planner statistics, as a long-lived database would have them
+        connection.exec_driver_sql('ANALYZE')
+
+    engine.dispose()
+    print(f"generated in {time.perf_counter() - started:.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='sqlite:///bench.db',
+                        help='target database URL (existing tables are dropped)')
+    parser.add_argument('--managers', type=int, default=500)
+    parser.add_argument('--employees', type=int, default=50000)
+    parser.add_argument('--feedback', type=int, default=2000000)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--history-days', type=int, default=1095)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--manager-fanout', type=int, default=0,
+                        help='managers reporting to each manager (0: all managers at the top)')
+    args = parser.parse_args(argv)
+    generate_org(args.url, args.managers, args.employees, args.feedback,
+                 args.requests, args.history_days, args.seed, args.manager_fanout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Time org subtree stats from the closure table against a level-by-level walk.
+
+Meant for a database with a deep management tree, e.g. ten levels:
+
+    python -m benchmarks.orggen --url sqlite:///org.db --managers 500 --manager-fanout 2
+    python -m benchmarks.orgtree --url sqlite:///org.db
+
+For the first manager at each depth below the top, compares orgchart.subtree_stats()
+(one query over org_closure and feedback_summary) with what the route would
+need without the closure table: one query per management level to find the
+reports, then aggregates over their feedback. Both must agree.
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+from benchmarks import normalize_url
+from benchmarks.run import git_revision
+
+# Stays under SQLite's bound-parameter limit
+IN_CHUNK = 10000
+
+
+def walk_stats(db, Feedback, User, root_id):
+    """Feedback totals under root_id without the closure table."""
+    from sqlalchemy import case, func, select
+    reports, frontier = [], [root_id]
+    while frontier:
+        level = []
+        for start in range(0, len(frontier), IN_CHUNK):
+            level += db.session.scalars(
+                select(User.id).where(User.manager_id.in_(frontier[start:start + IN_CHUNK]))).all()
+        reports += level
+        frontier = level
+    total = unacknowledged = 0
+    for start in range(0, len(reports), IN_CHUNK):
+        count, unread = db.session.execute(
+            select(func.count(Feedback.id),
+                   func.coalesce(func.sum(case((Feedback.acknowledged.is_(True), 0), else_=1)), 0))
+            .where(Feedback.employee_id.in_(reports[start:start + IN_CHUNK]))).one()
+        total += count
+        unacknowledged += unread
+    return {'headcount': len(reports), 'total_feedback': total, 'unacknowledged': unacknowledged}
+
+
+def timed(counter, samples, fn):
+    times, queries = [], 0
+    for _ in range(samples):
+        counter.value = 0
+        started = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - started) * 1000)
+        queries = counter.value
+    return result, statistics.median(times), queries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='sqlite:///org.db', help='database generated by benchmarks.orggen')
+    parser.add_argument('--samples', type=int, default=5, help='runs per root; the median is reported')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = normalize_url(args.url)
+    from sqlalchemy import event, func, select
+    from app import app
+    from models import db, Feedback, OrgClosure, User
+    import orgchart
+
+    counter = threading.local()
+    counter.value = 0
+    results = []
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            counter.value += 1
+
+        top = db.session.scalar(select(User.id).where(User.role == 'manager', User.manager_id.is_(None))
+                                .order_by(User.id).limit(1))
+        roots = db.session.execute(
+            select(OrgClosure.depth, func.min(OrgClosure.descendant_id))
+            .join(User, User.id == OrgClosure.descendant_id)
+            .where(OrgClosure.ancestor_id == top, User.role == 'manager')
+            .group_by(OrgClosure.depth).order_by(OrgClosure.depth)).all()
+
+        print(f"{'depth':>5} {'root':>7} {'headcount':>9} {'levels':>6} {'closure':>9} {'q':>3} {'walk':>9} {'q':>4}")
+        for depth, root_id in roots:
+            stats, closure_ms, closure_q = timed(counter, args.samples, lambda: orgchart.subtree_stats(root_id))
+            walked, walk_ms, walk_q = timed(counter, args.samples,
+                                            lambda: walk_stats(db, Feedback, User, root_id))
+            for key in ('headcount', 'total_feedback', 'unacknowledged'):
+                if stats[key] != walked[key]:
+                    raise SystemExit(f'{key} differs under {root_id}: {stats[key]} vs {walked[key]}')
+            print(f"{depth:>5} {root_id:>7} {stats['headcount']:>9} {stats['depth']:>6} "
+                  f"{closure_ms:>7.1f}ms {closure_q:>3} {walk_ms:>7.1f}ms {walk_q:>4}")
+            results.append({'depth': depth, 'root_id': root_id, 'headcount': stats['headcount'],
+                            'levels_below': stats['depth'], 'closure_ms': closure_ms,
+                            'closure_queries': closure_q, 'walk_ms': walk_ms, 'walk_queries': walk_q})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {'git_revision': git_revision(), 'url': args.url}, 'roots': results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
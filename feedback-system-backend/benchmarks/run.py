@@ -0,0 +1,306 @@
+"""Drive every /api route with concurrent simulated sessions and report latency.
+
+By default requests go through Flask's test client in this process, which
+also lets the run count SQL statements per request. With --base-url the same
+sessions hit a running server (e.g. gunicorn) over HTTP instead; queries per
+request are then not available.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from benchmarks import normalize_url
+from benchmarks.orggen import BENCH_PASSWORD
+
+# (weight, label) per role. Labels are route templates so results group by
+# endpoint rather than by concrete URL.
+MANAGER_MIX = [
+    (4, 'GET /api/dashboard'),
+    (3, 'GET /api/feedback?limit'),
+    (1, 'GET /api/feedback'),
+    (2, 'GET /api/users'),
+    (1, 'GET /api/all-employees'),
+    (0.5, 'GET /api/org/subtree'),
+    (0.5, 'GET /api/analytics/sentiment-trend'),
+    (2, 'GET /api/feedback-requests'),
+    (1, 'POST /api/feedback'),
+    (1, 'PUT /api/feedback/<id>'),
+    (0.2, 'POST /api/assign-team'),
+]
+EMPLOYEE_MIX = [
+    (4, 'GET /api/dashboard'),
+    (3, 'GET /api/feedback?limit'),
+    (1, 'GET /api/feedback'),
+    (1, 'GET /api/users'),
+    (1, 'POST /api/feedback/<id>/acknowledge'),
+    (1, 'POST /api/feedback-request'),
+]
+PAGE_SIZE = 50
+
+
+class TestClientTransport:
+    """In-process transport; counts SQL statements per request."""
+
+    def __init__(self, app, counter):
+        self.client = app.test_client()
+        self.counter = counter
+
+    def request(self, method, path, body=None):
+        self.counter.value = 0
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True), self.counter.value
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = Request(self.base_url + path, data=data, method=method,
+                      headers={'Content-Type': 'application/json'})
+        try:
+            with self.opener.open(req) as response:
+                return response.status, json.loads(response.read() or b'null'), None
+        except HTTPError as e:
+            return e.code, None, None
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.queries = defaultdict(list)
+
+    def timed(self, transport, label, method, path, body=None):
+        started = time.perf_counter()
+        status, payload, queries = transport.request(method, path, body)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.samples[label].append(elapsed)
+            if status >= 400:
+                self.errors[label] += 1
+            if queries is not None:
+                self.queries[label].append(queries)
+        return status, payload
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Session:
+    def __init__(self, transport, recorder, role, number, rng):
+        self.transport = transport
+        self.recorder = recorder
+        self.role = role
+        self.username = f'{role}{number}'
+        self.rng = rng
+        self.team_ids = []
+        self.feedback_ids = []
+
+    def call(self, label, method, path, body=None):
+        return self.recorder.timed(self.transport, label, method, path, body)
+
+    def login(self):
+        status, payload = self.call('POST /api/login', 'POST', '/api/login',
+                                    {'username': self.username, 'password': BENCH_PASSWORD})
+        if status != 200:
+            return False
+        if self.role == 'manager':
+            _, payload = self.call('GET /api/users', 'GET', '/api/users')
+            self.team_ids = [u['id'] for u in (payload or {}).get('users', [])]
+        _, payload = self.call('GET /api/feedback?limit', 'GET', f'/api/feedback?limit={PAGE_SIZE}')
+        self.feedback_ids = [f['id'] for f in (payload or {}).get('feedback', [])]
+        return True
+
+    def step(self):
+        mix = MANAGER_MIX if self.role == 'manager' else EMPLOYEE_MIX
+        label = self.rng.choices([m[1] for m in mix], weights=[m[0] for m in mix])[0]
+        if label == 'GET /api/feedback?limit':
+            self.call(label, 'GET', f'/api/feedback?limit={PAGE_SIZE}')
+        elif label.startswith('GET '):
+            self.call(label, 'GET', label[4:])
+        elif label == 'POST /api/feedback' and self.team_ids:
+            self.call(label, 'POST', '/api/feedback', {
+                'employee_id': self.rng.choice(self.team_ids),
+                'strengths': 'Benchmark strengths',
+                'areas_to_improve': 'Benchmark areas to improve',
+                'sentiment': self.rng.choice(['positive', 'neutral', 'negative']),
+            })
+        elif label == 'PUT /api/feedback/<id>' and self.feedback_ids:
+            self.call(label, 'PUT', f'/api/feedback/{self.rng.choice(self.feedback_ids)}', {
+                'strengths': 'Edited strengths',
+                'areas_to_improve': 'Edited areas to improve',
+                'sentiment': self.rng.choice(['positive', 'neutral', 'negative']),
+            })
+        elif label == 'POST /api/assign-team' and self.team_ids:
+            # Re-assign part of the current team: same work, no org drift
+            sample = self.rng.sample(self.team_ids, min(len(self.team_ids), 20))
+            self.call(label, 'POST', '/api/assign-team', {'employee_ids': sample})
+        elif label == 'POST /api/feedback/<id>/acknowledge' and self.feedback_ids:
+            self.call(label, 'POST', f'/api/feedback/{self.rng.choice(self.feedback_ids)}/acknowledge')
+        elif label == 'POST /api/feedback-request':
+            self.call(label, 'POST', '/api/feedback-request', {'message': 'Benchmark request'})
+
+    def logout(self):
+        self.call('POST /api/logout', 'POST', '/api/logout')
+
+
+def run_session(make_transport, recorder, index, args, deadline):
+    rng = random.Random(args.seed + index)
+    role = 'manager' if index % 2 == 0 else 'employee'
+    number = rng.randrange(args.managers) + 1 if role == 'manager' else rng.randrange(args.employees)
+    session = Session(make_transport(), recorder, role, number, rng)
+    if not session.login():
+        return
+    iterations = 0
+    while time.perf_counter() < deadline and (not args.iterations or iterations < args.iterations):
+        session.step()
+        iterations += 1
+    session.logout()
+
+
+def run_once_routes(make_transport, recorder, run_id):
+    # Routes that are not part of a steady-state session: bootstrap and signup
+    transport = make_transport()
+    recorder.timed(transport, 'POST /api/init-db', 'POST', '/api/init-db')
+    recorder.timed(transport, 'POST /api/seed-db', 'POST', '/api/seed-db')
+    recorder.timed(transport, 'POST /api/register', 'POST', '/api/register', {
+        'username': f'bench-signup-{run_id}',
+        'email': f'bench-signup-{run_id}@bench.example',
+        'password': BENCH_PASSWORD,
+        'role': 'employee',
+    })
+
+
+def summarize(recorder, wall_time):
+    endpoints = {}
+    total = 0
+    for label in sorted(recorder.samples):
+        samples = sorted(recorder.samples[label])
+        total += len(samples)
+        queries = recorder.queries.get(label)
+        endpoints[label] = {
+            'count': len(samples),
+            'errors': recorder.errors.get(label, 0),
+            'p50_ms': percentile(samples, 0.50) * 1000,
+            'p95_ms': percentile(samples, 0.95) * 1000,
+            'p99_ms': percentile(samples, 0.99) * 1000,
+            'mean_ms': sum(samples) / len(samples) * 1000,
+            'max_ms': samples[-1] * 1000,
+            'throughput_rps': len(samples) / wall_time if wall_time else None,
+            'queries_per_request': sum(queries) / len(queries) if queries else None,
+        }
+    return {
+        'requests': total,
+        'wall_time_s': wall_time,
+        'throughput_rps': total / wall_time if wall_time else None,
+    }, endpoints
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='sqlite:///bench.db',
+                        help='database generated by benchmarks.orggen (test-client mode)')
+    parser.add_argument('--base-url', help='drive a running server instead, e.g. http://127.0.0.1:8000')
+    parser.add_argument('--managers', type=int, default=500, help='as passed to orggen')
+    parser.add_argument('--employees', type=int, default=50000, help='as passed to orggen')
+    parser.add_argument('--sessions', type=int, default=16, help='concurrent simulated sessions')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--iterations', type=int, default=0,
+                        help='stop each session after this many requests (0 = duration only)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    recorder = Recorder()
+    if args.base_url:
+        def make_transport():
+            return HttpTransport(args.base_url)
+        dialect = None
+    else:
+        # app.py reads DATABASE_URL at import time
+        os.environ['DATABASE_URL'] = normalize_url(args.url)
+        from sqlalchemy import event
+        from app import app
+        from models import db
+
+        counter = threading.local()
+        with app.app_context():
+            engine = db.engine
+            dialect = engine.dialect.name
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            counter.value = getattr(counter, 'value', 0) + 1
+
+        def make_transport():
+            return TestClientTransport(app, counter)
+
+    run_id = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+    run_once_routes(make_transport, recorder, run_id)
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [pool.submit(run_session, make_transport, recorder, i, args, deadline)
+                   for i in range(args.sessions)]
+        for future in futures:
+            future.result()
+    overall, endpoints = summarize(recorder, time.perf_counter() - started)
+
+    print(f"{'endpoint':<40} {'count':>7} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6}")
+    for label, stats in endpoints.items():
+        queries = stats['queries_per_request']
+        print(f"{label:<40} {stats['count']:>7} {stats['errors']:>5} "
+              f"{stats['p50_ms']:>7.1f}ms {stats['p95_ms']:>7.1f}ms {stats['p99_ms']:>7.1f}ms "
+              f"{queries if queries is None else round(queries, 1)!s:>6}")
+    print(f"total {overall['requests']} requests, {overall['throughput_rps']:.1f} req/s")
+
+    if args.output:
+        results = {
+            'meta': {
+                'run_id': run_id,
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'mode': 'http' if args.base_url else 'test-client',
+                'dialect': dialect,
+                'args': vars(args),
+            },
+            'overall': overall,
+            'endpoints': endpoints,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Measure the CPU time and memory of serializing a feedback listing.
+
+Builds an in-memory SQLite database with --rows feedback rows for one
+manager, then serializes the manager's GET /api/feedback response three ways:
+
+    orm       ORM objects plus both names, a dict built per row with
+              .isoformat() calls, encoded by Flask's default JSON provider
+              (the approach before serializers.py)
+    tuples    serializers.FEEDBACK column tuples, encoded with the json module
+    orjson    serializers.FEEDBACK column tuples, encoded with orjson (skipped
+              when it is not installed)
+
+CPU time is the median of --repeat runs; peak memory is measured separately
+with tracemalloc, which slows the run down.
+"""
+import argparse
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, aliased
+
+from benchmarks.run import git_revision
+import serializers
+from models import db, User, Feedback
+
+
+def build_database(rows):
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__), [
+            {'id': 1, 'username': 'manager1', 'email': 'manager1@bench.example',
+             'password_hash': 'x', 'role': 'manager'},
+            {'id': 2, 'username': 'employee1', 'email': 'employee1@bench.example',
+             'password_hash': 'x', 'role': 'employee', 'manager_id': 1},
+        ])
+        connection.execute(insert(Feedback.__table__), [{
+            'id': i + 1,
+            'manager_id': 1,
+            'employee_id': 2,
+            'strengths': 'Takes ownership of incidents and follows through on the fixes',
+            'areas_to_improve': 'Could break large changes into smaller, easier to review pieces',
+            'sentiment': ('positive', 'neutral', 'negative')[i % 3],
+            'created_at': now - timedelta(minutes=i),
+            'updated_at': now - timedelta(minutes=i),
+            'acknowledged': i % 2 == 0,
+        } for i in range(rows)])
+    return engine
+
+
+def orm_response(session, provider):
+    manager = aliased(User)
+    employee = aliased(User)
+    rows = session.query(Feedback, manager.username, employee.username) \
+        .join(manager, Feedback.manager_id == manager.id) \
+        .join(employee, Feedback.employee_id == employee.id) \
+        .filter(Feedback.manager_id == 1) \
+        .order_by(Feedback.created_at, Feedback.id).all()
+    feedback = [{
+        'id': f.id,
+        'manager_id': f.manager_id,
+        'employee_id': f.employee_id,
+        'strengths': f.strengths,
+        'areas_to_improve': f.areas_to_improve,
+        'sentiment': f.sentiment,
+        'created_at': f.created_at.isoformat(),
+        'updated_at': f.updated_at.isoformat(),
+        'acknowledged': f.acknowledged,
+        'manager_name': manager_name,
+        'employee_name': employee_name
+    } for f, manager_name, employee_name in rows]
+    return provider.response({'feedback': feedback})
+
+
+def tuple_response(session, provider):
+    query = serializers.FEEDBACK.select() \
+        .where(Feedback.manager_id == 1) \
+        .order_by(Feedback.created_at, Feedback.id)
+    rows = session.execute(query).all()
+    return provider.response({'feedback': serializers.FEEDBACK.dump(rows)})
+
+
+@contextmanager
+def json_module_only():
+    # serializers falls back to the json module when orjson is missing
+    saved, serializers.orjson = serializers.orjson, None
+    try:
+        yield
+    finally:
+        serializers.orjson = saved
+
+
+def measure(engine, build, provider, repeat):
+    def run():
+        # A fresh session per run, as per request
+        with Session(engine) as session:
+            return build(session, provider).get_data()
+
+    body = run()  # warm up statement caches
+    cpu = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.process_time()
+        run()
+        cpu.append((time.process_time() - started) * 1000)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'cpu_ms': statistics.median(cpu), 'peak_kb': peak / 1024, 'body_bytes': len(body),
+            'rows': len(json.loads(body)['feedback'])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    engine = build_database(args.rows)
+    app = Flask(__name__)
+    provider = serializers.JSONProvider(app)
+    results = {'orm': measure(engine, orm_response, DefaultJSONProvider(app), args.repeat)}
+    with json_module_only():
+        results['tuples'] = measure(engine, tuple_response, provider, args.repeat)
+    if serializers.orjson is not None:
+        results['orjson'] = measure(engine, tuple_response, provider, args.repeat)
+
+    base = results['orm']
+    print(f"{'variant':<8} {'rows':>6} {'cpu':>9} {'per 10k':>9} {'peak':>10} {'vs orm':>16}")
+    for name, stats in results.items():
+        per_10k = stats['cpu_ms'] * 10000 / max(stats['rows'], 1)
+        print(f"{name:<8} {stats['rows']:>6} {stats['cpu_ms']:>7.1f}ms {per_10k:>7.1f}ms "
+              f"{stats['peak_kb']:>8.0f}kB {stats['cpu_ms'] / base['cpu_ms']:>6.0%} cpu "
+              f"{stats['peak_kb'] / base['peak_kb']:>4.0%} mem")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {'git_revision': git_revision(), 'rows': args.rows},
+                       'variants': results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
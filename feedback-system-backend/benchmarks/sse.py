@@ -0,0 +1,177 @@
+"""Hold many idle /api/events streams open and measure their cost.
+
+Opens --connections SSE streams for one manager, then has one of their
+employees request feedback and times how long the event takes to reach
+every stream. Reports server memory and thread count with the streams open.
+
+By default the app is served in this process by Werkzeug's threaded server
+(one thread per stream, like gunicorn's gthread worker). With --base-url the
+streams go to a running server instead, e.g.
+
+    EVENTS_MAX_STREAMS=0 gunicorn -w 1 -k gthread --threads 1000 app:app
+    python -m benchmarks.sse --base-url http://127.0.0.1:8000 --server-pid <worker pid>
+
+All client sockets are driven from a single thread with a selector.
+"""
+import argparse
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+from benchmarks import normalize_url
+from benchmarks.run import git_revision, percentile
+
+
+def _status(pid):
+    # VmRSS in kB and thread count of a process, from /proc (Linux only)
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'Threads'):
+                    values[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def login(host, port, username, password):
+    connection = HTTPConnection(host, port)
+    connection.request('POST', '/api/login', body=json.dumps({'username': username, 'password': password}),
+                       headers={'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    response.read()
+    if response.status != 200:
+        raise SystemExit(f'login as {username} failed with {response.status}')
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def open_streams(host, port, cookie, count, selector):
+    request = (f'GET /api/events HTTP/1.1\r\nHost: {host}\r\nCookie: {cookie}\r\n'
+               'Accept: text/event-stream\r\n\r\n').encode('ascii')
+    streams = []
+    for _ in range(count):
+        sock = socket.create_connection((host, port))
+        sock.sendall(request)
+        sock.setblocking(False)
+        stream = {'socket': sock, 'buffer': b''}
+        selector.register(sock, selectors.EVENT_READ, stream)
+        streams.append(stream)
+    return streams
+
+
+def read_until(selector, streams, marker, timeout):
+    """Wait until every stream has received `marker`; return arrival times."""
+    arrived = {}
+    deadline = time.perf_counter() + timeout
+    while len(arrived) < len(streams) and time.perf_counter() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            stream = key.data
+            chunk = stream['socket'].recv(65536)
+            stream['buffer'] += chunk
+            if id(stream) not in arrived and marker in stream['buffer']:
+                arrived[id(stream)] = time.perf_counter()
+                stream['buffer'] = b''
+    return list(arrived.values())
+
+
+def serve_in_process(url):
+    from werkzeug.serving import make_server
+    if url:
+        os.environ['DATABASE_URL'] = normalize_url(url)
+    # Measures the streams themselves, beyond the per-worker limit
+    os.environ.setdefault('EVENTS_MAX_STREAMS', '0')
+    from app import app, bootstrap
+    with app.app_context():
+        bootstrap()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return '127.0.0.1', server.server_port, os.getpid()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--base-url', help='benchmark a running server instead of an in-process one')
+    parser.add_argument('--server-pid', type=int, help='worker pid to sample memory from with --base-url')
+    parser.add_argument('--url', help='database URL for the in-process server')
+    parser.add_argument('--manager', default='TheManager')
+    parser.add_argument('--manager-password', default='@12345')
+    parser.add_argument('--employee', default='Jack', help='an employee of --manager')
+    parser.add_argument('--employee-password', default='@123456')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    if args.base_url:
+        parts = urlsplit(args.base_url)
+        host, port, server_pid = parts.hostname, parts.port or 80, args.server_pid
+    else:
+        host, port, server_pid = serve_in_process(args.url)
+
+    manager_cookie = login(host, port, args.manager, args.manager_password)
+    employee_cookie = login(host, port, args.employee, args.employee_password)
+    before = _status(server_pid) if server_pid else {}
+
+    selector = selectors.DefaultSelector()
+    started = time.perf_counter()
+    streams = open_streams(host, port, manager_cookie, args.connections, selector)
+    connected = read_until(selector, streams, b'retry:', args.timeout)
+    connect_s = time.perf_counter() - started
+    print(f"{len(connected)}/{args.connections} streams open in {connect_s:.2f}s")
+    time.sleep(1)
+    after = _status(server_pid) if server_pid else {}
+
+    sent = time.perf_counter()
+    connection = HTTPConnection(host, port)
+    connection.request('POST', '/api/feedback-request', body=json.dumps({'message': 'benchmark'}),
+                       headers={'Content-Type': 'application/json', 'Cookie': employee_cookie})
+    connection.getresponse().read()
+    delivered = sorted((t - sent) * 1000 for t in read_until(selector, streams, b'event: feedback_requested',
+                                                             args.timeout))
+    for stream in streams:
+        stream['socket'].close()
+
+    results = {
+        'meta': {'git_revision': git_revision(), 'connections': args.connections,
+                 'server': args.base_url or 'in-process werkzeug (threaded)'},
+        'connected': len(connected),
+        'connect_s': connect_s,
+        'delivered': len(delivered),
+        'fanout_ms': {
+            'p50': percentile(delivered, 0.50),
+            'p99': percentile(delivered, 0.99),
+            'max': delivered[-1] if delivered else None,
+        },
+    }
+    if before and after:
+        results['server'] = {
+            'rss_kb_before': before.get('VmRSS'),
+            'rss_kb_with_streams': after.get('VmRSS'),
+            'rss_kb_per_stream': (after['VmRSS'] - before['VmRSS']) / max(len(connected), 1),
+            'threads_with_streams': after.get('Threads'),
+        }
+    if delivered:
+        print(f"event delivered to {len(delivered)} streams: p50 {results['fanout_ms']['p50']:.1f}ms "
+              f"p99 {results['fanout_ms']['p99']:.1f}ms max {results['fanout_ms']['max']:.1f}ms")
+    else:
+        print("event was not delivered to any stream")
+    if 'server' in results:
+        print(f"server RSS {results['server']['rss_kb_with_streams']} kB "
+              f"(~{results['server']['rss_kb_per_stream']:.1f} kB per stream), "
+              f"{results['server']['threads_with_streams']} threads")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
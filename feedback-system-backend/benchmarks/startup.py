@@ -0,0 +1,85 @@
+"""Measure worker start-up cost: app import time and first-request latency.
+
+Each sample runs in a fresh interpreter, the way a new gunicorn worker
+would, and also counts SQL statements issued during import (expected: 0).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks import normalize_url
+from benchmarks.run import git_revision
+
+# Runs inside the child interpreter; prints one JSON line
+PROBE = r'''
+import contextlib, io, json, time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+statements = {'count': 0}
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count(*args):
+    statements['count'] += 1
+
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    from app import app
+import_s = time.perf_counter() - started
+import_statements = statements['count']
+
+client = app.test_client()
+started = time.perf_counter()
+health = client.get('/health')
+first_request_s = time.perf_counter() - started
+started = time.perf_counter()
+db_request = client.get('/test-db')
+first_db_request_s = time.perf_counter() - started
+print(json.dumps({
+    'import_s': import_s,
+    'import_statements': import_statements,
+    'first_request_s': first_request_s,
+    'first_db_request_s': first_db_request_s,
+    'status': [health.status_code, db_request.status_code],
+}))
+'''
+
+
+def sample(env):
+    output = subprocess.check_output([sys.executable, '-c', PROBE], env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='database URL (defaults to the app default)')
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    if args.url:
+        env['DATABASE_URL'] = normalize_url(args.url)
+    samples = [sample(env) for _ in range(args.samples)]
+
+    results = {'meta': {'git_revision': git_revision(), 'samples': args.samples}}
+    for key in ('import_s', 'first_request_s', 'first_db_request_s'):
+        values = sorted(s[key] for s in samples)
+        results[key] = {
+            'median_ms': statistics.median(values) * 1000,
+            'max_ms': values[-1] * 1000,
+        }
+        print(f"{key:<20} median {results[key]['median_ms']:8.1f}ms   max {results[key]['max_ms']:8.1f}ms")
+    results['import_statements'] = max(s['import_statements'] for s in samples)
+    print(f"SQL statements during import: {results['import_statements']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Compare response size and server CPU of the API's wire formats.
+
+Builds an in-memory SQLite database of feedback from one manager to a team
+of --employees, with text assembled at random from sentence fragments (so
+it compresses like real prose rather than like one repeated row), then
+encodes the manager's GET /api/feedback
+listing at each --sizes row count as
+
+    json       serializers.JSONProvider (orjson when installed)
+    msgpack    serializers.packb (skipped when msgpack is not installed)
+
+each uncompressed, gzip'd and brotli'd (skipped when brotli is not
+installed) with the levels compression.py uses. CPU is the median of
+--repeat runs of encoding plus compressing, the work a worker does per
+response; transfer is the time the body takes on a --link-mbps link.
+
+    python -m benchmarks.wire --sizes 50,500,5000 --link-mbps 2
+"""
+import argparse
+import gzip
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from benchmarks.orggen import AREAS, STRENGTHS
+from benchmarks.run import git_revision
+import compression
+import serializers
+from models import db, User, Feedback
+
+FRAGMENTS = [
+    'during the {} migration', 'in the {} incident review', 'when onboarding the {} team',
+    'across the {} roadmap', 'while pairing on the {} service', 'in {} planning',
+]
+PROJECTS = ['billing', 'search', 'payments', 'mobile', 'reporting', 'identity', 'checkout', 'analytics']
+
+
+def _text(rng, sentences):
+    parts = []
+    for sentence in rng.sample(sentences, rng.randint(1, 3)):
+        parts.append(f"{sentence} {rng.choice(FRAGMENTS).format(rng.choice(PROJECTS))}"
+                     f"{'' if rng.random() < 0.5 else f' (Q{rng.randint(1, 4)})'}.")
+    return ' '.join(parts)
+
+
+def build_database(rows, employees, seed=42):
+    rng = random.Random(seed)
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__), [
+            {'id': 1, 'username': 'manager1', 'email': 'manager1@bench.example', 'password_hash': 'x',
+             'role': 'manager'},
+            *[{'id': 2 + i, 'username': f'{rng.choice(["alex", "sam", "priya", "jordan", "mei"])}.{i}',
+               'email': f'employee{i}@bench.example', 'password_hash': 'x', 'role': 'employee',
+               'manager_id': 1} for i in range(employees)],
+        ])
+        connection.execute(insert(Feedback.__table__), [{
+            'id': i + 1,
+            'manager_id': 1,
+            'employee_id': 2 + rng.randrange(employees),
+            'strengths': _text(rng, STRENGTHS),
+            'areas_to_improve': _text(rng, AREAS),
+            'sentiment': rng.choice(('positive', 'neutral', 'negative')),
+            'created_at': now - timedelta(seconds=rng.randrange(3 * 365 * 86400)),
+            'updated_at': now - timedelta(seconds=rng.randrange(365 * 86400)),
+            'acknowledged': rng.random() < 0.8,
+        } for i in range(rows)])
+    return engine
+
+
+def encoders(provider):
+    formats = {'json': lambda obj: provider.response(obj).get_data()}
+    if serializers.msgpack is not None:
+        formats['msgpack'] = serializers.packb
+    encodings = {'identity': None, 'gzip': 'gzip'}
+    if compression.brotli is not None:
+        encodings['br'] = 'br'
+    return formats, encodings
+
+
+def decode(fmt, encoding, body):
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'br':
+        body = compression.brotli.decompress(body)
+    return json.loads(body) if fmt == 'json' else serializers.msgpack.unpackb(body)
+
+
+def measure(encode, encoding, obj, repeat):
+    def run():
+        body = encode(obj)
+        return compression.compress_all(encoding, body) if encoding else body
+
+    body = run()
+    cpu = []
+    for _ in range(repeat):
+        started = time.process_time()
+        run()
+        cpu.append((time.process_time() - started) * 1000)
+    return body, statistics.median(cpu)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='50,500,5000', help='comma-separated listing sizes in rows')
+    parser.add_argument('--employees', type=int, default=12, help='team size of the manager')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--link-mbps', type=float, default=2.0, help='link speed for the transfer column')
+    parser.add_argument('--output', help='write JSON results to this file')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    engine = build_database(max(sizes), args.employees)
+    app = Flask(__name__)
+    compression.init_app(app)
+    provider = serializers.JSONProvider(app)
+    formats, encodings = encoders(provider)
+
+    results = []
+    print(f"{'rows':>6} {'format':<18} {'bytes':>9} {'vs json':>8} {'cpu':>9} {'transfer':>10}")
+    with app.app_context(), Session(engine) as session:
+        for size in sizes:
+            rows = session.execute(
+                serializers.FEEDBACK.select().where(Feedback.manager_id == 1)
+                .order_by(Feedback.created_at, Feedback.id).limit(size)
+            ).all()
+            obj = {'feedback': serializers.FEEDBACK.dump(rows)}
+            expected = json.loads(provider.response(obj).get_data())
+            baseline = None
+            for fmt, encode in formats.items():
+                for encoding_name, encoding in encodings.items():
+                    body, cpu_ms = measure(encode, encoding, obj, args.repeat)
+                    if decode(fmt, encoding, body) != expected:
+                        raise SystemExit(f'{fmt}+{encoding_name} does not round-trip')
+                    baseline = baseline or len(body)
+                    transfer_ms = len(body) * 8 / (args.link_mbps * 1e6) * 1000
+                    name = f'{fmt}+{encoding_name}'
+                    print(f"{size:>6} {name:<18} {len(body):>9} {len(body) / baseline:>8.1%} "
+                          f"{cpu_ms:>7.2f}ms {transfer_ms:>8.1f}ms")
+                    results.append({'rows': size, 'format': fmt, 'encoding': encoding_name,
+                                    'bytes': len(body), 'cpu_ms': cpu_ms, 'transfer_ms': transfer_ms})
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': {'git_revision': git_revision(), 'link_mbps': args.link_mbps,
+                                'gzip_level': app.config['COMPRESS_GZIP_LEVEL'],
+                                'brotli_quality': app.config['COMPRESS_BROTLI_QUALITY']},
+                       'results': results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
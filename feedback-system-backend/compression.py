@@ -0,0 +1,117 @@
+import zlib
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional: `pip install brotli` for Content-Encoding: br
+    brotli = None
+
+# Response compression for the API blueprint (routes.after_request).
+#
+# JSON, MessagePack, NDJSON and CSV responses of COMPRESS_MIN_BYTES or more
+# (default 1024) are compressed with brotli (when installed) or gzip,
+# whichever the client's Accept-Encoding prefers, brotli on a tie. Streamed
+# responses (the export) are compressed chunk by chunk, each chunk flushed
+# so the client can decode it as soon as it arrives; they are compressed
+# whatever their size, which is unknown up front. Server-sent events are
+# never compressed.
+#
+#   COMPRESS_MIN_BYTES       smallest buffered body worth compressing
+#   COMPRESS_GZIP_LEVEL      zlib level, 1-9 (default 6)
+#   COMPRESS_BROTLI_QUALITY  brotli quality, 0-11 (default 5: about the CPU
+#                            cost of gzip -6 for a slightly smaller body;
+#                            below 5 brotli loses to gzip on our listings)
+
+COMPRESSIBLE = {'application/json', 'application/msgpack', 'application/x-ndjson', 'text/csv'}
+
+
+class GzipEncoder:
+    def __init__(self, level):
+        # wbits 31: gzip container rather than a raw zlib stream
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def chunk(self, data):
+        # Everything so far, decodable by the client without waiting for more
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def chunk(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def choose_encoding(accept_encodings):
+    """'br', 'gzip' or None for an Accept-Encoding header value set."""
+    offers = ['br', 'gzip'] if brotli is not None else ['gzip']
+    quality = {name: accept_encodings[name] for name in offers}
+    best = max(offers, key=lambda name: quality[name])
+    return best if quality[best] > 0 else None
+
+
+def encoder(name):
+    config = current_app.config
+    if name == 'br':
+        return BrotliEncoder(config['COMPRESS_BROTLI_QUALITY'])
+    return GzipEncoder(config['COMPRESS_GZIP_LEVEL'])
+
+
+def compress_all(name, data):
+    compressor = encoder(name)
+    return compressor.compress(data) + compressor.finish()
+
+
+def _stream(compressor, chunks):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            compressed = compressor.chunk(chunk)
+            if compressed:
+                yield compressed
+        yield compressor.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    if response.mimetype not in COMPRESSIBLE or request.method == 'HEAD' \
+            or response.status_code < 200 or response.status_code in (204, 304) \
+            or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    name = choose_encoding(request.accept_encodings)
+    if name is None:
+        return response
+    if response.is_streamed:
+        response.response = _stream(encoder(name), response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_BYTES']:
+            return response
+        response.set_data(compress_all(name, data))
+    response.headers['Content-Encoding'] = name
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('COMPRESS_MIN_BYTES', 1024)
+    app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
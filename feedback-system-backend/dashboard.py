@@ -0,0 +1,142 @@
+from collections import defaultdict
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, User, Feedback, FeedbackSummary
+import serializers
+
+# Dashboard engine: counts come from the per-user FeedbackSummary row, which
+# the write routes keep up to date in the same transaction as the Feedback
+# change, and the "recent" lists come from an ordered, limited query. No
+# dashboard request loads a user's whole feedback history.
+#
+# Counter changes are upserts, so the first feedback of a user creates their
+# row and concurrent first writes add up instead of colliding. A user without
+# a row has never given or received feedback, and reads as all zeros.
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+COUNTERS = ('total',) + SENTIMENTS + ('unacknowledged',)
+RECENT_LIMIT = 5
+
+
+def _insert(dialect_name):
+    return postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+
+
+def get_summary(user_id, scope):
+    """Return the user's counters as a dict keyed by COUNTERS."""
+    summary = db.session.get(FeedbackSummary, (user_id, scope))
+    return {counter: getattr(summary, counter) if summary is not None else 0 for counter in COUNTERS}
+
+
+def _apply_many(scope, deltas_by_user):
+    """Add per-user counter deltas for one scope in a single INSERT ... ON CONFLICT.
+
+    deltas_by_user maps user_id -> {counter: delta}. A user without a summary
+    row has no feedback yet, so the deltas are their counts.
+    """
+    rows = [{'user_id': user_id, 'scope': scope, **{counter: deltas.get(counter, 0) for counter in COUNTERS}}
+            for user_id, deltas in sorted(deltas_by_user.items()) if any(deltas.values())]
+    if not rows:
+        return
+    insert = _insert(db.session.get_bind().dialect.name)
+    statement = insert(FeedbackSummary).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[FeedbackSummary.user_id, FeedbackSummary.scope],
+        set_={counter: getattr(FeedbackSummary, counter) + statement.excluded[counter] for counter in COUNTERS}
+    ))
+
+
+def _feedback_deltas(sentiment, acknowledged):
+    deltas = {'total': 1}
+    if sentiment in SENTIMENTS:
+        deltas[sentiment] = 1
+    if not acknowledged:
+        deltas['unacknowledged'] = 1
+    return deltas
+
+
+def _apply_both(feedback, deltas):
+    db.session.flush()
+    _apply_many('manager', {feedback.manager_id: deltas})
+    _apply_many('employee', {feedback.employee_id: deltas})
+
+
+def record_created(feedback):
+    """Count a newly added Feedback row. Call before committing."""
+    _apply_both(feedback, _feedback_deltas(feedback.sentiment, feedback.acknowledged))
+
+
+def record_created_many(rows):
+    """Count inserted feedback given as dicts with manager_id, employee_id,
+    sentiment and acknowledged. Costs two statements whatever the batch size."""
+    by_manager = defaultdict(lambda: defaultdict(int))
+    by_employee = defaultdict(lambda: defaultdict(int))
+    for row in rows:
+        for counter, delta in _feedback_deltas(row['sentiment'], row.get('acknowledged')).items():
+            by_manager[row['manager_id']][counter] += delta
+            by_employee[row['employee_id']][counter] += delta
+    _apply_many('manager', by_manager)
+    _apply_many('employee', by_employee)
+
+
+def record_sentiment_change(feedback, old_sentiment):
+    """Move one count between sentiment buckets. Call before committing."""
+    if old_sentiment == feedback.sentiment:
+        return
+    deltas = {}
+    if old_sentiment in SENTIMENTS:
+        deltas[old_sentiment] = -1
+    if feedback.sentiment in SENTIMENTS:
+        deltas[feedback.sentiment] = 1
+    _apply_both(feedback, deltas)
+
+
+def record_acknowledged(feedback):
+    """Count a Feedback row that just went from unacknowledged to acknowledged."""
+    _apply_both(feedback, {'unacknowledged': -1})
+
+
+def record_acknowledged_many(employee_id, manager_ids):
+    """Count feedback acknowledged in bulk by one employee; manager_ids has
+    one entry per acknowledged row."""
+    by_manager = defaultdict(int)
+    for manager_id in manager_ids:
+        by_manager[manager_id] -= 1
+    _apply_many('manager', {m: {'unacknowledged': n} for m, n in by_manager.items()})
+    _apply_many('employee', {employee_id: {'unacknowledged': -len(manager_ids)}})
+
+
+def manager_dashboard(user):
+    user_id = user.id
+    summary = get_summary(user_id, 'manager')
+    team_size = db.session.query(func.count(User.id)).filter(User.manager_id == user_id).scalar()
+    recent = db.session.execute(
+        serializers.MANAGER_RECENT.select()
+        .where(Feedback.manager_id == user_id)
+        .order_by(Feedback.created_at.desc(), Feedback.id.desc())
+        .limit(RECENT_LIMIT)
+    ).all()
+    return {
+        'type': 'manager',
+        'team_size': team_size,
+        'total_feedback': summary['total'],
+        'sentiment_counts': {s: summary[s] for s in SENTIMENTS},
+        'recent_feedback': serializers.MANAGER_RECENT.dump(recent)
+    }
+
+
+def employee_dashboard(user):
+    user_id = user.id
+    summary = get_summary(user_id, 'employee')
+    recent = db.session.execute(
+        serializers.EMPLOYEE_RECENT.select()
+        .where(Feedback.employee_id == user_id)
+        .order_by(Feedback.created_at.desc(), Feedback.id.desc())
+        .limit(RECENT_LIMIT)
+    ).all()
+    return {
+        'type': 'employee',
+        'total_feedback': summary['total'],
+        'unacknowledged_count': summary['unacknowledged'],
+        'recent_feedback': serializers.EMPLOYEE_RECENT.dump(recent)
+    }
@@ -1,3 +1,59 @@
+import asyncio
+from contextvars import ContextVar
+
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.util import await_only
+
+# Bind key of the optional read replica (SQLALCHEMY_BINDS, see replica.py)
+REPLICA = 'replica'
+
+# While asgi.py serves a request on the event loop: each Flask-SQLAlchemy
+# engine mapped to the sync facade of the async engine standing in for it
+async_engines = ContextVar('async_engines', default=None)
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica during read-only requests.
+
+    A request marked with replica.read_only sends its reads to the 'replica'
+    bind. Anything that writes, and every read after this session's first
+    write or a use_primary() call, goes to the primary. Under asgi.py the
+    chosen engine is swapped for its async counterpart.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = self._route(mapper, clause, bind, **kwargs)
+        swap = async_engines.get()
+        return swap.get(engine, engine) if swap else engine
+
+    def _route(self, mapper, clause, bind, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info['primary'] = True
+                self.info['wrote'] = True
+            elif (not self.info.get('primary') and REPLICA in self._db.engines
+                  and has_app_context() and g.get('db_read_only')):
+                return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_primary():
+    """Send the rest of this session's reads to the primary, e.g. before
+    reading data that a write will be derived from."""
+    db.session.info['primary'] = True
+
+
+def run_blocking(fn, *args):
+    """Call fn(*args). Under asgi.py, on the event loop, run it on the loop's
+    default thread pool and suspend the request until it returns, so blocking
+    I/O outside the database (the sqlite3 files of the events broker and the
+    response cache) does not stall every other request."""
+    if async_engines.get() is None:
+        return fn(*args)
+    return await_only(asyncio.get_running_loop().run_in_executor(None, fn, *args))
+
 
-db = SQLAlchemy() 
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': RoutingSession})
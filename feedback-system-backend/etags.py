@@ -0,0 +1,69 @@
+from functools import wraps
+
+from flask import g, make_response, request
+from flask_login import current_user
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, DataVersion
+
+# Conditional GET for the per-user listing routes.
+#
+# Each user has a version number in data_version. Write routes call bump() for
+# every user whose dashboard, feedback or feedback request listings they
+# change, before committing. Routes wrapped in @conditional tag responses with
+# a weak ETag of the caller's id and version, and answer a matching
+# If-None-Match with 304 after one primary-key lookup, without running the
+# listing queries. Users without a row are at version 0.
+#
+# The version is read before the listing runs, so a write that lands in
+# between can only make the ETag older than the body, never newer: the next
+# request simply refetches.
+
+
+def _insert(dialect_name):
+    return postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+
+
+def bump(*user_ids):
+    """Advance the version of each given user in one statement. Call before committing."""
+    user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+    if not user_ids:
+        return
+    insert = _insert(db.session.get_bind().dialect.name)
+    statement = insert(DataVersion).values([{'user_id': user_id, 'version': 1} for user_id in user_ids])
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[DataVersion.user_id],
+        set_={'version': DataVersion.version + 1}
+    ))
+
+
+def current_version(user_id):
+    version = db.session.scalar(select(DataVersion.version).where(DataVersion.user_id == user_id))
+    return version or 0
+
+
+def request_version():
+    """The caller's version, read once per request (before the view runs)."""
+    if 'data_version' not in g:
+        g.data_version = current_version(current_user.id)
+    return g.data_version
+
+
+def conditional(view):
+    """Add ETag revalidation to a GET route. Apply below @login_required."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = f'{current_user.id}.{request_version()}'
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        # Cache per browser, but always revalidate
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
+    return wrapper
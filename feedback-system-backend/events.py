@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response
+
+import instrumentation
+from db import run_blocking
+
+# Server-sent events for logged-in users (GET /api/events).
+#
+# Write routes call publish() after committing. The hub hands each message to
+# a backend, which delivers it to dispatch() in every worker process; dispatch
+# queues it for that worker's open streams of the target users.
+#
+#   EVENTS_BACKEND      'memory' (default): delivery only within the publishing
+#                       process, which is enough for one worker.
+#                       'sqlite': messages go through a shared SQLite file
+#                       (EVENTS_BROKER_PATH), polled by one thread per worker,
+#                       so every gunicorn worker on the host sees them. A local
+#                       stand-in for a broker such as Redis pub/sub.
+#   EVENTS_HEARTBEAT    seconds between keep-alive comments on an idle stream
+#   EVENTS_QUEUE_SIZE   per-stream backlog; a client that falls this far behind
+#                       is disconnected and reconnects through EventSource
+#   EVENTS_MAX_STREAMS  open streams per worker (default 50, 0 for no limit);
+#                       further ones are refused with 503
+#
+# An open stream holds a thread (use a threaded or async worker class) but no
+# database connection: the request context is torn down as soon as the
+# response starts. The limit keeps streams from taking every thread, so
+# gunicorn.conf.py sizes each worker's threads as the database pool plus
+# EVENTS_MAX_STREAMS.
+
+logger = logging.getLogger(__name__)
+
+
+class TooManyStreams(Exception):
+    """Raised when this worker already has EVENTS_MAX_STREAMS open streams."""
+
+
+class MemoryBackend:
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, messages):
+        for message in messages:
+            self.dispatch(message)
+
+
+class SQLiteBrokerBackend:
+    """Fan messages out across processes through an append-only SQLite table."""
+
+    def __init__(self, path, poll_interval=0.2, retention=60):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._local = threading.local()
+        self._poller_pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS events ('
+                               'id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, payload TEXT NOT NULL)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def ensure_polling(self):
+        # Threads do not survive fork, so each worker starts its own poller
+        if self._poller_pid == os.getpid():
+            return
+        with self._lock:
+            if self._poller_pid != os.getpid():
+                last_id = self._connection().execute('SELECT coalesce(max(id), 0) FROM events').fetchone()[0]
+                threading.Thread(target=self._poll, args=(last_id,), name='events-poller', daemon=True).start()
+                self._poller_pid = os.getpid()
+
+    def publish(self, messages):
+        run_blocking(self._insert, messages)
+
+    def _insert(self, messages):
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany('INSERT INTO events (created, payload) VALUES (?, ?)',
+                                   [(now, json.dumps(message)) for message in messages])
+
+    def _poll(self, last_id):
+        connection = self._connection()
+        pruned_at = 0
+        while True:
+            try:
+                rows = connection.execute('SELECT id, payload FROM events WHERE id > ? ORDER BY id',
+                                          (last_id,)).fetchall()
+                for last_id, payload in rows:
+                    self.dispatch(json.loads(payload))
+                if time.time() - pruned_at > self.retention:
+                    pruned_at = time.time()
+                    connection.execute('DELETE FROM events WHERE created < ?', (pruned_at - self.retention,))
+            except Exception:
+                logger.exception('Event broker poll failed')
+            time.sleep(self.poll_interval)
+
+
+class Subscription:
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.queue = queue.Queue(queue_size)
+        self.overflowed = False
+
+
+class Hub:
+    def __init__(self, backend=None, queue_size=100, max_streams=0):
+        self.queue_size = queue_size
+        self.max_streams = max_streams
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self.set_backend(backend or MemoryBackend())
+
+    def set_backend(self, backend):
+        self.backend = backend
+        backend.start(self.dispatch)
+
+    def subscribe(self, user_id):
+        if hasattr(self.backend, 'ensure_polling'):
+            self.backend.ensure_polling()
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            if self.max_streams and self._count() >= self.max_streams:
+                raise TooManyStreams()
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_ids, event, data):
+        self.publish_many([(user_ids, event, data)])
+
+    def publish_many(self, events):
+        """Publish (user_ids, event, data) triples in one backend call."""
+        messages = [{'users': sorted(set(user_ids)), 'event': event, 'data': data}
+                    for user_ids, event, data in events]
+        if not messages:
+            return
+        try:
+            self.backend.publish(messages)
+        except Exception:
+            # The write is already committed; clients catch up on their next fetch
+            logger.exception('Publishing %d event(s) failed', len(messages))
+
+    def dispatch(self, message):
+        with self._lock:
+            targets = [subscription for user_id in message['users']
+                       for subscription in self._subscribers.get(user_id, ())]
+        for subscription in targets:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.overflowed = True
+
+
+hub = Hub()
+_settings = {'heartbeat': 15.0}
+
+
+def publish(user_ids, event, data):
+    hub.publish(user_ids, event, data)
+
+
+def publish_many(events):
+    hub.publish_many(events)
+
+
+def _stream(subscription, heartbeat):
+    # Clients reconnect after 5s if the stream drops
+    yield 'retry: 5000\n\n'
+    while not subscription.overflowed:
+        try:
+            message = subscription.queue.get(timeout=heartbeat)
+        except queue.Empty:
+            yield ': keep-alive\n\n'
+            continue
+        yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+def stream_response(user_id):
+    subscription = hub.subscribe(user_id)
+    response = Response(_stream(subscription, _settings['heartbeat']), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies (nginx) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Runs when the server closes the response, even if streaming never started
+    response.call_on_close(lambda: hub.unsubscribe(subscription))
+    return response
+
+
+def init_app(app):
+    app.config.setdefault('EVENTS_BACKEND', 'memory')
+    app.config.setdefault('EVENTS_BROKER_PATH', os.path.join(app.instance_path, 'events.db'))
+    app.config.setdefault('EVENTS_HEARTBEAT', 15.0)
+    app.config.setdefault('EVENTS_QUEUE_SIZE', 100)
+    app.config.setdefault('EVENTS_MAX_STREAMS', 50)
+    backend = app.config['EVENTS_BACKEND']
+    if backend == 'sqlite':
+        os.makedirs(os.path.dirname(os.path.abspath(app.config['EVENTS_BROKER_PATH'])), exist_ok=True)
+        hub.set_backend(SQLiteBrokerBackend(app.config['EVENTS_BROKER_PATH']))
+    elif backend == 'memory':
+        hub.set_backend(MemoryBackend())
+    else:
+        raise ValueError(f"Unsupported EVENTS_BACKEND '{backend}'")
+    hub.queue_size = app.config['EVENTS_QUEUE_SIZE']
+    hub.max_streams = app.config['EVENTS_MAX_STREAMS']
+    _settings['heartbeat'] = app.config['EVENTS_HEARTBEAT']
+
+    instrumentation.registry.set_gauge_source(
+        'sse_connections', 'Open /api/events streams in this worker.',
+        lambda: {(): hub.connection_count()}
+    )
@@ -0,0 +1,38 @@
+import os
+
+# Gunicorn settings, read by `gunicorn app:app` when started from this
+# directory (command-line options still override them).
+#
+# The dashboard, feedback list and feedback requests pages each keep a
+# server-sent event stream open (GET /api/events), and an open stream holds a
+# worker thread until the tab closes. Gunicorn's default sync worker has one
+# thread, so a single open tab would stall every other request; threaded
+# workers serve the API beside the streams.
+#
+# Streams hold no database connection, and a worker refuses more than
+# EVENTS_MAX_STREAMS of them (see events.py). The other threads each need a
+# connection, and threads beyond the pool (DB_POOL_SIZE + DB_MAX_OVERFLOW, see
+# app.py) would only wait for one and fail after DB_POOL_TIMEOUT. So by
+# default a worker gets the pool's connections plus the stream limit in
+# threads: 5 + 10 + 50. With EVENTS_MAX_STREAMS=0 (no limit), set
+# GUNICORN_THREADS yourself.
+#
+#   GUNICORN_THREADS  threads per worker (default: computed as above)
+#
+# The number of workers comes from gunicorn's own WEB_CONCURRENCY (default 1).
+# With more than one, set EVENTS_BACKEND=sqlite (or put a shared broker behind
+# events.py): the default in-memory backend only delivers an event to streams
+# in the worker that published it.
+
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS') or (
+    int(os.environ.get('DB_POOL_SIZE', 5)) + int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    + int(os.environ.get('EVENTS_MAX_STREAMS', 50))
+))
+
+
+def on_starting(server):
+    if server.cfg.workers > 1 and os.environ.get('EVENTS_BACKEND', 'memory') == 'memory':
+        server.log.warning('%d workers share EVENTS_BACKEND=memory: live updates only reach '
+                           'streams in the publishing worker; set EVENTS_BACKEND=sqlite',
+                           server.cfg.workers)
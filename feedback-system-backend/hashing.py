@@ -0,0 +1,195 @@
+import multiprocessing
+import os
+import secrets
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Password hashing off the request thread.
+#
+# Werkzeug's KDFs are deliberately slow and CPU-bound, so they run in a small
+# per-worker process pool. At most PASSWORD_HASH_MAX_PENDING hashes may be
+# queued or running at once; past that, requests fail fast with HashingBusy
+# (mapped to 503 + Retry-After) instead of tying up the worker behind a queue.
+# A pool whose process died (e.g. OOM killed) is dropped with the same 503,
+# and the next hash starts a new one.
+#
+# Pool processes are started by a forkserver (spawn where there is none)
+# rather than forked from the app worker, which may be running many request
+# threads: a child forked while another thread holds a lock can deadlock.
+#
+#   PASSWORD_HASH_METHOD       werkzeug method string, e.g. 'scrypt' or
+#                              'scrypt:65536:8:1' or 'pbkdf2:sha256:1000000'
+#   PASSWORD_HASH_WORKERS      pool processes per app worker (0 = hash inline)
+#   PASSWORD_HASH_MAX_PENDING  admission limit for queued + running hashes
+#   PASSWORD_HASH_TIMEOUT      seconds to wait for a result before giving up
+#
+# Hashes created with different parameters than PASSWORD_HASH_METHOD are
+# reported by needs_rehash(), and login upgrades them in place.
+#
+# Generated invite passwords (see importer.py) carry 128 random bits, which
+# no KDF cost makes any harder to guess, so hash_invite() uses a single
+# PBKDF2 round; the first login rehashes them at full cost.
+
+INVITE_HASH_METHOD = 'pbkdf2:sha256:1'
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated or too slow to answer."""
+
+
+_settings = {
+    'method': 'scrypt',
+    'workers': 2,
+    'max_pending': 8,
+    'timeout': 10.0,
+}
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(_settings['max_pending'])
+
+
+def _canonical_method(method):
+    # Same defaults werkzeug applies, in the form it writes into the hash
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f"Unsupported password hash method '{method}'")
+
+
+def _executor():
+    global _pool, _pool_pid
+    # A pool inherited across fork (e.g. gunicorn --preload) is unusable
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    # Children only need werkzeug, not the app
+                    context.set_forkserver_preload(['werkzeug.security'])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                _pool = ProcessPoolExecutor(max_workers=_settings['workers'], mp_context=context)
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _discard(pool):
+    # A broken pool refuses all work; the next _executor() call replaces it
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _run(fn, *args):
+    if _settings['workers'] <= 0:
+        return fn(*args)
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    pool = _executor()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        _discard(pool)
+        raise HashingBusy()
+    except Exception:
+        slots.release()
+        raise
+    # The slot is held until the hash actually finishes, even after a timeout
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=_settings['timeout'])
+    except FutureTimeout:
+        raise HashingBusy()
+    except BrokenProcessPool:
+        _discard(pool)
+        raise HashingBusy()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _settings['method'])
+
+
+def check_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def hash_passwords(passwords):
+    """Hash many passwords for seeding and imports.
+
+    Uses the pool's full parallelism and waits instead of applying the
+    request admission limit.
+    """
+    passwords = list(passwords)
+    if _settings['workers'] <= 0 or len(passwords) < 2:
+        return [generate_password_hash(p, _settings['method']) for p in passwords]
+    chunksize = max(1, len(passwords) // (_settings['workers'] * 4))
+    pool = _executor()
+    try:
+        return list(pool.map(generate_password_hash, passwords,
+                             [_settings['method']] * len(passwords), chunksize=chunksize))
+    except BrokenProcessPool:
+        _discard(pool)
+        raise
+
+
+def new_invite():
+    """Return (password, hash) for a generated invite password."""
+    password = secrets.token_urlsafe(16)
+    return password, generate_password_hash(password, INVITE_HASH_METHOD)
+
+
+def shutdown():
+    """Stop the pool's processes once its hashes finish; the next hash starts
+    a new pool. Servers that exit on a signal without running atexit hooks
+    (uvicorn, see asgi.py) must call this or the processes outlive them."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
+
+
+def resize_pool(workers):
+    """Use `workers` pool processes from now on, e.g. every core for a
+    one-off bulk import. Waits for the current pool's hashes to finish."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown()
+        _pool = None
+        _settings['workers'] = workers
+
+
+def needs_rehash(password_hash):
+    stored_method = password_hash.split('$', 1)[0]
+    return stored_method != _canonical_method(_settings['method'])
+
+
+def init_app(app):
+    global _slots
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+    app.config.setdefault('PASSWORD_HASH_MAX_PENDING', 8)
+    app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10.0)
+    # Fail at startup rather than on the first login
+    _canonical_method(app.config['PASSWORD_HASH_METHOD'])
+    _settings.update(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+    )
+    _slots = threading.BoundedSemaphore(_settings['max_pending'])
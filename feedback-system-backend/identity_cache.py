@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g
+from sqlalchemy.orm import make_transient_to_detached
+
+import etags
+from models import db, User
+
+# Per-process cache of the logged-in user's row for Flask-Login's user_loader.
+#
+# Entries are stored with the user's data_version (see etags.py), which is
+# read on every load with one primary-key lookup and kept in g for the
+# request's ETag. A hit at the same version rebuilds the User from the cached
+# column values and attaches it to the request's session without selecting
+# the row, so later db.session.get(User, id) calls in the same request are
+# identity-map hits as well. Writes that change a user's role or manager_id
+# bump that user's version, so every gunicorn worker misses on its next
+# request; invalidate() only drops the local entry, for changes (such as a
+# rehashed password) that do not matter to other workers. Entries also expire
+# after IDENTITY_CACHE_TTL seconds (default 30).
+
+_COLUMNS = [column.key for column in User.__mapper__.column_attrs]
+
+
+class IdentityCache:
+    def __init__(self, ttl=30, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, cached_version, values = entry
+            if expires_at < time.monotonic() or cached_version != version:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def put(self, user_id, version, values):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, version, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = IdentityCache()
+
+
+def load_user(user_id):
+    if cache.ttl <= 0:
+        return db.session.get(User, user_id)
+    # Read before the user row, like etags.request_version(): a write in
+    # between can only leave the entry older than its version
+    version = g.data_version = etags.current_version(user_id)
+    values = cache.get(user_id, version)
+    if values is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            cache.put(user_id, version, {key: getattr(user, key) for key in _COLUMNS})
+        return user
+    user = User(**values)
+    make_transient_to_detached(user)
+    # load=False attaches the object as persistent without querying
+    return db.session.merge(user, load=False)
+
+
+def invalidate(*user_ids):
+    cache.invalidate(*user_ids)
+
+
+def init_app(app):
+    app.config.setdefault('IDENTITY_CACHE_TTL', 30)
+    cache.ttl = app.config['IDENTITY_CACHE_TTL']
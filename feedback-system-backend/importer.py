@@ -0,0 +1,341 @@
+import csv
+import os
+import tempfile
+import time
+from itertools import islice
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select, update
+
+import etags
+import hashing
+import orgchart
+import response_cache
+import serializers
+from models import db, User
+
+# Bulk import of users and reporting lines from CSV (`flask import-org` and
+# POST /api/admin/import-org).
+#
+# Columns: username, email, role ('manager' or 'employee'), and optionally
+# manager (the manager's username, in the file or already registered) and
+# password. Rows are read as a stream and handled BATCH_SIZE at a time: one
+# query per batch checks usernames and emails against the database (which
+# already holds the earlier batches), passwords are hashed across the hashing
+# pool, and the users are inserted with one executemany and linked into the
+# org closure under their managers (orgchart.add_users()). A manager that is
+# not registered yet when its reports are read is resolved after the last
+# batch, in a single pass over those rows, and those rows are then linked
+# level by level, managers first. Only such forward references and the first
+# MAX_ERRORS errors are kept in memory.
+#
+# The import is all or nothing: after the first invalid row, later rows are
+# only validated (not hashed or inserted), and the transaction is rolled
+# back so the file can be fixed and imported again.
+#
+# Rows without a password get a random invite password (hashing.new_invite()),
+# passed to the on_invite callback (the CLI writes them to --invites; the
+# endpoint spools them to an InviteSpool). Without a callback, a password is
+# required. Passwords given in the file are hashed
+# at full cost, so a file with many of them imports at the speed of the pool.
+
+COLUMNS = ('username', 'email', 'role', 'manager', 'password')
+REQUIRED_COLUMNS = ('username', 'email', 'role')
+ROLES = ('manager', 'employee')
+BATCH_SIZE = 1000
+MAX_ERRORS = 100
+# Stays under SQLite's bound-parameter limit
+IN_CHUNK = 10000
+
+
+class ImportFailed(Exception):
+    """The file cannot be imported at all (e.g. a missing column)."""
+
+
+def read_rows(lines):
+    """Yield (line number, row dict) from CSV text lines."""
+    reader = csv.DictReader(lines)
+    header = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise ImportFailed(f"CSV is missing the column(s): {', '.join(missing)}")
+    reader.fieldnames = header
+    for row in reader:
+        yield reader.line_num, {name: (row.get(name) or '').strip() for name in COLUMNS}
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _found(column, values):
+    found = set()
+    values = list(values)
+    for start in range(0, len(values), IN_CHUNK):
+        found.update(db.session.scalars(select(column).where(column.in_(values[start:start + IN_CHUNK]))))
+    return found
+
+
+def _managers(names):
+    # username -> (id, role) of the registered users among names
+    found = {}
+    names = list(names)
+    for start in range(0, len(names), IN_CHUNK):
+        found.update((name, (user_id, role)) for name, user_id, role in db.session.execute(
+            select(User.username, User.id, User.role).where(User.username.in_(names[start:start + IN_CHUNK]))))
+    return found
+
+
+class InviteSpool:
+    """on_invite callback that spools invites to a temporary file, for the
+    endpoint to stream back once the import has finished."""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self._count = 0
+
+    def __call__(self, username, email, password):
+        separator = ',' if self._count else ''
+        self._file.write(separator + serializers.dumps({'username': username, 'email': email, 'password': password}))
+        self._count += 1
+
+    def json(self, summary):
+        """Yield summary as a JSON object, with the invites under 'invites'."""
+        try:
+            self._file.seek(0)
+            yield '{"invites":['
+            while chunk := self._file.read(64 * 1024):
+                yield chunk
+            yield '],' + serializers.dumps(summary)[1:]
+        finally:
+            self.close()
+
+    def close(self):
+        self._file.close()
+
+
+class OrgImport:
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False, on_invite=None, progress=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.on_invite = on_invite
+        self.progress = progress
+        self.read = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+        self.forward = []  # (line, user id, manager username) for managers not yet registered
+        # Managers who gained reports, and those created by this import
+        self.managers_with_reports = set()
+        self.new_managers = set()
+        self.started = time.perf_counter()
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def _validate(self, batch):
+        valid = []
+        usernames, emails = set(), set()
+        for line, row in batch:
+            missing = [name for name in REQUIRED_COLUMNS if not row[name]]
+            if missing:
+                self.error(line, f"missing {', '.join(missing)}")
+            elif row['role'] not in ROLES:
+                self.error(line, f"role must be one of {', '.join(ROLES)}")
+            elif len(row['username']) > 80 or len(row['email']) > 120:
+                self.error(line, 'username or email is too long')
+            elif row['manager'] == row['username']:
+                self.error(line, 'a user cannot be their own manager')
+            elif not row['password'] and self.on_invite is None:
+                self.error(line, 'missing password')
+            elif row['username'] in usernames or row['email'] in emails:
+                self.error(line, 'duplicate username or email in the file')
+            else:
+                usernames.add(row['username'])
+                emails.add(row['email'])
+                valid.append((line, row))
+        # Earlier batches are already inserted, so this also catches repeats across batches
+        taken_usernames = _found(User.username, usernames)
+        taken_emails = _found(User.email, emails)
+        checked = []
+        for line, row in valid:
+            if row['username'] in taken_usernames:
+                self.error(line, f"username '{row['username']}' already exists")
+            elif row['email'] in taken_emails:
+                self.error(line, f"email '{row['email']}' already exists")
+            else:
+                checked.append((line, row))
+        return checked
+
+    def _insert(self, batch):
+        managers = _managers({row['manager'] for _, row in batch if row['manager']})
+        rows, later = [], []
+        for line, row in batch:
+            manager_id = None
+            if row['manager'] in managers:
+                manager_id, role = managers[row['manager']]
+                if role != 'manager':
+                    self.error(line, f"'{row['manager']}' is not a manager")
+                    continue
+                self.managers_with_reports.add(manager_id)
+            elif row['manager']:
+                later.append((line, row['username'], row['manager']))
+            rows.append({'username': row['username'], 'email': row['email'], 'role': row['role'],
+                         'manager_id': manager_id})
+        if self.error_count:
+            return
+
+        invites = []
+        if self.dry_run:
+            hashes = [''] * len(rows)
+        else:
+            given = iter(hashing.hash_passwords(row['password'] for _, row in batch if row['password']))
+            hashes = []
+            for _, row in batch:
+                if row['password']:
+                    hashes.append(next(given))
+                else:
+                    password, password_hash = hashing.new_invite()
+                    invites.append((row['username'], row['email'], password))
+                    hashes.append(password_hash)
+        for row, password_hash in zip(rows, hashes):
+            row['password_hash'] = password_hash
+
+        ids = dict(db.session.execute(insert(User).returning(User.username, User.id), rows).all())
+        orgchart.add_users(ids.values())
+        self.new_managers.update(ids[row['username']] for row in rows if row['role'] == 'manager')
+        self.forward.extend((line, ids[username], manager) for line, username, manager in later)
+        self.imported += len(rows)
+        for invite in invites:
+            self.on_invite(*invite)
+
+    def add(self, batch):
+        self.read += len(batch)
+        batch = self._validate(batch)
+        # After the first error the import will be rolled back: only keep validating
+        if batch and not self.error_count:
+            self._insert(batch)
+        if self.progress:
+            self.progress(self)
+
+    def _resolve_forward(self):
+        """Set manager_id of rows whose manager came later in the file.
+        Returns {user id: manager id} of the rows updated."""
+        managers = _managers({manager for _, _, manager in self.forward})
+        updates = []
+        for line, user_id, manager in self.forward:
+            if manager not in managers:
+                self.error(line, f"manager '{manager}' not found")
+            elif managers[manager][1] != 'manager':
+                self.error(line, f"'{manager}' is not a manager")
+            else:
+                updates.append({'id': user_id, 'manager_id': managers[manager][0]})
+        if updates and not self.error_count:
+            db.session.execute(update(User), updates)
+        return {row['id']: row['manager_id'] for row in updates}
+
+    def _link_forward(self, managers):
+        # A level is the rows whose manager is linked all the way up already
+        pending = dict(managers)
+        while pending:
+            level = [user_id for user_id, manager_id in pending.items() if manager_id not in pending]
+            if not level:
+                raise ValueError('User.manager_id contains a cycle')
+            for start in range(0, len(level), IN_CHUNK):
+                orgchart.link_users(level[start:start + IN_CHUNK])
+            for user_id in level:
+                del pending[user_id]
+
+    def finish(self):
+        """Resolve forward manager references, link them into the org
+        closure and commit, or roll back if anything failed. Returns the
+        summary."""
+        if not self.error_count:
+            managers = self._resolve_forward()
+        if not self.error_count:
+            try:
+                self._link_forward(managers)
+            except ValueError as e:
+                self.error(None, str(e))
+        if self.error_count or self.dry_run:
+            db.session.rollback()
+        else:
+            # Team listings of managers registered before the import changed
+            existing = self.managers_with_reports - self.new_managers
+            etags.bump(*existing)
+            db.session.commit()
+            response_cache.invalidate_users(*existing)
+        return self.summary()
+
+    def summary(self):
+        committed = not self.error_count and not self.dry_run
+        return {
+            'rows': self.read,
+            'imported': self.imported if committed else 0,
+            'dry_run': self.dry_run,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'seconds': round(time.perf_counter() - self.started, 3),
+        }
+
+
+def import_org(lines, batch_size=BATCH_SIZE, dry_run=False, on_invite=None, progress=None):
+    """Import users from CSV text lines; returns the summary dict.
+    Raises ImportFailed if the header is unusable."""
+    job = OrgImport(batch_size, dry_run, on_invite, progress)
+    try:
+        for batch in _batches(read_rows(lines), batch_size):
+            job.add(batch)
+        return job.finish()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+@click.command('import-org')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--invites', type=click.Path(dir_okay=False, writable=True),
+              help='Write generated passwords for rows without one to this CSV.')
+@click.option('--batch-size', type=int, default=BATCH_SIZE, show_default=True)
+@click.option('--hash-workers', type=int, default=None,
+              help='Password hashing processes (default: one per CPU).')
+@click.option('--dry-run', is_flag=True, help='Validate only; nothing is written.')
+@with_appcontext
+def import_org_command(csv_file, invites, batch_size, hash_workers, dry_run):
+    """Import users and reporting lines from CSV_FILE ('-' for stdin)."""
+    hashing.resize_pool(hash_workers or os.cpu_count() or 1)
+    invites_file = open(invites, 'w', newline='') if invites else None
+    on_invite = None
+    if invites_file:
+        writer = csv.writer(invites_file)
+        writer.writerow(['username', 'email', 'password'])
+        on_invite = lambda username, email, password: writer.writerow([username, email, password])
+
+    def progress(job):
+        rate = job.read / max(time.perf_counter() - job.started, 1e-9)
+        print(f"{job.read} rows read, {job.imported} imported, {job.error_count} errors ({rate:.0f} rows/s)")
+
+    try:
+        summary = import_org(csv_file, batch_size, dry_run, on_invite, progress)
+    except ImportFailed as e:
+        raise click.ClickException(str(e))
+    finally:
+        if invites_file:
+            invites_file.close()
+    for error in summary['errors']:
+        print(f"line {error['line']}: {error['error']}" if error['line'] else error['error'])
+    if summary['error_count']:
+        if invites:
+            os.remove(invites)
+        raise click.ClickException(f"{summary['error_count']} errors, nothing was imported")
+    verb = 'Validated' if dry_run else 'Imported'
+    print(f"{verb} {summary['rows']} users in {summary['seconds']:.1f}s")
+
+
+def init_app(app):
+    app.cli.add_command(import_org_command)
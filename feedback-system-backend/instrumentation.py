@@ -0,0 +1,275 @@
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from db import db
+
+# Per-request SQL instrumentation and Prometheus text metrics.
+#
+# SQLAlchemy engine events count and time every statement and attribute it to
+# the current Flask request. After each request the totals feed per-endpoint
+# histograms, and requests over the configured budgets are logged:
+#
+#   SLOW_REQUEST_MS       latency budget in milliseconds (default 500)
+#   SLOW_REQUEST_QUERIES  statement budget per request (default 50)
+#
+# Background jobs run by `flask worker` (jobs.py) record their run time and
+# outcome here too; the worker serves them with --metrics-port.
+#
+# Engines built with a timed_pool() pool class also record how long each
+# connection checkout waited, and count checkouts served from overflow
+# connections and checkouts that timed out.
+#
+# Metrics live in process memory, so under gunicorn each worker reports its
+# own numbers; scrape every worker or aggregate downstream.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.request_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.request_db_time = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.request_queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.requests_total = defaultdict(int)
+        self.slow_requests_total = defaultdict(int)
+        self.pool_checkout_wait = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.pool_events_total = defaultdict(int)
+        self.job_duration = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.jobs_processed_total = defaultdict(int)
+        self.cache_lookups_total = defaultdict(int)
+        self.gauges = {}
+
+    def record_request(self, endpoint, method, status, elapsed, db_time, queries):
+        with self.lock:
+            self.request_latency[(endpoint, method)].observe(elapsed)
+            self.request_db_time[(endpoint, method)].observe(db_time)
+            self.request_queries[(endpoint, method)].observe(queries)
+            self.requests_total[(endpoint, method, str(status))] += 1
+
+    def record_slow(self, endpoint, reason):
+        with self.lock:
+            self.slow_requests_total[(endpoint, reason)] += 1
+
+    def record_pool_checkout(self, engine, waited, event=None):
+        with self.lock:
+            self.pool_checkout_wait[(engine,)].observe(waited)
+            if event:
+                self.pool_events_total[(engine, event)] += 1
+
+    def record_job(self, kind, outcome, elapsed):
+        with self.lock:
+            self.job_duration[(kind,)].observe(elapsed)
+            self.jobs_processed_total[(kind, outcome)] += 1
+
+    def record_cache_lookup(self, endpoint, result):
+        with self.lock:
+            self.cache_lookups_total[(endpoint, result)] += 1
+
+    def set_gauge_source(self, name, help_text, source):
+        """Register a callable returning {labels tuple: value} sampled at scrape time."""
+        self.gauges[name] = (help_text, source)
+
+
+registry = Registry()
+
+
+def _labels(names, values):
+    pairs = ','.join(f'{n}="{str(v).replace(chr(34), chr(39))}"' for n, v in zip(names, values))
+    return '{' + pairs + '}' if pairs else ''
+
+
+def _render_histograms(lines, name, help_text, histograms, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, hist in sorted(histograms.items()):
+        for bound, count in zip(hist.buckets, hist.counts):
+            lines.append(f'{name}_bucket{_labels(label_names + ("le",), key + (bound,))} {count}')
+        lines.append(f'{name}_bucket{_labels(label_names + ("le",), key + ("+Inf",))} {hist.total}')
+        lines.append(f'{name}_sum{_labels(label_names, key)} {hist.sum}')
+        lines.append(f'{name}_count{_labels(label_names, key)} {hist.total}')
+
+
+def _render_counter(lines, name, help_text, counter, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(counter.items()):
+        lines.append(f'{name}{_labels(label_names, key)} {value}')
+
+
+def render_metrics():
+    """Return all metrics in the Prometheus text exposition format."""
+    lines = []
+    with registry.lock:
+        _render_histograms(lines, 'http_request_duration_seconds', 'Request latency by endpoint.',
+                           registry.request_latency, ('endpoint', 'method'))
+        _render_histograms(lines, 'http_request_db_seconds', 'Time spent in SQL per request.',
+                           registry.request_db_time, ('endpoint', 'method'))
+        _render_histograms(lines, 'http_request_db_queries', 'SQL statements per request.',
+                           registry.request_queries, ('endpoint', 'method'))
+        _render_counter(lines, 'http_requests_total', 'Requests by endpoint and status.',
+                        registry.requests_total, ('endpoint', 'method', 'status'))
+        _render_counter(lines, 'http_slow_requests_total', 'Requests over the latency or query budget.',
+                        registry.slow_requests_total, ('endpoint', 'reason'))
+        _render_histograms(lines, 'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.',
+                           registry.pool_checkout_wait, ('engine',))
+        _render_counter(lines, 'db_pool_events_total', 'Checkouts served by overflow connections or timed out.',
+                        registry.pool_events_total, ('engine', 'event'))
+        _render_histograms(lines, 'job_duration_seconds', 'Background job run time by kind.',
+                           registry.job_duration, ('kind',))
+        _render_counter(lines, 'jobs_processed_total', 'Background job runs by kind and outcome.',
+                        registry.jobs_processed_total, ('kind', 'outcome'))
+        _render_counter(lines, 'response_cache_lookups_total', 'Response cache lookups by result.',
+                        registry.cache_lookups_total, ('endpoint', 'result'))
+        gauges = list(registry.gauges.items())
+    for name, (help_text, source) in gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in sorted(source().items()):
+            lines.append(f'{name}{_labels(*zip(*labels)) if labels else ""} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class TimedQueuePool(QueuePool):
+    label = 'primary'
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            registry.record_pool_checkout(self.label, time.perf_counter() - started, 'timeout')
+            raise
+        # Positive overflow: this checkout is using a connection beyond pool_size
+        event = 'overflow' if self.overflow() > 0 else None
+        registry.record_pool_checkout(self.label, time.perf_counter() - started, event)
+        return connection
+
+
+def timed_pool(label, base=QueuePool):
+    """Return a QueuePool class (or a subclass of base, e.g. the
+    AsyncAdaptedQueuePool of an async engine) whose checkouts are recorded
+    under `label`.
+
+    A subclass rather than an attribute, so it survives engine.dispose().
+    """
+    return type(f'TimedQueuePool_{label}', (TimedQueuePool, base), {'label': label})
+
+
+def _pool_stats(engine):
+    # QueuePool exposes these; SingletonThreadPool/NullPool (in-memory SQLite,
+    # some test setups) do not, so report only what exists.
+    pool = engine.pool
+    stats = {}
+    for name in ('size', 'checkedout', 'checkedin', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    if 'overflow' in stats:
+        # Negative values mean unused capacity below pool_size
+        stats['overflow'] = max(stats['overflow'], 0)
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_start'].pop()
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_time = g.get('db_time', 0.0) + time.perf_counter() - started
+
+
+def _handle_error(context):
+    # after_cursor_execute does not fire for failed statements
+    connection = context.connection
+    if connection is not None and connection.info.get('query_start'):
+        connection.info['query_start'].pop()
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+
+
+def _after_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unmatched'
+    queries = g.get('db_queries', 0)
+    db_time = g.get('db_time', 0.0)
+    registry.record_request(endpoint, request.method, response.status_code, elapsed, db_time, queries)
+
+    config = current_app.config
+    reasons = []
+    if elapsed * 1000 > config['SLOW_REQUEST_MS']:
+        reasons.append('latency')
+    if queries > config['SLOW_REQUEST_QUERIES']:
+        reasons.append('queries')
+    for reason in reasons:
+        registry.record_slow(endpoint, reason)
+    if reasons:
+        current_app.logger.warning(
+            'Slow request %s %s (endpoint=%s): %.1fms, %d queries, %.1fms in SQL',
+            request.method, request.path, endpoint, elapsed * 1000, queries, db_time * 1000
+        )
+    return response
+
+
+# Instrumented engines by label, for the pool gauges
+_engines = {}
+
+
+def instrument_engine(label, engine):
+    """Attribute the engine's statements to requests and report its pool
+    under `label`. For an async engine, pass its sync_engine."""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+    _engines[label] = engine
+
+
+def init_app(app):
+    app.config.setdefault('SLOW_REQUEST_MS', 500)
+    app.config.setdefault('SLOW_REQUEST_QUERIES', 50)
+
+    with app.app_context():
+        # The default bind is the primary; other binds (e.g. the replica) by key
+        for key, engine in db.engines.items():
+            instrument_engine(key or 'primary', engine)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    registry.set_gauge_source(
+        'db_pool_connections', 'Connection pool state per engine.',
+        lambda: {(('engine', label), ('state', name)): value
+                 for label, engine in list(_engines.items())
+                 for name, value in _pool_stats(engine).items()}
+    )
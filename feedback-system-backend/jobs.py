@@ -0,0 +1,331 @@
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from instrumentation import registry, render_metrics
+from models import db, Job
+
+# Durable background jobs, stored in the application database (no broker).
+#
+# A write route calls enqueue() before it commits, so the job row lands in the
+# same transaction as the write: a rolled back request leaves no job behind,
+# and a committed one always has its jobs. `flask worker` claims ready jobs
+# (status 'pending', run_at in the past) one at a time per thread, runs the
+# handler registered for the job's kind, and deletes the row in the same
+# transaction as whatever the handler wrote. A handler that raises is retried
+# with exponential backoff until it runs out of attempts, and then kept with
+# status 'failed' and its last traceback for `flask requeue-failed-jobs`.
+#
+# Handlers run at least once: a worker that dies mid-job leaves the row
+# 'running' until its lease expires and another worker picks it up again, so
+# handlers with outside effects (mail) should tolerate a repeat.
+#
+#   JOBS_MAX_ATTEMPTS   runs before a job is marked failed (default 5)
+#   JOBS_BACKOFF_BASE   seconds before the first retry, doubled per attempt (default 2)
+#   JOBS_BACKOFF_MAX    cap on the retry delay in seconds (default 300)
+#   JOBS_POLL_INTERVAL  seconds an idle worker thread sleeps between polls (default 1)
+#   JOBS_LEASE          seconds before a 'running' job is presumed lost (default 300)
+#   JOBS_CONCURRENCY    default worker threads for `flask worker` (default 2)
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, FAILED = 'pending', 'running', 'failed'
+
+_handlers = {}
+
+
+def handler(kind):
+    """Register the decorated function as the handler for jobs of `kind`.
+
+    It is called with the job's payload as keyword arguments, inside an app
+    context; its session writes commit together with the job's removal.
+    """
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+
+def _job_row(kind, payload, delay):
+    if kind not in _handlers:
+        raise ValueError(f'No handler registered for job kind {kind!r}')
+    now = datetime.utcnow()
+    return {
+        'kind': kind,
+        'payload': payload or {},
+        'status': PENDING,
+        'attempts': 0,
+        'max_attempts': current_app.config['JOBS_MAX_ATTEMPTS'],
+        'run_at': now + timedelta(seconds=delay),
+        'created_at': now,
+    }
+
+
+def enqueue(kind, payload=None, delay=0):
+    """Add a job to the current transaction; it runs only if that commits."""
+    job = Job(**_job_row(kind, payload, delay))
+    db.session.add(job)
+    return job
+
+
+def enqueue_many(kind, payloads, delay=0):
+    """enqueue() for several payloads in one multi-row INSERT."""
+    rows = [_job_row(kind, payload, delay) for payload in payloads]
+    if rows:
+        db.session.execute(insert(Job), rows)
+
+
+def claim_statement(worker_id, now):
+    """UPDATE marking the oldest ready job as ours, returning it.
+
+    On PostgreSQL the inner SELECT takes FOR UPDATE SKIP LOCKED, so workers
+    racing for the queue head each get a different job; SQLite runs the whole
+    statement under its single writer lock.
+    """
+    ready = select(Job.id) \
+        .where(Job.status == PENDING, Job.run_at <= now) \
+        .order_by(Job.run_at, Job.id) \
+        .limit(1) \
+        .with_for_update(skip_locked=True)
+    return update(Job) \
+        .where(Job.id.in_(ready)) \
+        .values(status=RUNNING, locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1) \
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.locked_by) \
+        .execution_options(synchronize_session=False)
+
+
+def claim(worker_id):
+    """Claim and commit the next ready job; None when nothing is due."""
+    job = db.session.execute(claim_statement(worker_id, datetime.utcnow())).first()
+    db.session.commit()
+    return job
+
+
+def retry_delay(attempts):
+    """Seconds before the next run after `attempts` failed runs, with jitter
+    so jobs that failed together do not all retry together."""
+    config = current_app.config
+    delay = min(config['JOBS_BACKOFF_BASE'] * 2 ** (attempts - 1), config['JOBS_BACKOFF_MAX'])
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _ours(job):
+    # A worker whose lease expired must not touch the row once it is reclaimed
+    return (Job.id == job.id) & (Job.locked_by == job.locked_by)
+
+
+def _record_failure(job):
+    error = traceback.format_exc()[-4000:]
+    if job.attempts >= job.max_attempts:
+        outcome, values = FAILED, {'status': FAILED}
+        logger.error('Job %s (%s) failed after %d attempts:\n%s', job.id, job.kind, job.attempts, error)
+    else:
+        delay = retry_delay(job.attempts)
+        outcome, values = 'retry', {'status': PENDING, 'run_at': datetime.utcnow() + timedelta(seconds=delay)}
+        logger.warning('Job %s (%s) attempt %d failed, retrying in %.1fs:\n%s',
+                       job.id, job.kind, job.attempts, delay, error)
+    db.session.execute(update(Job).where(_ours(job)).values(
+        **values, locked_by=None, locked_at=None, last_error=error
+    ))
+    db.session.commit()
+    return outcome
+
+
+def run(job):
+    """Run one claimed job and return its outcome: 'done', 'retry' or 'failed'."""
+    started = time.perf_counter()
+    try:
+        fn = _handlers.get(job.kind)
+        if fn is None:
+            raise LookupError(f'No handler registered for job kind {job.kind!r}')
+        fn(**job.payload)
+        db.session.execute(delete(Job).where(_ours(job)))
+        db.session.commit()
+        outcome = 'done'
+    except Exception:
+        db.session.rollback()
+        outcome = _record_failure(job)
+    registry.record_job(job.kind, outcome, time.perf_counter() - started)
+    return outcome
+
+
+def expired_statement(now, lease):
+    """UPDATE returning 'running' jobs whose lease ran out to the queue."""
+    return update(Job) \
+        .where(Job.status == RUNNING, Job.locked_at < now - timedelta(seconds=lease)) \
+        .values(status=case((Job.attempts >= Job.max_attempts, FAILED), else_=PENDING),
+                run_at=now, locked_by=None, locked_at=None, last_error='Lease expired') \
+        .execution_options(synchronize_session=False)
+
+
+def reclaim_expired():
+    """Requeue jobs held by workers that died; returns how many."""
+    result = db.session.execute(expired_statement(datetime.utcnow(), current_app.config['JOBS_LEASE']))
+    db.session.commit()
+    if result.rowcount:
+        logger.warning('Reclaimed %d jobs with expired leases', result.rowcount)
+    return result.rowcount
+
+
+class Worker:
+    """Worker threads, each with its own app context and session."""
+
+    def __init__(self, app, concurrency, poll_interval, burst=False):
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.stopping = threading.Event()
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+
+    def _work(self, index):
+        worker_id = f'{self.name}:{index}'
+        with self.app.app_context():
+            while not self.stopping.is_set():
+                try:
+                    job = claim(worker_id)
+                except SQLAlchemyError:
+                    logger.exception('Could not claim a job')
+                    db.session.rollback()
+                    job = None
+                if job is None:
+                    if self.burst:
+                        return
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                run(job)
+                # Start every job from a fresh session
+                db.session.remove()
+
+    def _reclaim(self):
+        with self.app.app_context():
+            try:
+                reclaim_expired()
+            except SQLAlchemyError:
+                logger.exception('Could not reclaim expired jobs')
+
+    def run(self):
+        self._reclaim()
+        threads = [threading.Thread(target=self._work, args=(index,), name=f'job-worker-{index}', daemon=True)
+                   for index in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        reclaim_every = self.app.config['JOBS_LEASE'] / 2
+        next_reclaim = time.monotonic() + reclaim_every
+        while not self.stopping.wait(self.poll_interval):
+            if not any(thread.is_alive() for thread in threads):
+                break
+            if time.monotonic() >= next_reclaim:
+                self._reclaim()
+                next_reclaim = time.monotonic() + reclaim_every
+        # Let running jobs finish rather than leaving them to the lease
+        for thread in threads:
+            thread.join()
+
+    def stop(self, signum=None, frame=None):
+        if not self.stopping.is_set():
+            print("Stopping: waiting for running jobs to finish")
+        self.stopping.set()
+
+
+def serve_metrics(app, port):
+    """Serve this process's /metrics on `port` from a daemon thread."""
+    from werkzeug.serving import make_server
+
+    def metrics_app(environ, start_response):
+        with app.app_context():
+            body = render_metrics().encode()
+        start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4')])
+        return [body]
+
+    server = make_server('0.0.0.0', port, metrics_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='job-metrics', daemon=True).start()
+    return server
+
+
+@click.command('worker')
+@click.option('--concurrency', type=int, default=None, help='Worker threads (default JOBS_CONCURRENCY).')
+@click.option('--poll-interval', type=float, default=None, help='Idle sleep between polls (default JOBS_POLL_INTERVAL).')
+@click.option('--burst', is_flag=True, help='Exit once no job is ready instead of polling.')
+@click.option('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on this port.')
+@with_appcontext
+def worker_command(concurrency, poll_interval, burst, metrics_port):
+    """Process background jobs until interrupted."""
+    # Job and notification logs go to stderr unless logging is set up already
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s')
+    app = current_app._get_current_object()
+    worker = Worker(
+        app,
+        concurrency or app.config['JOBS_CONCURRENCY'],
+        poll_interval if poll_interval is not None else app.config['JOBS_POLL_INTERVAL'],
+        burst=burst,
+    )
+    if metrics_port:
+        serve_metrics(app, metrics_port)
+        print(f"Serving worker metrics on port {metrics_port}")
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+    print(f"Worker {worker.name} running {worker.concurrency} threads")
+    worker.run()
+
+
+@click.command('requeue-failed-jobs')
+@click.option('--kind', default=None, help='Only jobs of this kind.')
+@with_appcontext
+def requeue_failed_jobs_command(kind):
+    """Give failed jobs a fresh set of attempts."""
+    statement = update(Job).where(Job.status == FAILED) \
+        .values(status=PENDING, attempts=0, run_at=datetime.utcnow())
+    if kind:
+        statement = statement.where(Job.kind == kind)
+    count = db.session.execute(statement).rowcount
+    db.session.commit()
+    print(f"Requeued {count} failed jobs")
+
+
+def depth_query():
+    return select(Job.status, func.count()) \
+        .where(Job.status.in_([PENDING, RUNNING, FAILED])) \
+        .group_by(Job.status)
+
+
+def oldest_ready_query(now):
+    return select(func.min(Job.run_at)).where(Job.status == PENDING, Job.run_at <= now)
+
+
+def _queue_depth():
+    counts = dict.fromkeys((PENDING, RUNNING, FAILED), 0)
+    counts.update(db.session.execute(depth_query()).all())
+    return {(('status', status),): count for status, count in counts.items()}
+
+
+def _queue_lag():
+    # How long the oldest job that is due has been waiting for a worker
+    now = datetime.utcnow()
+    oldest = db.session.execute(oldest_ready_query(now)).scalar()
+    return {(): (now - oldest).total_seconds() if oldest else 0.0}
+
+
+def init_app(app):
+    app.config.setdefault('JOBS_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOBS_BACKOFF_BASE', 2.0)
+    app.config.setdefault('JOBS_BACKOFF_MAX', 300.0)
+    app.config.setdefault('JOBS_POLL_INTERVAL', 1.0)
+    app.config.setdefault('JOBS_LEASE', 300.0)
+    app.config.setdefault('JOBS_CONCURRENCY', 2)
+    app.cli.add_command(worker_command)
+    app.cli.add_command(requeue_failed_jobs_command)
+    registry.set_gauge_source('jobs_queue_depth', 'Background jobs by status.', _queue_depth)
+    registry.set_gauge_source('jobs_queue_lag_seconds', 'Age of the oldest job that is due.', _queue_lag)
@@ -0,0 +1,93 @@
+"""initial schema
+
+Revision ID: 5b1e2c7a9d40
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e2c7a9d40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _existing_tables():
+    # Databases created by db.create_all() before migrations were introduced
+    # already have these tables; only create what is missing.
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def upgrade():
+    existing = _existing_tables()
+
+    if 'user' not in existing:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.Text(), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=False),
+            sa.Column('manager_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['manager_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+            sa.UniqueConstraint('username')
+        )
+
+    if 'feedback' not in existing:
+        op.create_table(
+            'feedback',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('manager_id', sa.Integer(), nullable=False),
+            sa.Column('employee_id', sa.Integer(), nullable=False),
+            sa.Column('strengths', sa.Text(), nullable=False),
+            sa.Column('areas_to_improve', sa.Text(), nullable=False),
+            sa.Column('sentiment', sa.String(length=20), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('acknowledged', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['employee_id'], ['user.id']),
+            sa.ForeignKeyConstraint(['manager_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'feedback_request' not in existing:
+        op.create_table(
+            'feedback_request',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('employee_id', sa.Integer(), nullable=False),
+            sa.Column('manager_id', sa.Integer(), nullable=False),
+            sa.Column('message', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.ForeignKeyConstraint(['employee_id'], ['user.id']),
+            sa.ForeignKeyConstraint(['manager_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'feedback_summary' not in existing:
+        op.create_table(
+            'feedback_summary',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('scope', sa.String(length=20), nullable=False),
+            sa.Column('total', sa.Integer(), nullable=False),
+            sa.Column('positive', sa.Integer(), nullable=False),
+            sa.Column('neutral', sa.Integer(), nullable=False),
+            sa.Column('negative', sa.Integer(), nullable=False),
+            sa.Column('unacknowledged', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('user_id', 'scope')
+        )
+
+
+def downgrade():
+    op.drop_table('feedback_summary')
+    op.drop_table('feedback_request')
+    op.drop_table('feedback')
+    op.drop_table('user')
@@ -0,0 +1,39 @@
+"""access path indexes
+
+Revision ID: 8d3f6a1c2e57
+Revises: 5b1e2c7a9d40
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f6a1c2e57'
+down_revision = '5b1e2c7a9d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # if_not_exists: db.create_all() on a fresh database already builds these
+    # from the model definitions.
+    op.create_index('ix_feedback_manager_created', 'feedback',
+                    ['manager_id', 'created_at', 'id'], if_not_exists=True)
+    op.create_index('ix_feedback_employee_created', 'feedback',
+                    ['employee_id', 'created_at', 'id'], if_not_exists=True)
+    op.create_index('ix_feedback_request_manager_pending', 'feedback_request',
+                    ['manager_id', 'created_at'], if_not_exists=True,
+                    sqlite_where=sa.text("status = 'pending'"),
+                    postgresql_where=sa.text("status = 'pending'"))
+    op.create_index('ix_user_role', 'user', ['role'], if_not_exists=True)
+    op.create_index('ix_user_manager_id', 'user', ['manager_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_user_manager_id', table_name='user')
+    op.drop_index('ix_user_role', table_name='user')
+    op.drop_index('ix_feedback_request_manager_pending', table_name='feedback_request')
+    op.drop_index('ix_feedback_employee_created', table_name='feedback')
+    op.drop_index('ix_feedback_manager_created', table_name='feedback')
@@ -0,0 +1,54 @@
+"""org hierarchy closure table
+
+Revision ID: a7d2c9e4f816
+Revises: f2c8a5e7b391
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d2c9e4f816'
+down_revision = 'f2c8a5e7b391'
+branch_labels = None
+depends_on = None
+
+
+def _backfill_closure(bind):
+    # Same walk as org.rebuild_closure(): self rows, then one level per statement
+    op.execute('INSERT INTO org_closure (ancestor_id, descendant_id, depth) SELECT id, id, 0 FROM "user"')
+    user_count = bind.execute(sa.text('SELECT count(*) FROM "user"')).scalar()
+    for depth in range(user_count):
+        result = bind.execute(sa.text(
+            'INSERT INTO org_closure (ancestor_id, descendant_id, depth) '
+            'SELECT u.manager_id, c.descendant_id, c.depth + 1 '
+            'FROM org_closure c JOIN "user" u ON u.id = c.ancestor_id '
+            'WHERE c.depth = :depth AND u.manager_id IS NOT NULL'
+        ), {'depth': depth})
+        if not result.rowcount:
+            break
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Skip creating it if db.create_all() already built it from the model
+    if 'org_closure' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'org_closure',
+            sa.Column('ancestor_id', sa.Integer(), nullable=False),
+            sa.Column('descendant_id', sa.Integer(), nullable=False),
+            sa.Column('depth', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['ancestor_id'], ['user.id']),
+            sa.ForeignKeyConstraint(['descendant_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+        )
+        op.create_index('ix_org_closure_descendant', 'org_closure', ['descendant_id', 'depth'])
+    if bind.execute(sa.text('SELECT 1 FROM org_closure LIMIT 1')).first() is None:
+        _backfill_closure(bind)
+
+
+def downgrade():
+    op.drop_index('ix_org_closure_descendant', table_name='org_closure')
+    op.drop_table('org_closure')
@@ -0,0 +1,36 @@
+"""backfill employee summary rows
+
+Revision ID: c1f5a9d3e7b2
+Revises: a7d2c9e4f816
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1f5a9d3e7b2'
+down_revision = 'a7d2c9e4f816'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Subtree stats read a missing employee summary row as "no feedback", so
+    # build the rows for feedback that predates the summary table
+    op.execute(
+        "INSERT INTO feedback_summary (user_id, scope, total, positive, neutral, negative, unacknowledged) "
+        "SELECT f.employee_id, 'employee', count(f.id), "
+        "sum(CASE WHEN f.sentiment = 'positive' THEN 1 ELSE 0 END), "
+        "sum(CASE WHEN f.sentiment = 'neutral' THEN 1 ELSE 0 END), "
+        "sum(CASE WHEN f.sentiment = 'negative' THEN 1 ELSE 0 END), "
+        "sum(CASE WHEN f.acknowledged THEN 0 ELSE 1 END) "
+        "FROM feedback f WHERE NOT EXISTS ("
+        "SELECT 1 FROM feedback_summary s WHERE s.user_id = f.employee_id AND s.scope = 'employee') "
+        "GROUP BY f.employee_id"
+    )
+
+
+def downgrade():
+    # The code before this revision builds a missing summary row on first use
+    op.execute("DELETE FROM feedback_summary WHERE scope = 'employee'")
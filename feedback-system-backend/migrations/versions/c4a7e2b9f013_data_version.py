@@ -0,0 +1,33 @@
+"""data version stamps for conditional GET
+
+Revision ID: c4a7e2b9f013
+Revises: 8d3f6a1c2e57
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e2b9f013'
+down_revision = '8d3f6a1c2e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Skip if db.create_all() already built it from the model
+    if 'data_version' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'data_version',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('data_version')
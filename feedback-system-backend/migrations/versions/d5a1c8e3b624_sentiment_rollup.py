@@ -0,0 +1,57 @@
+"""sentiment trend rollup
+
+Revision ID: d5a1c8e3b624
+Revises: b3e8f1d6c072
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a1c8e3b624'
+down_revision = 'b3e8f1d6c072'
+branch_labels = None
+depends_on = None
+
+
+def _backfill(bind):
+    # Same buckets as analytics.rebuild_rollup(): weeks start on Monday
+    if bind.dialect.name == 'postgresql':
+        buckets = {'week': "date_trunc('week', created_at)::date",
+                   'month': "date_trunc('month', created_at)::date"}
+    else:
+        buckets = {'week': "date(created_at, 'weekday 0', '-6 days')",
+                   'month': "date(created_at, 'start of month')"}
+    for granularity, bucket in buckets.items():
+        op.execute(
+            "INSERT INTO sentiment_rollup (manager_id, granularity, bucket_start, employee_id, sentiment, count) "
+            f"SELECT manager_id, '{granularity}', {bucket}, employee_id, sentiment, count(*) FROM feedback "
+            "WHERE sentiment IN ('positive', 'neutral', 'negative') "
+            f"GROUP BY manager_id, employee_id, {bucket}, sentiment"
+        )
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Skip creating it if db.create_all() already built it from the model
+    if 'sentiment_rollup' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'sentiment_rollup',
+            sa.Column('manager_id', sa.Integer(), nullable=False),
+            sa.Column('granularity', sa.String(length=10), nullable=False),
+            sa.Column('bucket_start', sa.Date(), nullable=False),
+            sa.Column('employee_id', sa.Integer(), nullable=False),
+            sa.Column('sentiment', sa.String(length=20), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['manager_id'], ['user.id']),
+            sa.ForeignKeyConstraint(['employee_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('manager_id', 'granularity', 'bucket_start', 'employee_id', 'sentiment')
+        )
+    if bind.execute(sa.text('SELECT 1 FROM sentiment_rollup LIMIT 1')).first() is None:
+        _backfill(bind)
+
+
+def downgrade():
+    op.drop_table('sentiment_rollup')
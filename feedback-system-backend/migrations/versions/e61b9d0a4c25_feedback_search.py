@@ -0,0 +1,58 @@
+"""full-text search index over feedback
+
+Revision ID: e61b9d0a4c25
+Revises: c4a7e2b9f013
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61b9d0a4c25'
+down_revision = 'c4a7e2b9f013'
+branch_labels = None
+depends_on = None
+
+# Copy of models.FEEDBACK_FTS_DDL at the time of this revision
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE feedback_fts USING fts5("
+    "strengths, areas_to_improve, content='feedback', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "CREATE TRIGGER feedback_fts_insert AFTER INSERT ON feedback BEGIN "
+    "INSERT INTO feedback_fts(rowid, strengths, areas_to_improve) "
+    "VALUES (new.id, new.strengths, new.areas_to_improve); END",
+    "CREATE TRIGGER feedback_fts_delete AFTER DELETE ON feedback BEGIN "
+    "INSERT INTO feedback_fts(feedback_fts, rowid, strengths, areas_to_improve) "
+    "VALUES ('delete', old.id, old.strengths, old.areas_to_improve); END",
+    "CREATE TRIGGER feedback_fts_update AFTER UPDATE OF strengths, areas_to_improve ON feedback BEGIN "
+    "INSERT INTO feedback_fts(feedback_fts, rowid, strengths, areas_to_improve) "
+    "VALUES ('delete', old.id, old.strengths, old.areas_to_improve); "
+    "INSERT INTO feedback_fts(rowid, strengths, areas_to_improve) "
+    "VALUES (new.id, new.strengths, new.areas_to_improve); END",
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.create_index('ix_feedback_search', 'feedback',
+                        [sa.text("to_tsvector('english', (strengths || ' ') || areas_to_improve)")],
+                        postgresql_using='gin', if_not_exists=True)
+    elif bind.dialect.name == 'sqlite':
+        # Skip if db.create_all() already built it from the model
+        if 'feedback_fts' in sa.inspect(bind).get_table_names():
+            return
+        for statement in FTS_DDL:
+            op.execute(statement)
+        # Index the rows that already exist
+        op.execute("INSERT INTO feedback_fts(feedback_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.drop_index('ix_feedback_search', table_name='feedback')
+    elif bind.dialect.name == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS feedback_fts')
@@ -0,0 +1,57 @@
+"""feedback archive table
+
+Revision ID: e9c4b7a2d158
+Revises: d5a1c8e3b624
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9c4b7a2d158'
+down_revision = 'd5a1c8e3b624'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Skip creating it if db.create_all() already built it from the model
+    if 'feedback_archive' not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            'feedback_archive',
+            sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+            sa.Column('manager_id', sa.Integer(), nullable=False),
+            sa.Column('employee_id', sa.Integer(), nullable=False),
+            sa.Column('strengths', sa.Text(), nullable=False),
+            sa.Column('areas_to_improve', sa.Text(), nullable=False),
+            sa.Column('sentiment', sa.String(length=20), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('acknowledged', sa.Boolean(), nullable=True),
+            sa.Column('archived_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['manager_id'], ['user.id']),
+            sa.ForeignKeyConstraint(['employee_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_feedback_archive_manager_created', 'feedback_archive',
+                        ['manager_id', 'created_at', 'id'])
+        op.create_index('ix_feedback_archive_employee_created', 'feedback_archive',
+                        ['employee_id', 'created_at', 'id'])
+    op.create_index('ix_feedback_acknowledged_created', 'feedback', ['created_at'], if_not_exists=True,
+                    sqlite_where=sa.text('acknowledged = 1'),
+                    postgresql_where=sa.text('acknowledged'))
+
+
+def downgrade():
+    # Put archived rows back first so no feedback is lost
+    op.execute(
+        'INSERT INTO feedback (id, manager_id, employee_id, strengths, areas_to_improve, sentiment, '
+        'created_at, updated_at, acknowledged) '
+        'SELECT id, manager_id, employee_id, strengths, areas_to_improve, sentiment, '
+        'created_at, updated_at, acknowledged FROM feedback_archive'
+    )
+    op.drop_index('ix_feedback_acknowledged_created', table_name='feedback')
+    op.drop_table('feedback_archive')
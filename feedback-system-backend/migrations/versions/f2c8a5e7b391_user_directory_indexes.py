@@ -0,0 +1,26 @@
+"""user directory prefix search indexes
+
+Revision ID: f2c8a5e7b391
+Revises: e61b9d0a4c25
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8a5e7b391'
+down_revision = 'e61b9d0a4c25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username)')], if_not_exists=True)
+    op.create_index('ix_user_email_lower', 'user', [sa.text('lower(email)')], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_user_email_lower', table_name='user')
+    op.drop_index('ix_user_username_lower', table_name='user')
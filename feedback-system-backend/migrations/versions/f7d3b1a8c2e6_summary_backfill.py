@@ -0,0 +1,42 @@
+"""backfill feedback summary rows
+
+Revision ID: f7d3b1a8c2e6
+Revises: e9c4b7a2d158
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7d3b1a8c2e6'
+down_revision = 'e9c4b7a2d158'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Dashboards now read a missing summary row as "no feedback" instead of
+    # building it on first view, so build the rows for feedback that predates
+    # the summary table (c1f5a9d3e7b2 only did the employee side)
+    for scope, column in (('manager', 'manager_id'), ('employee', 'employee_id')):
+        op.execute(
+            "INSERT INTO feedback_summary (user_id, scope, total, positive, neutral, negative, unacknowledged) "
+            f"SELECT f.{column}, '{scope}', count(*), "
+            "sum(CASE WHEN f.sentiment = 'positive' THEN 1 ELSE 0 END), "
+            "sum(CASE WHEN f.sentiment = 'neutral' THEN 1 ELSE 0 END), "
+            "sum(CASE WHEN f.sentiment = 'negative' THEN 1 ELSE 0 END), "
+            "sum(CASE WHEN f.acknowledged THEN 0 ELSE 1 END) "
+            "FROM (SELECT manager_id, employee_id, sentiment, acknowledged FROM feedback "
+            "UNION ALL SELECT manager_id, employee_id, sentiment, acknowledged FROM feedback_archive) f "
+            "WHERE NOT EXISTS ("
+            f"SELECT 1 FROM feedback_summary s WHERE s.user_id = f.{column} AND s.scope = '{scope}') "
+            f"GROUP BY f.{column}"
+        )
+
+
+def downgrade():
+    # The code before this revision builds a missing summary row on first use,
+    # so the manager rows can go. Employee rows stay: c1f5a9d3e7b2 built them
+    # and subtree stats read a missing one as "no feedback"
+    op.execute("DELETE FROM feedback_summary WHERE scope = 'manager'")
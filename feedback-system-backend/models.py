@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import DDL, event, func, literal_column, text
+import sqlalchemy.dialects.postgresql  # registers the typed full-text func.to_tsvector
 from datetime import datetime
 from db import db
  
@@ -9,15 +11,29 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.Text, nullable=False)
-    role = db.Column(db.String(20), nullable=False)  # 'manager' or 'employee'
-    manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    role = db.Column(db.String(20), nullable=False, index=True)  # 'manager' or 'employee'
+    manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     
     # Relationships
     team_members = db.relationship('User', backref=db.backref('manager', remote_side=[id]))
     feedback_given = db.relationship('Feedback', backref='manager', foreign_keys='Feedback.manager_id')
     feedback_received = db.relationship('Feedback', backref='employee', foreign_keys='Feedback.employee_id')
 
+# Directory prefix search compares lower-cased names and emails by range
+db.Index('ix_user_username_lower', func.lower(User.username))
+db.Index('ix_user_email_lower', func.lower(User.email))
+
 class Feedback(db.Model):
+    # Every listing is "feedback given by / received by one user, newest or
+    # oldest first", so both sides get a (user, created_at, id) index.
+    __table_args__ = (
+        db.Index('ix_feedback_manager_created', 'manager_id', 'created_at', 'id'),
+        db.Index('ix_feedback_employee_created', 'employee_id', 'created_at', 'id'),
+        # Archival candidates (see archive.py), oldest first
+        db.Index('ix_feedback_acknowledged_created', 'created_at',
+                 sqlite_where=text('acknowledged = 1'), postgresql_where=text('acknowledged')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     employee_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -28,11 +44,149 @@ class Feedback(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     acknowledged = db.Column(db.Boolean, default=False)
 
+# Full-text search over strengths and areas_to_improve (queried by search.py).
+#
+# Postgres: a GIN index on the tsvector expression below; queries must use the
+# very same expression to be served by it. Config and separator are literals
+# rather than bound parameters so the planner can match the index.
+SEARCH_CONFIG = text("'english'")
+FEEDBACK_SEARCH_DOCUMENT = func.to_tsvector(
+    SEARCH_CONFIG,
+    Feedback.strengths.op('||')(text("' '")).op('||')(Feedback.areas_to_improve)
+)
+db.Index('ix_feedback_search', FEEDBACK_SEARCH_DOCUMENT, postgresql_using='gin') \
+    .ddl_if(dialect='postgresql')
+
+# SQLite: an external-content FTS5 table over feedback, kept in sync by
+# triggers, so every write path (ORM, bulk inserts, raw SQL) updates it.
+FEEDBACK_FTS_DDL = [
+    "CREATE VIRTUAL TABLE feedback_fts USING fts5("
+    "strengths, areas_to_improve, content='feedback', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "CREATE TRIGGER feedback_fts_insert AFTER INSERT ON feedback BEGIN "
+    "INSERT INTO feedback_fts(rowid, strengths, areas_to_improve) "
+    "VALUES (new.id, new.strengths, new.areas_to_improve); END",
+    "CREATE TRIGGER feedback_fts_delete AFTER DELETE ON feedback BEGIN "
+    "INSERT INTO feedback_fts(feedback_fts, rowid, strengths, areas_to_improve) "
+    "VALUES ('delete', old.id, old.strengths, old.areas_to_improve); END",
+    "CREATE TRIGGER feedback_fts_update AFTER UPDATE OF strengths, areas_to_improve ON feedback BEGIN "
+    "INSERT INTO feedback_fts(feedback_fts, rowid, strengths, areas_to_improve) "
+    "VALUES ('delete', old.id, old.strengths, old.areas_to_improve); "
+    "INSERT INTO feedback_fts(rowid, strengths, areas_to_improve) "
+    "VALUES (new.id, new.strengths, new.areas_to_improve); END",
+]
+for statement in FEEDBACK_FTS_DDL:
+    event.listen(Feedback.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Feedback.__table__, 'before_drop',
+             DDL('DROP TABLE IF EXISTS feedback_fts').execute_if(dialect='sqlite'))
+
+# Cold storage for old, acknowledged feedback, moved out of Feedback in
+# batches by archive.py so the per-user listing indexes stay small. Same
+# columns and ids as Feedback; listings and exports read it only with
+# ?include_archived=1, and it is not full-text indexed.
+class FeedbackArchive(db.Model):
+    __tablename__ = 'feedback_archive'
+    __table_args__ = (
+        db.Index('ix_feedback_archive_manager_created', 'manager_id', 'created_at', 'id'),
+        db.Index('ix_feedback_archive_employee_created', 'employee_id', 'created_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    employee_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    strengths = db.Column(db.Text, nullable=False)
+    areas_to_improve = db.Column(db.Text, nullable=False)
+    sentiment = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    acknowledged = db.Column(db.Boolean)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 # FeedbackRequest model for employees to request feedback from their manager
 class FeedbackRequest(db.Model):
+    # Managers only ever list their pending requests, so only those rows are indexed
+    __table_args__ = (
+        db.Index('ix_feedback_request_manager_pending', 'manager_id', 'created_at',
+                 sqlite_where=text("status = 'pending'"),
+                 postgresql_where=text("status = 'pending'")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     message = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    status = db.Column(db.String(20), default='pending')  # pending, completed, rejected 
\ No newline at end of file
+    status = db.Column(db.String(20), default='pending')  # pending, completed, rejected
+
+# Rendered inline rather than as a bound parameter so the query planner can
+# match `status = 'pending'` against the partial index above.
+PENDING_STATUS = literal_column("'pending'")
+
+# Incrementally maintained dashboard counters, one row per user and scope.
+# scope 'manager' counts feedback given by user_id, 'employee' counts feedback
+# received by user_id. Kept in step with Feedback by dashboard.py.
+class FeedbackSummary(db.Model):
+    __tablename__ = 'feedback_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    scope = db.Column(db.String(20), primary_key=True)  # 'manager' or 'employee'
+    total = db.Column(db.Integer, nullable=False, default=0)
+    positive = db.Column(db.Integer, nullable=False, default=0)
+    neutral = db.Column(db.Integer, nullable=False, default=0)
+    negative = db.Column(db.Integer, nullable=False, default=0)
+    unacknowledged = db.Column(db.Integer, nullable=False, default=0)
+
+# Per-user version stamp behind the ETags on listing routes (see etags.py).
+# Bumped in the same transaction as any write that changes what the user's
+# dashboard, feedback or feedback request listings would return.
+class DataVersion(db.Model):
+    __tablename__ = 'data_version'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Transitive closure of User.manager_id: one row per (ancestor, descendant)
+# pair, including each user's (user, user, 0) row, so a whole reporting
+# subtree is a primary-key range on ancestor_id. Maintained by orgchart.py.
+class OrgClosure(db.Model):
+    __tablename__ = 'org_closure'
+    __table_args__ = (
+        db.Index('ix_org_closure_descendant', 'descendant_id', 'depth'),
+    )
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+# Feedback counts per manager, period, employee and sentiment behind the
+# sentiment trend endpoint, kept in step with Feedback by analytics.py.
+# granularity is 'week' (bucket_start is a Monday) or 'month' (the 1st), in UTC.
+# Key order makes a manager's last N periods one primary-key range.
+class SentimentRollup(db.Model):
+    __tablename__ = 'sentiment_rollup'
+    manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    granularity = db.Column(db.String(10), primary_key=True)
+    bucket_start = db.Column(db.Date, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    sentiment = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Durable background jobs (see jobs.py). Write routes add rows in their own
+# transaction, so a job exists exactly when the write that caused it
+# committed. `flask worker` claims ready rows and deletes them once handled;
+# jobs out of attempts stay behind with status 'failed'.
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(80), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(120))
+    last_error = db.Column(db.Text)
@@ -0,0 +1,61 @@
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+import jobs
+from models import db, Feedback, FeedbackRequest, User
+
+# Notification jobs, enqueued by the write routes and run by `flask worker`.
+#
+# deliver() only logs the message for now; a mail transport plugs in there.
+# Handlers look rows up again when they run, so a notification reflects the
+# data as committed, and one whose row has since gone is dropped.
+
+FEEDBACK_CREATED = 'notify_feedback_created'
+FEEDBACK_REQUESTED = 'notify_feedback_requested'
+
+logger = logging.getLogger(__name__)
+
+_manager = aliased(User, name='manager')
+_employee = aliased(User, name='employee')
+
+
+def deliver(to, subject, body):
+    logger.info('Notification to %s: %s - %s', to, subject, body)
+
+
+@jobs.handler(FEEDBACK_CREATED)
+def feedback_created(feedback_ids):
+    """Tell an employee about new feedback; one message per batch."""
+    rows = db.session.execute(
+        select(_employee.email, _manager.username, Feedback.sentiment)
+        .join(_employee, Feedback.employee_id == _employee.id)
+        .join(_manager, Feedback.manager_id == _manager.id)
+        .where(Feedback.id.in_(feedback_ids))
+    ).all()
+    if not rows:
+        return
+    email, manager_name = rows[0].email, rows[0].username
+    if len(rows) == 1:
+        body = f"{manager_name} left you {rows[0].sentiment} feedback."
+    else:
+        body = f"{manager_name} left you {len(rows)} new pieces of feedback."
+    deliver(email, 'New feedback', body)
+
+
+@jobs.handler(FEEDBACK_REQUESTED)
+def feedback_requested(request_id):
+    """Tell a manager that an employee asked for feedback."""
+    row = db.session.execute(
+        select(_manager.email, _employee.username, FeedbackRequest.message)
+        .join(_manager, FeedbackRequest.manager_id == _manager.id)
+        .join(_employee, FeedbackRequest.employee_id == _employee.id)
+        .where(FeedbackRequest.id == request_id)
+    ).first()
+    if row is None:
+        return
+    body = f"{row.username} asked for feedback."
+    if row.message:
+        body += f' "{row.message}"'
+    deliver(row.email, 'Feedback requested', body)
@@ -0,0 +1,216 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, delete, func, insert, literal, select, true, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from dashboard import COUNTERS, SENTIMENTS
+from models import db, User, FeedbackSummary, OrgClosure
+
+# Org hierarchy: OrgClosure holds every (ancestor, descendant, depth) pair of
+# the User.manager_id tree, so "everyone under this director" is a single
+# primary-key range instead of one query per management level.
+#
+# Write paths keep it in step in the same transaction as the manager_id
+# change: add_user() when a user is created, add_users() and link_users() for
+# users created in bulk, move_subtrees() when users are re-parented.
+# `flask rebuild-org-closure` recomputes it from manager_id.
+#
+# Subtree stats add up the per-employee FeedbackSummary counters (see
+# dashboard.py), which cost one row per person rather than one per feedback.
+# A missing summary row means the employee has received no feedback.
+
+CLOSURE_COLUMNS = ['ancestor_id', 'descendant_id', 'depth']
+
+
+def add_user(user_id, manager_id=None):
+    """Link a newly created user into the tree. Call before committing."""
+    db.session.execute(insert(OrgClosure).values(ancestor_id=user_id, descendant_id=user_id, depth=0))
+    if manager_id is not None:
+        db.session.execute(insert(OrgClosure).from_select(
+            CLOSURE_COLUMNS,
+            select(OrgClosure.ancestor_id, literal(user_id), OrgClosure.depth + 1)
+            .where(OrgClosure.descendant_id == manager_id)
+        ))
+
+
+def add_users(user_ids):
+    """Link users created in bulk (importer.py) under their managers. Call
+    before committing, after their managers have been linked."""
+    db.session.execute(insert(OrgClosure), [
+        {'ancestor_id': user_id, 'descendant_id': user_id, 'depth': 0} for user_id in user_ids
+    ])
+    link_users(user_ids)
+
+
+def link_users_statement(user_ids):
+    # Every path up from each user's manager gets the user's subtree
+    above = aliased(OrgClosure)
+    below = aliased(OrgClosure)
+    return insert(OrgClosure).from_select(
+        CLOSURE_COLUMNS,
+        select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+        .select_from(User)
+        .join(above, above.descendant_id == User.manager_id)
+        .join(below, below.ancestor_id == User.id)
+        .where(User.id.in_(user_ids))
+    )
+
+
+def link_users(user_ids):
+    """Link each user, with everyone already linked below them, under the
+    manager_id they have been given. They must not have paths above them yet.
+
+    Two statements whatever the batch size. Raises ValueError if a user's
+    manager reports to them.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    cycle = db.session.scalar(
+        select(OrgClosure.ancestor_id)
+        .join(User, and_(User.id == OrgClosure.ancestor_id, User.manager_id == OrgClosure.descendant_id))
+        .where(User.id.in_(user_ids))
+        .limit(1)
+    )
+    if cycle is not None:
+        raise ValueError('User.manager_id contains a cycle')
+    db.session.execute(link_users_statement(user_ids))
+
+
+def unlink_statement(user_ids):
+    # Paths from above each moved user into its subtree
+    above = aliased(OrgClosure)
+    below = aliased(OrgClosure)
+    stale = select(above.ancestor_id, below.descendant_id) \
+        .join(below, below.ancestor_id == above.descendant_id) \
+        .where(above.descendant_id.in_(user_ids), above.depth > 0)
+    return delete(OrgClosure) \
+        .where(tuple_(OrgClosure.ancestor_id, OrgClosure.descendant_id).in_(stale)) \
+        .execution_options(synchronize_session=False)
+
+
+def link_statement(user_ids, manager_id):
+    # Every ancestor of the new manager (and the manager) gets every moved subtree
+    above = aliased(OrgClosure)
+    below = aliased(OrgClosure)
+    return insert(OrgClosure).from_select(
+        CLOSURE_COLUMNS,
+        select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+        .join(below, true())
+        .where(above.descendant_id == manager_id, below.ancestor_id.in_(user_ids))
+    )
+
+
+def move_subtrees(user_ids, manager_id):
+    """Re-parent each user, with everyone below them, under manager_id.
+
+    Two statements whatever the batch size. Call before committing, in the
+    same transaction as the User.manager_id update. Raises ValueError if
+    manager_id is one of the users or reports to one of them.
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    cycle = db.session.scalar(
+        select(OrgClosure.ancestor_id)
+        .where(OrgClosure.descendant_id == manager_id, OrgClosure.ancestor_id.in_(user_ids))
+        .limit(1)
+    )
+    if cycle is not None:
+        raise ValueError('Cannot assign a manager to their own reporting line')
+    db.session.execute(unlink_statement(user_ids))
+    db.session.execute(link_statement(user_ids, manager_id))
+
+
+def in_subtree(ancestor_id, user_id):
+    return db.session.get(OrgClosure, (ancestor_id, user_id)) is not None
+
+
+def subtree_query(root_id):
+    counters = [func.coalesce(func.sum(getattr(FeedbackSummary, counter)), 0) for counter in COUNTERS]
+    return select(OrgClosure.depth, func.count(OrgClosure.descendant_id), *counters) \
+        .outerjoin(FeedbackSummary, and_(FeedbackSummary.user_id == OrgClosure.descendant_id,
+                                         FeedbackSummary.scope == 'employee')) \
+        .where(OrgClosure.ancestor_id == root_id, OrgClosure.depth > 0) \
+        .group_by(OrgClosure.depth) \
+        .order_by(OrgClosure.depth)
+
+
+def _stats(headcount, values):
+    return {
+        'headcount': headcount,
+        'total_feedback': values['total'],
+        'sentiment_counts': {s: values[s] for s in SENTIMENTS},
+        'acknowledged': values['total'] - values['unacknowledged'],
+        'unacknowledged': values['unacknowledged'],
+    }
+
+
+def subtree_stats(root_id):
+    """Feedback received by everyone below root_id, in total and per level
+    (depth 1 = direct reports). One query."""
+    levels = []
+    totals = dict.fromkeys(COUNTERS, 0)
+    headcount = 0
+    for depth, count, *values in db.session.execute(subtree_query(root_id)):
+        values = dict(zip(COUNTERS, values))
+        levels.append({'depth': depth, **_stats(count, values)})
+        headcount += count
+        for counter in COUNTERS:
+            totals[counter] += values[counter]
+    return {
+        'root_id': root_id,
+        'depth': levels[-1]['depth'] if levels else 0,
+        **_stats(headcount, totals),
+        'levels': levels,
+    }
+
+
+def rebuild_closure(connection):
+    """Recompute org_closure from User.manager_id, one statement per level.
+
+    Takes a Connection or Session. Raises ValueError if manager_id has a cycle.
+    """
+    closure = OrgClosure.__table__
+    user = User.__table__
+    connection.execute(closure.delete())
+    connection.execute(closure.insert().from_select(
+        CLOSURE_COLUMNS, select(user.c.id, user.c.id, literal(0))
+    ))
+    user_count = connection.execute(select(func.count()).select_from(user)).scalar()
+    depth = 0
+    while True:
+        # Extend every path of length `depth` one manager further up
+        try:
+            result = connection.execute(closure.insert().from_select(
+                CLOSURE_COLUMNS,
+                select(user.c.manager_id, closure.c.descendant_id, literal(depth + 1))
+                .join(user, user.c.id == closure.c.ancestor_id)
+                .where(closure.c.depth == depth, user.c.manager_id.isnot(None))
+            ))
+        except IntegrityError:
+            # In a tree every (ancestor, descendant) pair has one path
+            raise ValueError('User.manager_id contains a cycle')
+        if not result.rowcount:
+            return depth
+        depth += 1
+        if depth > user_count:
+            raise ValueError('User.manager_id contains a cycle')
+
+
+@click.command('rebuild-org-closure')
+@with_appcontext
+def rebuild_org_closure_command():
+    """Recompute the org hierarchy closure table from User.manager_id."""
+    try:
+        depth = rebuild_closure(db.session)
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    db.session.commit()
+    print(f"Rebuilt org closure ({depth} levels below the top)")
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_org_closure_command)
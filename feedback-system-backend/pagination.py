@@ -0,0 +1,66 @@
+import base64
+from datetime import datetime
+
+# Keyset (cursor) pagination helpers shared by the listing routes.
+# A cursor is an opaque, URL-safe token that encodes the sort key of the last
+# row on the previous page, so fetching page N costs the same as page 1.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def parse_limit(args, default=None):
+    """Read ?limit= from the query string, clamped to MAX_PAGE_SIZE.
+
+    Returns `default` when the parameter is absent and raises ValueError
+    when it is not a positive integer.
+    """
+    raw = args.get('limit')
+    if raw is None or raw == '':
+        return default
+    limit = int(raw)
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(*values):
+    parts = []
+    for value in values:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        parts.append(str(value))
+    token = '|'.join(parts).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+
+def _decode_parts(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+
+
+def decode_created_cursor(cursor):
+    """Decode a (created_at, id) cursor. Raises ValueError if malformed."""
+    try:
+        created_at, row_id = _decode_parts(cursor)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def decode_id_cursor(cursor):
+    """Decode an id-only cursor. Raises ValueError if malformed."""
+    try:
+        (row_id,) = _decode_parts(cursor)
+        return int(row_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def decode_offset_cursor(cursor):
+    """Decode a cursor holding a row offset, for results ordered by a computed
+    rank that has no stable keyset. Raises ValueError if malformed."""
+    offset = decode_id_cursor(cursor)
+    if offset < 0:
+        raise ValueError('Invalid cursor')
+    return offset
@@ -0,0 +1,288 @@
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app
+
+# On-demand sampling profiler for live requests.
+#
+# A WSGI middleware picks requests to profile: a PROFILE_SAMPLE_RATE fraction
+# of all requests (default 0, off), and any request carrying
+# `X-Profile: <ADMIN_TOKEN>`, which gets the profile's id back in an
+# X-Profile-Id response header. Requests that are not picked cost a header
+# lookup and a comparison.
+#
+# While a picked request runs, including the streaming of its body, one
+# sampler thread per process reads the request thread's stack from
+# sys._current_frames() every PROFILE_INTERVAL_MS (default 5). Each sample is
+# counted under its full stack, and its time under a category, taken from the
+# innermost frame that has one:
+#
+#   hashing        hashing.py, werkzeug.security, hashlib
+#   orm            sqlalchemy, flask_sqlalchemy, database drivers
+#   serialization  serializers.py, json, orjson, msgpack, flask.json
+#   compression    compression.py, zlib, brotli
+#   route          anything else: views, Flask, middleware
+#
+# The sampler only runs while a profile is active, and stops sampling a
+# request after PROFILE_MAX_SECONDS (default 30; server-sent event streams
+# never end). The last PROFILE_BUFFER_SIZE profiles (default 100) are kept in
+# process memory and served by the /api/admin/profiles endpoints as JSON
+# summaries and collapsed stacks for flamegraph.pl or speedscope. Under
+# gunicorn each worker keeps its own.
+#
+# Sampling works with the GIL: the sampler runs at most every
+# sys.getswitchinterval() (5ms) while the request thread holds it, so shorter
+# intervals do not give more samples of CPU-bound code.
+
+HEADER = 'HTTP_X_PROFILE'
+
+CATEGORIES = (
+    ('hashing', ('hashing', 'werkzeug.security', 'hashlib')),
+    ('orm', ('sqlalchemy', 'flask_sqlalchemy', 'sqlite3', 'pg8000')),
+    ('serialization', ('serializers', 'json', 'orjson', 'msgpack', 'flask.json')),
+    ('compression', ('compression', 'zlib', 'brotli')),
+)
+DEFAULT_CATEGORY = 'route'
+
+
+@lru_cache(maxsize=None)
+def module_name(filename):
+    """Dotted module name of a source file, from the longest sys.path entry
+    containing it ('sqlalchemy.orm.session', 'routes')."""
+    path = os.path.abspath(filename)
+    roots = sorted((os.path.abspath(entry or '.') for entry in sys.path), key=len, reverse=True)
+    for root in roots:
+        if path.startswith(root + os.sep):
+            name = os.path.splitext(path[len(root) + 1:])[0].replace(os.sep, '.')
+            return name[:-len('.__init__')] if name.endswith('.__init__') else name
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+@lru_cache(maxsize=None)
+def _category(filename):
+    module = module_name(filename)
+    for category, prefixes in CATEGORIES:
+        if any(module == prefix or module.startswith(prefix + '.') for prefix in prefixes):
+            return category
+    return None
+
+
+def frame_name(code):
+    return f"{module_name(code.co_filename)}:{code.co_qualname}"
+
+
+class Profile:
+    def __init__(self, profile_id, environ, trigger, interval):
+        self.id = profile_id
+        self.method = environ.get('REQUEST_METHOD')
+        self.path = environ.get('PATH_INFO')
+        self.trigger = trigger
+        self.interval = interval
+        self.endpoint = None
+        self.status = None
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.stacks = Counter()  # tuple of code objects, outermost first -> samples
+        self.categories = Counter()
+
+    def sample(self, frame):
+        codes = []
+        category = None
+        while frame is not None:
+            code = frame.f_code
+            if category is None:
+                category = _category(code.co_filename)
+            codes.append(code)
+            frame = frame.f_back
+        codes.reverse()
+        self.stacks[tuple(codes)] += 1
+        self.categories[category or DEFAULT_CATEGORY] += 1
+
+    @property
+    def samples(self):
+        return sum(self.stacks.values())
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'endpoint': self.endpoint,
+            'status': self.status,
+            'trigger': self.trigger,
+            'started_at': self.started_at.isoformat(),
+            'duration_ms': round(self.duration * 1000, 2) if self.duration is not None else None,
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            # Estimated time per category: samples times the interval
+            'categories_ms': {name: round(count * self.interval * 1000, 1)
+                              for name, count in self.categories.most_common()},
+        }
+
+
+def collapsed(profiles):
+    """Collapsed stacks ('frame;frame;frame count' lines) of one or more
+    profiles, merged."""
+    merged = Counter()
+    for profile in profiles:
+        for codes, count in profile.stacks.items():
+            merged[';'.join(frame_name(code) for code in codes)] += count
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(merged.items()))
+
+
+class Sampler:
+    """One thread sampling the stacks of the threads with an active profile."""
+
+    def __init__(self, interval, max_seconds):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._active = {}  # thread id -> Profile
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, thread_id, profile):
+        with self._lock:
+            self._active[thread_id] = profile
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+            self._wakeup.set()
+
+    def remove(self, thread_id, profile):
+        with self._lock:
+            # Under asgi.py one thread serves many requests at once, and the
+            # latest profile started on it replaces the earlier ones
+            if self._active.get(thread_id) is profile:
+                del self._active[thread_id]
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                if not self._active:
+                    self._wakeup.clear()
+                    continue
+                active = list(self._active.items())
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for thread_id, profile in active:
+                if now - profile.started > self.max_seconds:
+                    self.remove(thread_id, profile)
+                elif thread_id in frames and profile.duration is None:
+                    profile.sample(frames[thread_id])
+            del frames
+            time.sleep(self.interval)
+
+
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, app):
+        self.wsgi_app = wsgi_app
+        self.app = app
+        self.config = app.config
+        self.sampler = Sampler(app.config['PROFILE_INTERVAL_MS'] / 1000, app.config['PROFILE_MAX_SECONDS'])
+        self.profiles = deque(maxlen=app.config['PROFILE_BUFFER_SIZE'])
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _trigger(self, environ):
+        given = environ.get(HEADER)
+        if given is not None:
+            token = self.config.get('ADMIN_TOKEN')
+            if token and hmac.compare_digest(given.encode(), token.encode()):
+                return 'header'
+        rate = self.config['PROFILE_SAMPLE_RATE']
+        if rate and random.random() < rate:
+            return 'sampled'
+        return None
+
+    def __call__(self, environ, start_response):
+        trigger = self._trigger(environ)
+        if trigger is None:
+            return self.wsgi_app(environ, start_response)
+
+        profile = Profile(next(self._ids), environ, trigger, self.sampler.interval)
+
+        def profiled_start_response(status, headers, exc_info=None):
+            profile.status = int(status.split(' ', 1)[0])
+            if trigger == 'header':
+                headers = [*headers, ('X-Profile-Id', str(profile.id))]
+            return start_response(status, headers, exc_info)
+
+        thread_id = threading.get_ident()
+        self.sampler.add(thread_id, profile)
+        try:
+            body = self.wsgi_app(environ, profiled_start_response)
+        except BaseException:
+            self._finish(thread_id, profile, environ)
+            raise
+        return _ProfiledBody(body, lambda: self._finish(thread_id, profile, environ))
+
+    def _finish(self, thread_id, profile, environ):
+        self.sampler.remove(thread_id, profile)
+        profile.duration = time.perf_counter() - profile.started
+        try:
+            profile.endpoint = self.app.url_map.bind_to_environ(environ).match()[0]
+        except Exception:
+            pass  # 404s, 405s and redirects have no endpoint
+        with self._lock:
+            self.profiles.append(profile)
+
+    def recent(self, endpoint=None):
+        """Buffered profiles, newest first, optionally of one endpoint only."""
+        with self._lock:
+            return [profile for profile in reversed(self.profiles)
+                    if endpoint is None or profile.endpoint == endpoint]
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((profile for profile in self.profiles if profile.id == profile_id), None)
+
+
+class _ProfiledBody:
+    """The response body, finishing the profile once it has been sent (or
+    closed early by the server)."""
+
+    def __init__(self, body, finish):
+        self._body = body
+        self._finish = finish
+        self._done = False
+
+    def __iter__(self):
+        yield from self._body
+        self._close()
+
+    def _close(self):
+        if not self._done:
+            self._done = True
+            self._finish()
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._close()
+
+
+def middleware(app=None):
+    return (app or current_app).extensions['profiling']
+
+
+def init_app(app):
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_INTERVAL_MS', 5.0)
+    app.config.setdefault('PROFILE_MAX_SECONDS', 30.0)
+    app.config.setdefault('PROFILE_BUFFER_SIZE', 100)
+    profiler = ProfilingMiddleware(app.wsgi_app, app)
+    app.wsgi_app = profiler
+    app.extensions['profiling'] = profiler
@@ -0,0 +1,153 @@
+import re
+from datetime import datetime
+from sqlalchemy import and_, create_engine, func, select, tuple_, update
+import analytics
+import archive
+import jobs
+import orgchart
+import search
+import serializers
+from models import db, User, Feedback, FeedbackArchive, FeedbackRequest, FeedbackSummary, DataVersion, OrgClosure, PENDING_STATUS
+
+# Query-plan regression check for the hot route queries.
+#
+# Each entry mirrors a query issued by a route in routes.py / dashboard.py.
+# The statements are compiled for SQLite and run through EXPLAIN QUERY PLAN
+# against an empty in-memory schema built from the models, so the check needs
+# no data and never touches the configured database. Any plan step that walks
+# a whole table or a whole index ("SCAN <table>") is reported as a failure.
+# Scanning a subquery's rows (a CO-ROUTINE or MATERIALIZE step of the same
+# plan) is not: the steps that produce them are checked on their own.
+#
+# Run with:  flask --app app check-query-plans
+# When adding a route query, add its shape here too.
+
+# An FTS5 table "scanned" with a MATCH constraint (M in the index string) is
+# an index lookup, not a full scan.
+_FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(?!\S+ VIRTUAL TABLE INDEX \d+:\S*M)')
+
+
+def route_queries():
+    user_id = 1
+    cursor = (datetime(2024, 1, 1), 10)
+
+    def feedback_listing(column):
+        return serializers.FEEDBACK.select().where(column == user_id)
+
+    def recent(schema, scope_column):
+        return schema.select() \
+            .where(scope_column == user_id) \
+            .order_by(Feedback.created_at.desc(), Feedback.id.desc()) \
+            .limit(5)
+
+    def with_archived(scope):
+        # GET /api/feedback?include_archived=1: both tables, merged in order
+        hot, cold = [
+            schema.select().where(getattr(model, f'{scope}_id') == user_id)
+            .where(tuple_(model.created_at, model.id) > cursor)
+            for schema, model in ((serializers.FEEDBACK, Feedback),
+                                  (serializers.FEEDBACK_ARCHIVE, FeedbackArchive))
+        ]
+        return archive.hot_and_cold(hot, cold).limit(51)
+
+    return {
+        'login: user by username': select(User).where(User.username == 'jack'),
+        'register: user by email': select(User).where(User.email == 'jack@company.com'),
+        'get_users: team members': serializers.USER.select().where(User.manager_id == user_id),
+        'create_feedback: ownership check': select(User).where(User.id == 2, User.manager_id == user_id),
+        'update_feedback: feedback by id': select(Feedback).where(Feedback.id == 5),
+        'get_feedback: manager listing': feedback_listing(Feedback.manager_id)
+            .order_by(Feedback.created_at, Feedback.id),
+        'get_feedback: employee listing': feedback_listing(Feedback.employee_id)
+            .order_by(Feedback.created_at, Feedback.id),
+        'get_feedback: manager page after cursor': feedback_listing(Feedback.manager_id)
+            .where(tuple_(Feedback.created_at, Feedback.id) > cursor)
+            .order_by(Feedback.created_at, Feedback.id).limit(51),
+        'get_feedback: employee page after cursor': feedback_listing(Feedback.employee_id)
+            .where(tuple_(Feedback.created_at, Feedback.id) > cursor)
+            .order_by(Feedback.created_at, Feedback.id).limit(51),
+        'get_feedback: manager page with archived': with_archived('manager'),
+        'get_feedback: employee page with archived': with_archived('employee'),
+        'export_feedback: filtered manager export': feedback_listing(Feedback.manager_id)
+            .where(Feedback.created_at >= cursor[0], Feedback.sentiment.in_(['negative']))
+            .order_by(Feedback.created_at, Feedback.id),
+        'search_feedback: ranked manager search': search.search_query(
+            User(id=user_id, role='manager'), 'time management', 'sqlite').limit(51),
+        'get_dashboard: summary row': select(FeedbackSummary)
+            .where(FeedbackSummary.user_id == user_id, FeedbackSummary.scope == 'manager'),
+        'get_dashboard: team size': select(func.count(User.id)).where(User.manager_id == user_id),
+        'get_dashboard: manager recent': recent(serializers.MANAGER_RECENT, Feedback.manager_id),
+        'get_dashboard: employee recent': recent(serializers.EMPLOYEE_RECENT, Feedback.employee_id),
+        'get_all_employees: employees': select(User).where(User.role == 'employee'),
+        'get_all_employees: page after cursor': serializers.EMPLOYEE.only(['username']).select(User.id)
+            .where(User.role == 'employee', User.id > 10).order_by(User.id).limit(51),
+        'get_all_employees: prefix search': select(User.id, User.username)
+            .where(User.role == 'employee',
+                   ((func.lower(User.username) >= 'ja') & (func.lower(User.username) < 'jb')) |
+                   ((func.lower(User.email) >= 'ja') & (func.lower(User.email) < 'jb')))
+            .order_by(User.id).limit(51),
+        'get_all_employees: unassigned page': select(User.id, User.username)
+            .where(User.role == 'employee', User.manager_id.is_(None)).order_by(User.id).limit(51),
+        'assign_team: set-based update': update(User)
+            .where(User.id.in_([2, 3, 4]), User.role == 'employee').values(manager_id=user_id),
+        'create_feedback_batch: ownership check': select(User.id)
+            .where(User.id.in_([2, 3, 4]), User.manager_id == user_id),
+        'acknowledge_feedback_batch: update': update(Feedback)
+            .where(Feedback.id.in_([5, 6]), Feedback.employee_id == 2, Feedback.acknowledged.isnot(True))
+            .values(acknowledged=True),
+        'etags: version lookup': select(DataVersion.version).where(DataVersion.user_id == user_id),
+        'assign_team: previous managers': select(User.manager_id).distinct()
+            .where(User.id.in_([2, 3, 4]), User.role == 'employee',
+                   User.manager_id.isnot(None), User.manager_id != user_id),
+        'get_org_subtree: membership check': select(OrgClosure)
+            .where(OrgClosure.ancestor_id == user_id, OrgClosure.descendant_id == 7),
+        'get_org_subtree: subtree stats': orgchart.subtree_query(user_id),
+        'assign_team: closure cycle check': select(OrgClosure.ancestor_id)
+            .where(OrgClosure.descendant_id == user_id, OrgClosure.ancestor_id.in_([2, 3, 4])).limit(1),
+        'assign_team: unlink moved subtrees': orgchart.unlink_statement([2, 3, 4]),
+        'assign_team: link moved subtrees': orgchart.link_statement([2, 3, 4], user_id),
+        'get_feedback_requests: pending for manager': serializers.FEEDBACK_REQUEST.select()
+            .where(FeedbackRequest.manager_id == user_id, FeedbackRequest.status == PENDING_STATUS)
+            .order_by(FeedbackRequest.created_at),
+        'get_sentiment_trend: team': analytics.trend_query(user_id, 'week', cursor[0].date()),
+        'get_sentiment_trend: one employee': analytics.trend_query(user_id, 'month', cursor[0].date(), 7),
+        'worker: claim next job': jobs.claim_statement('host:1:0', cursor[0]),
+        'worker: reclaim expired leases': jobs.expired_statement(cursor[0], 300),
+        'metrics: job queue depth': jobs.depth_query(),
+        'metrics: oldest ready job': jobs.oldest_ready_query(cursor[0]),
+        'archive-feedback: next batch': archive.candidates_query(cursor[0], 1000),
+        'import-org: taken usernames': select(User.username).where(User.username.in_(['a', 'b'])),
+        'import-org: taken emails': select(User.email).where(User.email.in_(['a@x', 'b@x'])),
+        'import-org: managers by username': select(User.username, User.id, User.role)
+            .where(User.username.in_(['a', 'b'])),
+        'import-org: closure cycle check': select(OrgClosure.ancestor_id)
+            .join(User, and_(User.id == OrgClosure.ancestor_id, User.manager_id == OrgClosure.descendant_id))
+            .where(User.id.in_([2, 3, 4])).limit(1),
+        'import-org: link new users': orgchart.link_users_statement([2, 3, 4]),
+    }
+
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True})
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled)).fetchall()
+    # Rows are (id, parent, notused, detail)
+    return [row[3] for row in rows]
+
+
+def check_query_plans(verbose=False):
+    """Return a list of (query name, plan step) pairs that are full table scans."""
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    failures = []
+    with engine.connect() as connection:
+        for name, statement in route_queries().items():
+            plan = explain(connection, statement)
+            if verbose:
+                print(f"{name}:")
+                for step in plan:
+                    print(f"    {step}")
+            subqueries = {step.split()[1] for step in plan if step.startswith(('CO-ROUTINE ', 'MATERIALIZE '))}
+            failures.extend((name, step) for step in plan
+                            if _FULL_SCAN.match(step) and step.split()[1] not in subqueries)
+    engine.dispose()
+    return failures
@@ -0,0 +1,64 @@
+import sqlite3
+import time
+from functools import wraps
+
+import click
+from flask import current_app, g, session
+from flask.cli import with_appcontext
+
+from db import db, REPLICA
+
+# Read-replica routing.
+#
+# With DATABASE_REPLICA_URL set, routes wrapped in @read_only read from the
+# replica bind (db.RoutingSession does the routing). Read-your-writes:
+#   - within a request, the first write pins the session to the primary;
+#   - across requests, a user who wrote within REPLICA_STICKY_SECONDS
+#     (default 5) keeps reading from the primary, so replication lag never
+#     hides their own change. The time of the last write travels in the
+#     Flask session cookie.
+# Without a replica every query goes to the primary as before.
+
+_STICKY_KEY = '_db_write_at'
+
+
+def read_only(view):
+    """Route a GET endpoint's reads to the replica. Apply above @login_required
+    so the user lookup is routed too."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        written_at = session.get(_STICKY_KEY)
+        g.db_read_only = written_at is None or \
+            time.time() - written_at > current_app.config['REPLICA_STICKY_SECONDS']
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _remember_write(response):
+    if db.session.info.get('wrote'):
+        session[_STICKY_KEY] = time.time()
+    return response
+
+
+@click.command('sync-replica')
+@with_appcontext
+def sync_replica_command():
+    """Copy the primary SQLite database onto the replica file (local testing)."""
+    primary, replica = db.engines[None], db.engines.get(REPLICA)
+    if replica is None or primary.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise click.ClickException('sync-replica needs SQLite files for both DATABASE_URL and DATABASE_REPLICA_URL')
+    replica.dispose()
+    source = sqlite3.connect(primary.url.database)
+    target = sqlite3.connect(replica.url.database)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+    print(f"Copied {primary.url.database} to {replica.url.database}")
+
+
+def init_app(app):
+    app.config.setdefault('REPLICA_STICKY_SECONDS', 5.0)
+    if REPLICA in app.config.get('SQLALCHEMY_BINDS', {}):
+        app.after_request(_remember_write)
+    app.cli.add_command(sync_replica_command)
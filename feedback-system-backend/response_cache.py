@@ -0,0 +1,312 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import make_response, request
+from flask_login import current_user
+
+import etags
+import instrumentation
+import serializers
+from db import run_blocking
+
+# Response cache for per-user GET routes (dashboard, feedback listing, team).
+#
+# @cached stores the body of a 200 response under the route, the caller's id
+# and role, the negotiated representation (JSON or MessagePack) and the query
+# string, tagged with the caller's user tag. Bodies are stored uncompressed.
+# Write routes call invalidate_users() after committing for every user whose
+# responses they change. That advances the users' tag versions rather than
+# deleting keys: each entry remembers the tag versions it was computed under
+# (read before the view ran) and only counts as a hit while they are current.
+# Entries also remember the caller's data_version (etags.py), which the same
+# writes bump in the database, so a write made through any worker expires
+# them everywhere, whatever the backend.
+#
+#   RESPONSE_CACHE_TTL        seconds an entry lives (default 60, 0 disables)
+#   RESPONSE_CACHE_MAX_BYTES  size bound of each worker's in-process LRU tier
+#                             (default 32 MiB)
+#   RESPONSE_CACHE_BACKEND    'memory' (default): the in-process tier only, and
+#                             each worker computes and caches its own entries.
+#                             'sqlite': adds a tier in a SQLite file shared by
+#                             every worker on the host (RESPONSE_CACHE_PATH),
+#                             which also holds the tag versions, so workers
+#                             share hits.
+#
+# With a read replica, a response computed from a lagging replica right after
+# an invalidation can be cached as current; RESPONSE_CACHE_TTL bounds how long.
+
+logger = logging.getLogger(__name__)
+
+
+def user_tag(user_id):
+    return f'user:{user_id}'
+
+
+class LocalTier:
+    """Size-bounded LRU of (expires_at, entry) pairs, plus tag versions."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        versions, body = entry
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.bytes -= len(item[1][1])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def versions(self, tags):
+        with self._lock:
+            return [self._versions[tag] for tag in tags]
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self.bytes = 0
+
+
+class SQLiteTier:
+    """Entries and tag versions in a SQLite file shared by all workers.
+
+    The public methods go through db.run_blocking(), so under asgi.py they
+    run off the event loop."""
+
+    def __init__(self, path, max_entries=50000, purge_every=500):
+        self.path = path
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS response_cache ('
+                               'key TEXT PRIMARY KEY, versions TEXT NOT NULL, body BLOB NOT NULL, '
+                               'expires_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_expires '
+                               'ON response_cache (expires_at)')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_tag ('
+                               'tag TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        return run_blocking(self._get, key)
+
+    def _get(self, key):
+        row = self._connection().execute(
+            'SELECT versions, body, expires_at FROM response_cache WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        versions, body, expires_at = row
+        return json.loads(versions), body, expires_at - time.time()
+
+    def set(self, key, entry, ttl):
+        return run_blocking(self._set, key, entry, ttl)
+
+    def _set(self, key, entry, ttl):
+        versions, body = entry
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO response_cache (key, versions, body, expires_at) '
+                           'VALUES (?, ?, ?, ?)', (key, json.dumps(versions), body, time.time() + ttl))
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge()
+
+    def purge(self):
+        """Drop expired entries, then the soonest to expire beyond max_entries."""
+        connection = self._connection()
+        connection.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+        connection.execute('DELETE FROM response_cache WHERE key IN ('
+                           'SELECT key FROM response_cache ORDER BY expires_at '
+                           'LIMIT max((SELECT count(*) FROM response_cache) - ?, 0))', (self.max_entries,))
+
+    def versions(self, tags):
+        return run_blocking(self._versions, tags)
+
+    def _versions(self, tags):
+        placeholders = ','.join('?' * len(tags))
+        found = dict(self._connection().execute(
+            f'SELECT tag, version FROM cache_tag WHERE tag IN ({placeholders})', tags
+        ).fetchall())
+        return [found.get(tag, 0) for tag in tags]
+
+    def bump(self, tags):
+        return run_blocking(self._bump, tags)
+
+    def _bump(self, tags):
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany('INSERT INTO cache_tag (tag, version) VALUES (?, 1) '
+                                   'ON CONFLICT (tag) DO UPDATE SET version = version + 1',
+                                   [(tag,) for tag in tags])
+
+
+class ResponseCache:
+    def __init__(self, ttl=60, max_bytes=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.local = LocalTier(max_bytes)
+        self.shared = None
+
+    def _tag_store(self):
+        return self.shared or self.local
+
+    def lookup(self, endpoint, key, tags, data_version=0):
+        """Return (body, versions): body is None on a miss, and versions are
+        the current data and tag versions to store a freshly computed body
+        under."""
+        try:
+            versions = [data_version, *self._tag_store().versions(tags)]
+        except sqlite3.Error:
+            logger.exception('Response cache tag lookup failed')
+            return None, None
+        entry = self.local.get(key)
+        if entry is not None and entry[0] == versions:
+            instrumentation.registry.record_cache_lookup(endpoint, 'hit_local')
+            return entry[1], versions
+        if self.shared is not None:
+            try:
+                found = self.shared.get(key)
+            except sqlite3.Error:
+                logger.exception('Response cache read failed')
+                found = None
+            if found is not None and found[0] == versions:
+                self.local.set(key, (versions, found[1]), found[2])
+                instrumentation.registry.record_cache_lookup(endpoint, 'hit_shared')
+                return found[1], versions
+        instrumentation.registry.record_cache_lookup(endpoint, 'miss')
+        return None, versions
+
+    def store(self, key, versions, body):
+        entry = (versions, body)
+        self.local.set(key, entry, self.ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, entry, self.ttl)
+            except sqlite3.Error:
+                logger.exception('Response cache write failed')
+
+    def invalidate(self, tags):
+        tags = sorted(set(tags))
+        if not tags:
+            return
+        try:
+            self._tag_store().bump(tags)
+        except sqlite3.Error:
+            # Entries under these tags would otherwise outlive the write
+            logger.exception('Response cache invalidation failed; clearing this worker')
+            self.local.clear()
+
+cache = ResponseCache()
+
+
+def cached(view):
+    """Serve a per-user GET route's 200 responses from the cache. Apply
+    below @login_required (and below @etags.conditional)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if cache.ttl <= 0:
+            return view(*args, **kwargs)
+        user_id = current_user.id
+        mimetype = serializers.response_mimetype()
+        key = f'{request.endpoint}|{user_id}|{current_user.role}|{mimetype}|{request.query_string.decode()}'
+        body, versions = cache.lookup(request.endpoint, key, [user_tag(user_id)], etags.request_version())
+        if body is not None:
+            response = make_response(body, 200, {'Content-Type': mimetype})
+            if serializers.msgpack is not None:
+                response.vary.add('Accept')
+            return response
+        response = make_response(view(*args, **kwargs))
+        if versions is not None and response.status_code == 200 and response.mimetype == mimetype:
+            cache.store(key, versions, response.get_data())
+        return response
+    return wrapper
+
+
+def invalidate_users(*user_ids):
+    """Expire every cached response of the given users. Call after committing."""
+    cache.invalidate([user_tag(user_id) for user_id in user_ids if user_id is not None])
+
+
+def _hit_ratios():
+    registry = instrumentation.registry
+    totals = defaultdict(lambda: [0, 0])
+    with registry.lock:
+        for (endpoint, result), count in registry.cache_lookups_total.items():
+            totals[endpoint][1] += count
+            if result != 'miss':
+                totals[endpoint][0] += count
+    return {(('endpoint', endpoint),): hits / lookups for endpoint, (hits, lookups) in totals.items()}
+
+
+def init_app(app):
+    app.config.setdefault('RESPONSE_CACHE_TTL', 60)
+    app.config.setdefault('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    app.config.setdefault('RESPONSE_CACHE_BACKEND', 'memory')
+    app.config.setdefault('RESPONSE_CACHE_PATH', os.path.join(app.instance_path, 'cache.db'))
+    cache.ttl = app.config['RESPONSE_CACHE_TTL']
+    cache.local = LocalTier(app.config['RESPONSE_CACHE_MAX_BYTES'])
+    backend = app.config['RESPONSE_CACHE_BACKEND']
+    if backend == 'sqlite':
+        os.makedirs(os.path.dirname(os.path.abspath(app.config['RESPONSE_CACHE_PATH'])), exist_ok=True)
+        cache.shared = SQLiteTier(app.config['RESPONSE_CACHE_PATH'])
+    elif backend == 'memory':
+        cache.shared = None
+    else:
+        raise ValueError(f"Unsupported RESPONSE_CACHE_BACKEND '{backend}'")
+
+    registry = instrumentation.registry
+    registry.set_gauge_source('response_cache_hit_ratio', 'Share of response cache lookups that hit.',
+                              _hit_ratios)
+    registry.set_gauge_source(
+        'response_cache_local_bytes', 'Size of the in-process response cache tier.',
+        lambda: {(): cache.local.bytes}
+    )
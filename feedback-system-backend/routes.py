@@ -1,12 +1,103 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from collections import defaultdict
+import csv
+import io
+import string
+import sys
 from datetime import datetime
-from models import db, User, Feedback, FeedbackRequest
+from sqlalchemy import func, insert, or_, select, tuple_, update
+from models import db, User, Feedback, FeedbackArchive, FeedbackRequest, PENDING_STATUS
+import admin
+import analytics
+import archive
+import compression
+import dashboard
+import etags
+import events
+import export
+import hashing
+import identity_cache
+import importer
+import jobs
+import notifications
+import orgchart
+import profiling
+import replica
+import response_cache
+import search
+import serializers
+from pagination import DEFAULT_PAGE_SIZE, parse_limit, encode_cursor, decode_created_cursor, decode_id_cursor, decode_offset_cursor
+from seed import seed_demo_data
 import os
 
 routes = Blueprint('routes', __name__)
 
+# Upper bound on items per batch endpoint call
+MAX_BATCH_SIZE = 1000
+
+
+# gzip/brotli for the larger JSON, MessagePack and export responses
+routes.after_request(compression.compress_response)
+
+
+@routes.errorhandler(hashing.HashingBusy)
+def hashing_busy(e):
+    # Shed load quickly instead of queueing behind the password hashing pool
+    return jsonify({'error': 'Server is busy, please retry shortly'}), 503, {'Retry-After': '1'}
+
+
+@routes.errorhandler(events.TooManyStreams)
+def too_many_streams(e):
+    # The page still works without live updates; the client reopens later
+    return jsonify({'error': 'Too many open event streams, please retry later'}), 503, {'Retry-After': '30'}
+
+
+def _id_list(data, key):
+    if not isinstance(data, dict):
+        # No body means no ids; any other JSON value is malformed
+        return [] if data is None else None
+    ids = data.get(key, [])
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return None
+    return list(dict.fromkeys(ids))
+
+
+# SQLite's lower() folds ASCII letters only (it is built without ICU)
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _lower(value):
+    # Fold case as the database's lower() does, or the range misses the index values
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return value.translate(_ASCII_LOWER)
+    return value.lower()
+
+
+def _after_prefix(prefix):
+    # Smallest string above every string that starts with prefix, or None if
+    # prefix is all U+10FFFF (then nothing above it fails to start with it)
+    while prefix:
+        code = ord(prefix[-1]) + 1
+        if code == 0xD800:
+            code = 0xE000  # surrogates cannot be stored
+        if code <= sys.maxunicode:
+            return prefix[:-1] + chr(code)
+        prefix = prefix[:-1]
+    return None
+
+
+def _prefix_match(column, prefix):
+    # Case-insensitive prefix test written as a range on lower(column), so it
+    # is served by the expression index instead of a LIKE scan
+    prefix = _lower(prefix)
+    upper = _after_prefix(prefix)
+    lowered = func.lower(column)
+    if upper is None:
+        return lowered >= prefix
+    return (lowered >= prefix) & (lowered < upper)
+
+
 # Database initialization endpoint
 @routes.route('/init-db', methods=['POST'])
 def init_db():
@@ -15,53 +106,7 @@ def init_db():
         db.create_all()
 
         # Check if we need to seed the database
-        if not User.query.first():
-            # Create a manager
-            manager = User(
-                username='TheManager',
-                email='manager1@company.com',
-                password_hash=generate_password_hash('@12345'),
-                role='manager'
-            )
-            db.session.add(manager)
-            db.session.commit()
-
-            # Create employees
-            employee1 = User(
-                username='Jack',
-                email='jack@company.com',
-                password_hash=generate_password_hash('@123456'),
-                role='employee',
-                manager_id=manager.id
-            )
-            employee2 = User(
-                username='Alex',
-                email='Alex@company.com',
-                password_hash=generate_password_hash('@1234567'),
-                role='employee',
-                manager_id=manager.id
-            )
-            db.session.add_all([employee1, employee2])
-            db.session.commit()
-
-            # Create sample feedback
-            feedback1 = Feedback(
-                manager_id=manager.id,
-                employee_id=employee1.id,
-                strengths='Great communication skills and team collaboration',
-                areas_to_improve='Could work on time management',
-                sentiment='positive'
-            )
-            feedback2 = Feedback(
-                manager_id=manager.id,
-                employee_id=employee2.id,
-                strengths='Excellent technical skills',
-                areas_to_improve='Needs to improve documentation',
-                sentiment='neutral'
-            )
-            db.session.add_all([feedback1, feedback2])
-            db.session.commit()
-
+        if seed_demo_data():
             return jsonify({'message': 'Database initialized and seeded successfully'}), 200
         else:
             return jsonify({'message': 'Database already initialized'}), 200
@@ -74,55 +119,9 @@ def init_db():
 def seed_db():
     try:
         # Check if database is already seeded
-        if User.query.first():
+        if not seed_demo_data():
             return jsonify({'message': 'Database already contains data'}), 200
 
-        # Create a manager
-        manager = User(
-            username='TheManager',
-            email='manager1@company.com',
-            password_hash=generate_password_hash('@12345'),
-            role='manager'
-        )
-        db.session.add(manager)
-        db.session.commit()
-
-        # Create employees
-        employee1 = User(
-            username='Jack',
-            email='jack@company.com',
-            password_hash=generate_password_hash('@123456'),
-            role='employee',
-            manager_id=manager.id
-        )
-        employee2 = User(
-            username='Alex',
-            email='Alex@company.com',
-            password_hash=generate_password_hash('@1234567'),
-            role='employee',
-            manager_id=manager.id
-        )
-        db.session.add_all([employee1, employee2])
-        db.session.commit()
-
-        # Create sample feedback
-        feedback1 = Feedback(
-            manager_id=manager.id,
-            employee_id=employee1.id,
-            strengths='Great communication skills and team collaboration',
-            areas_to_improve='Could work on time management',
-            sentiment='positive'
-        )
-        feedback2 = Feedback(
-            manager_id=manager.id,
-            employee_id=employee2.id,
-            strengths='Excellent technical skills',
-            areas_to_improve='Needs to improve documentation',
-            sentiment='neutral'
-        )
-        db.session.add_all([feedback1, feedback2])
-        db.session.commit()
-
         return jsonify({'message': 'Database seeded successfully'}), 200
 
     except Exception as e:
@@ -139,10 +138,12 @@ def register():
     user = User(
         username=data['username'],
         email=data['email'],
-        password_hash=generate_password_hash(data['password']),
+        password_hash=hashing.hash_password(data['password']),
         role=data['role']
     )
     db.session.add(user)
+    db.session.flush()
+    orgchart.add_user(user.id)
     db.session.commit()
     return jsonify({'message': 'User registered successfully'}), 201
 
@@ -168,7 +169,12 @@ def login():
 
         if user:
             print(f"User found: {user.username}, checking password...")
-            if check_password_hash(user.password_hash, data['password']):
+            if hashing.check_password(user.password_hash, data['password']):
+                if hashing.needs_rehash(user.password_hash):
+                    # Stored with outdated parameters: upgrade while we have the plaintext
+                    user.password_hash = hashing.hash_password(data['password'])
+                    db.session.commit()
+                    identity_cache.invalidate(user.id)
                 login_user(user)
                 print(f"Login successful for user: {user.username}")
                 return jsonify({
@@ -188,6 +194,8 @@ def login():
 
         return jsonify({'error': 'Invalid credentials'}), 401
 
+    except hashing.HashingBusy:
+        raise
     except Exception as e:
         print(f"Login error: {str(e)}")
         import traceback
@@ -202,27 +210,17 @@ def logout():
 
 
 @routes.route('/users', methods=['GET'])
+@replica.read_only
 @login_required
+@response_cache.cached
 def get_users():
     if current_user.role == 'manager':
-        team_members = User.query.filter_by(manager_id=current_user.id).all()
-        return jsonify({
-            'users': [{
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role
-            } for user in team_members]
-        }), 200
+        team_members = db.session.execute(
+            serializers.USER.select().where(User.manager_id == current_user.id)
+        ).all()
+        return jsonify({'users': serializers.USER.dump(team_members)}), 200
     else:
-        return jsonify({
-            'users': [{
-                'id': current_user.id,
-                'username': current_user.username,
-                'email': current_user.email,
-                'role': current_user.role
-            }]
-        }), 200
+        return jsonify({'users': [serializers.USER.dump_object(current_user)]}), 200
 
 
 @routes.route('/feedback', methods=['POST'])
@@ -242,7 +240,16 @@ def create_feedback():
         sentiment=data['sentiment']
     )
     db.session.add(feedback)
+    dashboard.record_created(feedback)
+    analytics.record_created(feedback)
+    etags.bump(current_user.id, employee.id)
+    db.session.flush()
+    jobs.enqueue(notifications.FEEDBACK_CREATED, {'feedback_ids': [feedback.id]})
     db.session.commit()
+    response_cache.invalidate_users(current_user.id, employee.id)
+    events.publish([current_user.id, employee.id], 'feedback_created', {
+        'ids': [feedback.id], 'manager_id': current_user.id, 'employee_id': employee.id
+    })
     return jsonify({'message': 'Feedback created successfully', 'id': feedback.id}), 201
 
 @routes.route('/feedback/<int:feedback_id>', methods=['PUT'])
@@ -255,11 +262,19 @@ def update_feedback(feedback_id):
     else:
         return jsonify({'error': 'Employees cannot edit feedback'}), 403
     data = request.get_json()
+    old_sentiment = feedback.sentiment
     feedback.strengths = data['strengths']
     feedback.areas_to_improve = data['areas_to_improve']
     feedback.sentiment = data['sentiment']
     feedback.updated_at = datetime.utcnow()
+    dashboard.record_sentiment_change(feedback, old_sentiment)
+    analytics.record_sentiment_change(feedback, old_sentiment)
+    etags.bump(feedback.manager_id, feedback.employee_id)
     db.session.commit()
+    response_cache.invalidate_users(feedback.manager_id, feedback.employee_id)
+    events.publish([feedback.manager_id, feedback.employee_id], 'feedback_updated', {
+        'ids': [feedback.id], 'manager_id': feedback.manager_id, 'employee_id': feedback.employee_id
+    })
     return jsonify({'message': 'Feedback updated successfully'}), 200
 
 @routes.route('/feedback/<int:feedback_id>/acknowledge', methods=['POST'])
@@ -268,89 +283,280 @@ def acknowledge_feedback(feedback_id):
     feedback = Feedback.query.get_or_404(feedback_id)
     if feedback.employee_id != current_user.id:
         return jsonify({'error': 'You can only acknowledge feedback for yourself'}), 403
-    feedback.acknowledged = True
+    newly_acknowledged = not feedback.acknowledged
+    if newly_acknowledged:
+        feedback.acknowledged = True
+        dashboard.record_acknowledged(feedback)
+        etags.bump(feedback.employee_id, feedback.manager_id)
     db.session.commit()
+    if newly_acknowledged:
+        response_cache.invalidate_users(feedback.employee_id, feedback.manager_id)
+        events.publish([feedback.manager_id, feedback.employee_id], 'feedback_acknowledged', {
+            'ids': [feedback.id], 'manager_id': feedback.manager_id, 'employee_id': feedback.employee_id
+        })
     return jsonify({'message': 'Feedback acknowledged'}), 200
 
+@routes.route('/feedback/batch', methods=['POST'])
+@login_required
+def create_feedback_batch():
+    if current_user.role != 'manager':
+        return jsonify({'error': 'Only managers can create feedback'}), 403
+    data = request.get_json()
+    items = data.get('feedback') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'feedback must be a non-empty list'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} feedback items per batch'}), 400
+    required = ('employee_id', 'strengths', 'areas_to_improve', 'sentiment')
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or any(key not in item for key in required):
+            return jsonify({'error': f'Item {index} must include {", ".join(required)}'}), 400
+        if not isinstance(item['employee_id'], int) or isinstance(item['employee_id'], bool):
+            return jsonify({'error': f'Item {index} employee_id must be an integer'}), 400
+
+    # One ownership check for the whole batch
+    employee_ids = {item['employee_id'] for item in items}
+    owned = set(db.session.scalars(
+        select(User.id).where(User.id.in_(employee_ids), User.manager_id == current_user.id)
+    ))
+    not_owned = sorted(employee_ids - owned)
+    if not_owned:
+        return jsonify({
+            'error': 'Employee not found or not under your management',
+            'employee_ids': not_owned
+        }), 404
+
+    now = datetime.utcnow()
+    rows = [{
+        'manager_id': current_user.id,
+        'employee_id': item['employee_id'],
+        'strengths': item['strengths'],
+        'areas_to_improve': item['areas_to_improve'],
+        'sentiment': item['sentiment'],
+        'created_at': now,
+        'updated_at': now,
+        'acknowledged': False
+    } for item in items]
+    # Multi-row INSERT; RETURNING rows come back in the order of `rows`
+    inserted = db.session.execute(
+        insert(Feedback).returning(Feedback.id, Feedback.employee_id, sort_by_parameter_order=True), rows
+    ).all()
+    dashboard.record_created_many(rows)
+    analytics.record_created_many(rows)
+    etags.bump(current_user.id, *employee_ids)
+    # Each employee only hears about their own new feedback
+    ids = []
+    ids_by_employee = defaultdict(list)
+    for (feedback_id, employee_id), row in zip(inserted, rows, strict=True):
+        if employee_id != row['employee_id']:
+            raise RuntimeError(f'Feedback {feedback_id} was returned for the wrong batch item')
+        ids.append(feedback_id)
+        ids_by_employee[employee_id].append(feedback_id)
+    jobs.enqueue_many(notifications.FEEDBACK_CREATED,
+                      [{'feedback_ids': employee_feedback} for employee_feedback in ids_by_employee.values()])
+    db.session.commit()
+    response_cache.invalidate_users(current_user.id, *employee_ids)
+    events.publish_many(
+        [([current_user.id], 'feedback_created', {'ids': ids, 'manager_id': current_user.id})] +
+        [([employee_id], 'feedback_created',
+          {'ids': employee_feedback, 'manager_id': current_user.id, 'employee_id': employee_id})
+         for employee_id, employee_feedback in ids_by_employee.items()]
+    )
+    return jsonify({'message': f'{len(ids)} feedback entries created', 'ids': ids}), 201
+
+@routes.route('/feedback/acknowledge-batch', methods=['POST'])
+@login_required
+def acknowledge_feedback_batch():
+    data = request.get_json()
+    feedback_ids = _id_list(data, 'ids')
+    if feedback_ids is None:
+        return jsonify({'error': 'ids must be a list of integers'}), 400
+    if len(feedback_ids) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} ids per batch'}), 400
+    acknowledged = []
+    if feedback_ids:
+        # Only the caller's own, not yet acknowledged feedback is touched
+        result = db.session.execute(
+            update(Feedback)
+            .where(Feedback.id.in_(feedback_ids),
+                   Feedback.employee_id == current_user.id,
+                   Feedback.acknowledged.isnot(True))
+            .values(acknowledged=True)
+            .returning(Feedback.id, Feedback.manager_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        acknowledged = sorted(feedback_id for feedback_id, _ in result)
+        dashboard.record_acknowledged_many(current_user.id, [manager_id for _, manager_id in result])
+        if result:
+            etags.bump(current_user.id, *[manager_id for _, manager_id in result])
+    db.session.commit()
+    if acknowledged:
+        response_cache.invalidate_users(current_user.id, *[manager_id for _, manager_id in result])
+        ids_by_manager = defaultdict(list)
+        for feedback_id, manager_id in result:
+            ids_by_manager[manager_id].append(feedback_id)
+        events.publish_many(
+            [([current_user.id], 'feedback_acknowledged', {'ids': acknowledged, 'employee_id': current_user.id})] +
+            [([manager_id], 'feedback_acknowledged',
+              {'ids': sorted(manager_feedback), 'manager_id': manager_id, 'employee_id': current_user.id})
+             for manager_id, manager_feedback in ids_by_manager.items()]
+        )
+    skipped = sorted(set(feedback_ids) - set(acknowledged))
+    return jsonify({
+        'message': 'Feedback acknowledged',
+        'acknowledged_ids': acknowledged,
+        'skipped_ids': skipped
+    }), 200
+
+def _feedback_listing(schema, model, after_key):
+    # The caller's feedback in one table (Feedback or FeedbackArchive)
+    query = schema.select()
+    if current_user.role == 'manager':
+        query = query.where(model.manager_id == current_user.id)
+    else:
+        query = query.where(model.employee_id == current_user.id)
+    if after_key:
+        query = query.where(tuple_(model.created_at, model.id) > after_key)
+    return query
+
 @routes.route('/feedback', methods=['GET'])
+@replica.read_only
 @login_required
+@etags.conditional
+@response_cache.cached
 def get_feedback():
-    if current_user.role == 'manager':
-        feedback_list = Feedback.query.filter_by(manager_id=current_user.id).all()
+    try:
+        limit = parse_limit(request.args, default=DEFAULT_PAGE_SIZE)
+        after = request.args.get('after')
+        after_key = decode_created_cursor(after) if after else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Both user names come from joins in the same statement
+    query = _feedback_listing(serializers.FEEDBACK, Feedback, after_key)
+    if archive.include_archived(request.args):
+        query = archive.hot_and_cold(
+            query, _feedback_listing(serializers.FEEDBACK_ARCHIVE, FeedbackArchive, after_key)
+        )
     else:
-        feedback_list = Feedback.query.filter_by(employee_id=current_user.id).all()
+        query = query.order_by(Feedback.created_at, Feedback.id)
+
+    # Fetch one extra row to know whether another page exists
+    rows = db.session.execute(query.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    last = rows[-1] if rows else None
     return jsonify({
-        'feedback': [{
-            'id': f.id,
-            'manager_id': f.manager_id,
-            'employee_id': f.employee_id,
-            'strengths': f.strengths,
-            'areas_to_improve': f.areas_to_improve,
-            'sentiment': f.sentiment,
-            'created_at': f.created_at.isoformat(),
-            'updated_at': f.updated_at.isoformat(),
-            'acknowledged': f.acknowledged,
-            'manager_name': User.query.get(f.manager_id).username,
-            'employee_name': User.query.get(f.employee_id).username
-        } for f in feedback_list]
+        'feedback': serializers.FEEDBACK.dump(rows),
+        'next_cursor': encode_cursor(last.created_at, last.id) if has_more else None
     }), 200
 
+@routes.route('/feedback/search', methods=['GET'])
+@replica.read_only
+@login_required
+def search_feedback():
+    q = request.args.get('q', '')
+    if not search.has_terms(q):
+        return jsonify({'error': 'q must contain at least one word'}), 400
+    try:
+        limit = parse_limit(request.args, default=DEFAULT_PAGE_SIZE)
+        after = request.args.get('after')
+        offset = decode_offset_cursor(after) if after else 0
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Ranks have no stable keyset, so the cursor carries an offset
+    rows = search.search(current_user, q, limit + 1, offset)
+    has_more = len(rows) > limit
+    return jsonify({
+        'feedback': serializers.FEEDBACK.dump(rows[:limit]),
+        'next_cursor': encode_cursor(offset + limit) if has_more else None
+    }), 200
+
+@routes.route('/feedback/export', methods=['GET'])
+@replica.read_only
+@login_required
+def export_feedback():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(export.FORMATS)}"}), 400
+    try:
+        filters = export.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(
+        stream_with_context(export.stream(current_user, filters, fmt)),
+        mimetype=export.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename=feedback-export.{fmt}'}
+    )
+
+# Server-sent events: feedback_created, feedback_updated, feedback_acknowledged
+# and feedback_requested for the logged-in user
+@routes.route('/events', methods=['GET'])
+@login_required
+def event_stream():
+    return events.stream_response(current_user.id)
+
 # Dashboard routes
 @routes.route('/dashboard', methods=['GET'])
+@replica.read_only
 @login_required
+@etags.conditional
+@response_cache.cached
 def get_dashboard():
     if current_user.role == 'manager':
-        team_members = User.query.filter_by(manager_id=current_user.id).all()
-        team_feedback = Feedback.query.filter_by(manager_id=current_user.id).all()
-        total_feedback = len(team_feedback)
-        sentiment_counts = {
-            'positive': len([f for f in team_feedback if f.sentiment == 'positive']),
-            'neutral': len([f for f in team_feedback if f.sentiment == 'neutral']),
-            'negative': len([f for f in team_feedback if f.sentiment == 'negative'])
-        }
-        return jsonify({
-            'type': 'manager',
-            'team_size': len(team_members),
-            'total_feedback': total_feedback,
-            'sentiment_counts': sentiment_counts,
-            'recent_feedback': [{
-                'id': f.id,
-                'employee_name': User.query.get(f.employee_id).username,
-                'sentiment': f.sentiment,
-                'created_at': f.created_at.isoformat(),
-                'acknowledged': f.acknowledged
-            } for f in sorted(team_feedback, key=lambda x: x.created_at, reverse=True)[:5]]
-        }), 200
+        return jsonify(dashboard.manager_dashboard(current_user)), 200
     else:
-        received_feedback = Feedback.query.filter_by(employee_id=current_user.id).all()
-        return jsonify({
-            'type': 'employee',
-            'total_feedback': len(received_feedback),
-            'unacknowledged_count': len([f for f in received_feedback if not f.acknowledged]),
-            'recent_feedback': [{
-                'id': f.id,
-                'manager_name': User.query.get(f.manager_id).username,
-                'sentiment': f.sentiment,
-                'created_at': f.created_at.isoformat(),
-                'acknowledged': f.acknowledged
-            } for f in sorted(received_feedback, key=lambda x: x.created_at, reverse=True)[:5]]
-        }), 200
+        return jsonify(dashboard.employee_dashboard(current_user)), 200
 
 @routes.route('/all-employees', methods=['GET'])
+@replica.read_only
 @login_required
 def get_all_employees():
     if current_user.role != 'manager':
         return jsonify({'error': 'Only managers can view all employees'}), 403
-    employees = User.query.filter_by(role='employee').all()
-    return jsonify({
-        'employees': [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'role': user.role,
-            'manager_id': user.manager_id
-        } for user in employees]
-    }), 200
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else list(serializers.EMPLOYEE.fields)
+    unknown = [field for field in fields if field not in serializers.EMPLOYEE.fields]
+    if unknown:
+        return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+    try:
+        limit = parse_limit(request.args)
+        after = request.args.get('after')
+        after_id = decode_id_cursor(after) if after else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    manager_id = request.args.get('manager_id')
+    if manager_id and not manager_id.isdigit():
+        return jsonify({'error': 'manager_id must be an integer'}), 400
+
+    # Select only the requested columns, plus id for the cursor, as tuples
+    schema = serializers.EMPLOYEE.only(fields)
+    query = schema.select(User.id.label('cursor_id')).where(User.role == 'employee')
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.where(or_(_prefix_match(User.username, q), _prefix_match(User.email, q)))
+    if request.args.get('unassigned') in ('1', 'true'):
+        query = query.where(User.manager_id.is_(None))
+    elif manager_id:
+        query = query.where(User.manager_id == int(manager_id))
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    query = query.order_by(User.id)
+
+    if limit:
+        rows = db.session.execute(query.limit(limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    else:
+        rows = db.session.execute(query).all()
+        has_more = False
+
+    response = {
+        'employees': schema.dump(rows)
+    }
+    if limit:
+        response['next_cursor'] = encode_cursor(rows[-1].cursor_id) if has_more else None
+    return jsonify(response), 200
 
 @routes.route('/assign-team', methods=['POST'])
 @login_required
@@ -358,18 +564,80 @@ def assign_team():
     if current_user.role != 'manager':
         return jsonify({'error': 'Only managers can assign team members'}), 403
     data = request.get_json()
-    employee_ids = data.get('employee_ids', [])
-    if not isinstance(employee_ids, list):
-        return jsonify({'error': 'employee_ids must be a list'}), 400
+    employee_ids = _id_list(data, 'employee_ids')
+    if employee_ids is None:
+        return jsonify({'error': 'employee_ids must be a list of integers'}), 400
     updated = []
-    for emp_id in employee_ids:
-        employee = User.query.filter_by(id=emp_id, role='employee').first()
-        if employee:
-            employee.manager_id = current_user.id
-            updated.append(employee.id)
+    previous_managers = []
+    if employee_ids:
+        # Team sizes change for the managers the employees are taken from too
+        previous_managers = db.session.scalars(
+            select(User.manager_id).distinct()
+            .where(User.id.in_(employee_ids), User.role == 'employee',
+                   User.manager_id.isnot(None), User.manager_id != current_user.id)
+        ).all()
+        # One set-based UPDATE instead of a SELECT per employee
+        result = db.session.execute(
+            update(User)
+            .where(User.id.in_(employee_ids), User.role == 'employee')
+            .values(manager_id=current_user.id)
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+        assigned = {user_id for user_id, in result}
+        updated = [emp_id for emp_id in employee_ids if emp_id in assigned]
+        try:
+            orgchart.move_subtrees(assigned, current_user.id)
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
+        # The assigned employees' manager_id changed: their cached identities are stale
+        etags.bump(current_user.id, *previous_managers, *updated)
     db.session.commit()
+    if updated:
+        response_cache.invalidate_users(current_user.id, *previous_managers, *updated)
     return jsonify({'message': 'Team assigned successfully', 'assigned_employee_ids': updated}), 200
 
+# Feedback stats for everyone in the caller's reporting subtree, or in the
+# subtree of a user below them with ?root_id=
+@routes.route('/org/subtree', methods=['GET'])
+@replica.read_only
+@login_required
+def get_org_subtree():
+    if current_user.role != 'manager':
+        return jsonify({'error': 'Only managers can view their organisation'}), 403
+    root_id = request.args.get('root_id')
+    if root_id is None:
+        root_id = current_user.id
+    elif not root_id.isdigit():
+        return jsonify({'error': 'root_id must be an integer'}), 400
+    else:
+        root_id = int(root_id)
+        if not orgchart.in_subtree(current_user.id, root_id):
+            return jsonify({'error': 'User not found in your organisation'}), 404
+    return jsonify(orgchart.subtree_stats(root_id)), 200
+
+# Sentiment counts per week or month of the feedback the manager gave, for
+# the team and per employee, from the rollup table (see analytics.py)
+@routes.route('/analytics/sentiment-trend', methods=['GET'])
+@replica.read_only
+@login_required
+def get_sentiment_trend():
+    if current_user.role != 'manager':
+        return jsonify({'error': 'Only managers can view sentiment trends'}), 403
+    granularity = request.args.get('bucket', 'week')
+    if granularity not in analytics.GRANULARITIES:
+        return jsonify({'error': 'bucket must be week or month'}), 400
+    periods = request.args.get('periods', str(analytics.DEFAULT_PERIODS))
+    if not periods.isdigit() or not 1 <= int(periods) <= analytics.MAX_PERIODS:
+        return jsonify({'error': f'periods must be an integer from 1 to {analytics.MAX_PERIODS}'}), 400
+    employee_id = request.args.get('employee_id')
+    if employee_id is not None:
+        if not employee_id.isdigit():
+            return jsonify({'error': 'employee_id must be an integer'}), 400
+        employee_id = int(employee_id)
+    return jsonify(analytics.sentiment_trend(current_user.id, granularity, int(periods), employee_id)), 200
+
 @routes.route('/feedback-request', methods=['POST'])
 @login_required
 def request_feedback():
@@ -385,19 +653,79 @@ def request_feedback():
         message=data.get('message', '')
     )
     db.session.add(req)
+    etags.bump(current_user.id, manager_id)
+    db.session.flush()
+    jobs.enqueue(notifications.FEEDBACK_REQUESTED, {'request_id': req.id})
     db.session.commit()
+    response_cache.invalidate_users(current_user.id, manager_id)
+    events.publish([manager_id, current_user.id], 'feedback_requested', {
+        'id': req.id, 'manager_id': manager_id, 'employee_id': current_user.id
+    })
     return jsonify({'message': 'Feedback request sent!'}), 201
 
 @routes.route('/feedback-requests', methods=['GET'])
+@replica.read_only
 @login_required
+@etags.conditional
 def get_feedback_requests():
     if current_user.role != 'manager':
         return jsonify({'error': 'Only managers can view feedback requests'}), 403
-    requests = FeedbackRequest.query.filter_by(manager_id=current_user.id, status='pending').all()
-    return jsonify({'requests': [{
-        'id': r.id,
-        'employee_id': r.employee_id,
-        'employee_name': User.query.get(r.employee_id).username,
-        'message': r.message,
-        'created_at': r.created_at.isoformat()
-    } for r in requests]})
\ No newline at end of file
+    # Employee names come from a join, not a lookup per request
+    requests = db.session.execute(
+        serializers.FEEDBACK_REQUEST.select().where(
+            FeedbackRequest.manager_id == current_user.id,
+            FeedbackRequest.status == PENDING_STATUS
+        ).order_by(FeedbackRequest.created_at)
+    ).all()
+    return jsonify({'requests': serializers.FEEDBACK_REQUEST.dump(requests)})
+
+# Bulk user import (see importer.py): the request body is the CSV itself,
+# read as a stream. Rows without a password come back under "invites" with
+# their generated password, spooled to a temporary file during the import and
+# streamed from it. Large imports are better run with `flask import-org`,
+# which hashes on every core instead of this worker's hashing pool.
+@routes.route('/admin/import-org', methods=['POST'])
+@admin.token_required
+def import_org():
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true')
+    invites = importer.InviteSpool()
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    try:
+        summary = importer.import_org(lines, dry_run=dry_run, on_invite=invites)
+    except (importer.ImportFailed, UnicodeDecodeError, csv.Error) as e:
+        invites.close()
+        return jsonify({'error': str(e)}), 400
+    if summary['error_count']:
+        invites.close()
+        return jsonify(summary), 400
+    response = Response(invites.json(summary), 200 if dry_run else 201, mimetype='application/json')
+    # Runs when the server closes the response, even if streaming never started
+    response.call_on_close(invites.close)
+    return response
+
+# Request profiles (see profiling.py), newest first. ?endpoint= filters by
+# Flask endpoint name, e.g. routes.get_dashboard.
+@routes.route('/admin/profiles', methods=['GET'])
+@admin.token_required
+def get_profiles():
+    profiles = profiling.middleware().recent(request.args.get('endpoint'))
+    return jsonify({'sample_rate': current_app.config['PROFILE_SAMPLE_RATE'],
+                    'profiles': [profile.summary() for profile in profiles]})
+
+# Collapsed stacks of every buffered profile of ?endpoint=, merged, for
+# `flamegraph.pl` or speedscope
+@routes.route('/admin/profiles/collapsed', methods=['GET'])
+@admin.token_required
+def get_profiles_collapsed():
+    profiles = profiling.middleware().recent(request.args.get('endpoint'))
+    return Response(profiling.collapsed(profiles), mimetype='text/plain')
+
+@routes.route('/admin/profiles/<int:profile_id>', methods=['GET'])
+@admin.token_required
+def get_profile(profile_id):
+    profile = profiling.middleware().get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found (it may have left the buffer)'}), 404
+    if request.args.get('format') == 'json':
+        return jsonify(profile.summary())
+    return Response(profiling.collapsed([profile]), mimetype='text/plain')
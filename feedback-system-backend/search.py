@@ -0,0 +1,58 @@
+import re
+from sqlalchemy import column, func, literal_column, table
+from models import db, Feedback, FEEDBACK_SEARCH_DOCUMENT, SEARCH_CONFIG
+import serializers
+
+# Ranked full-text search over feedback strengths and areas_to_improve.
+#
+# Postgres matches websearch_to_tsquery() against the GIN-indexed tsvector
+# expression and ranks with ts_rank(); SQLite matches the FTS5 table and ranks
+# with bm25(). Both indexes are defined next to the Feedback model. Queries
+# are words ANDed together, with "double quotes" for phrases.
+
+_fts = table('feedback_fts', column('rowid'))
+_TERM = re.compile(r'"([^"]*)"|(\w+)')
+_WORD = re.compile(r'\w+')
+
+
+def _fts5_query(q):
+    # Every term is quoted, so user input is never parsed as FTS5 syntax
+    terms = []
+    for phrase, word in _TERM.findall(q):
+        words = _WORD.findall(phrase) if phrase else [word]
+        if words:
+            terms.append('"' + ' '.join(words) + '"')
+    return ' '.join(terms)
+
+
+def has_terms(q):
+    return bool(_WORD.search(q or ''))
+
+
+def search_query(user, q, dialect_name):
+    """Build the ranked search statement for one user's visible feedback.
+
+    Rows have the serializers.FEEDBACK fields, best match first.
+    """
+    query = serializers.FEEDBACK.select()
+    if dialect_name == 'postgresql':
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        query = query.where(FEEDBACK_SEARCH_DOCUMENT.op('@@')(tsquery))
+        best_first = func.ts_rank(FEEDBACK_SEARCH_DOCUMENT, tsquery).desc()
+    else:
+        fts = literal_column('feedback_fts')
+        query = query.join(_fts, _fts.c.rowid == Feedback.id).where(fts.op('MATCH')(_fts5_query(q)))
+        # bm25() scores are lower for better matches
+        best_first = func.bm25(fts)
+    # Same visibility as GET /api/feedback
+    if user.role == 'manager':
+        query = query.where(Feedback.manager_id == user.id)
+    else:
+        query = query.where(Feedback.employee_id == user.id)
+    return query.order_by(best_first, Feedback.id)
+
+
+def search(user, q, limit, offset=0):
+    dialect_name = db.session.get_bind().dialect.name
+    query = search_query(user, q, dialect_name).limit(limit).offset(offset)
+    return db.session.execute(query).all()
@@ -0,0 +1,77 @@
+from models import db, User, Feedback
+import analytics
+import dashboard
+import hashing
+import orgchart
+
+
+def seed_demo_data():
+    """Create the demo manager, two employees and sample feedback.
+
+    Does nothing and returns False if the database already has users.
+    """
+    if User.query.first():
+        return False
+
+    manager_hash, jack_hash, alex_hash = hashing.hash_passwords(['@12345', '@123456', '@1234567'])
+
+    # Create a manager
+    manager = User(
+        username='TheManager',
+        email='manager1@company.com',
+        password_hash=manager_hash,
+        role='manager'
+    )
+    db.session.add(manager)
+    db.session.commit()
+
+    # Create employees
+    employee1 = User(
+        username='Jack',
+        email='jack@company.com',
+        password_hash=jack_hash,
+        role='employee',
+        manager_id=manager.id
+    )
+    employee2 = User(
+        username='Alex',
+        email='Alex@company.com',
+        password_hash=alex_hash,
+        role='employee',
+        manager_id=manager.id
+    )
+    db.session.add_all([employee1, employee2])
+    db.session.flush()
+    orgchart.add_user(manager.id)
+    orgchart.add_user(employee1.id, manager.id)
+    orgchart.add_user(employee2.id, manager.id)
+    db.session.commit()
+
+    # Create sample feedback
+    feedback1 = Feedback(
+        manager_id=manager.id,
+        employee_id=employee1.id,
+        strengths='Great communication skills and team collaboration',
+        areas_to_improve='Could work on time management',
+        sentiment='positive'
+    )
+    feedback2 = Feedback(
+        manager_id=manager.id,
+        employee_id=employee2.id,
+        strengths='Excellent technical skills',
+        areas_to_improve='Needs to improve documentation',
+        sentiment='neutral'
+    )
+    db.session.add_all([feedback1, feedback2])
+    db.session.flush()
+    rows = [{
+        'manager_id': f.manager_id,
+        'employee_id': f.employee_id,
+        'created_at': f.created_at,
+        'sentiment': f.sentiment,
+        'acknowledged': f.acknowledged
+    } for f in (feedback1, feedback2)]
+    dashboard.record_created_many(rows)
+    analytics.record_created_many(rows)
+    db.session.commit()
+    return True
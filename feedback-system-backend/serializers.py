@@ -0,0 +1,214 @@
+import json
+from datetime import date
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from models import User, Feedback, FeedbackArchive, FeedbackRequest
+
+try:
+    import orjson
+except ImportError:  # optional: `pip install orjson` for faster responses
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: `pip install msgpack` for application/msgpack responses
+    msgpack = None
+
+# Response schemas for the listing routes.
+#
+# A Schema names the fields of one JSON item and the column each one comes
+# from. Routes select those columns as plain row tuples, with no ORM objects
+# and no Text columns the response doesn't return, and dump() zips them into
+# dicts. Datetimes are left as they are: the JSON provider below writes them
+# as ISO 8601, so no route formats rows one by one.
+#
+# Responses are encoded with orjson when it is installed, else the json module.
+# With msgpack installed, a client whose Accept header prefers
+# application/msgpack gets the same data as MessagePack instead (datetimes
+# still as ISO 8601 strings).
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+class Schema:
+    def __init__(self, fields, joins=()):
+        """fields maps each JSON field to a column; joins lists the
+        (target, onclause) pairs those columns need, in order."""
+        self._fields = dict(fields)
+        self.fields = tuple(self._fields)
+        self.columns = tuple(column.label(name) for name, column in self._fields.items())
+        self.joins = tuple(joins)
+
+    def select(self, *extra_columns):
+        """SELECT of the schema's columns, then extra_columns (not dumped)."""
+        query = select(*self.columns, *extra_columns)
+        for target, onclause in self.joins:
+            query = query.join(target, onclause)
+        return query
+
+    def only(self, names):
+        """The same schema restricted to names, in that order."""
+        return Schema({name: self._fields[name] for name in names}, self.joins)
+
+    def dump(self, rows):
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in rows]
+
+    def dump_object(self, obj):
+        # For an already loaded model whose attributes have the field names
+        return {field: getattr(obj, field) for field in self.fields}
+
+
+_manager = aliased(User, name='manager')
+_employee = aliased(User, name='employee')
+
+# GET /api/feedback and /api/feedback/search
+FEEDBACK = Schema({
+    'id': Feedback.id,
+    'manager_id': Feedback.manager_id,
+    'employee_id': Feedback.employee_id,
+    'strengths': Feedback.strengths,
+    'areas_to_improve': Feedback.areas_to_improve,
+    'sentiment': Feedback.sentiment,
+    'created_at': Feedback.created_at,
+    'updated_at': Feedback.updated_at,
+    'acknowledged': Feedback.acknowledged,
+    'manager_name': _manager.username,
+    'employee_name': _employee.username,
+}, joins=[
+    (_manager, Feedback.manager_id == _manager.id),
+    (_employee, Feedback.employee_id == _employee.id),
+])
+
+# The same fields from feedback_archive, for ?include_archived=1
+FEEDBACK_ARCHIVE = Schema({
+    'id': FeedbackArchive.id,
+    'manager_id': FeedbackArchive.manager_id,
+    'employee_id': FeedbackArchive.employee_id,
+    'strengths': FeedbackArchive.strengths,
+    'areas_to_improve': FeedbackArchive.areas_to_improve,
+    'sentiment': FeedbackArchive.sentiment,
+    'created_at': FeedbackArchive.created_at,
+    'updated_at': FeedbackArchive.updated_at,
+    'acknowledged': FeedbackArchive.acknowledged,
+    'manager_name': _manager.username,
+    'employee_name': _employee.username,
+}, joins=[
+    (_manager, FeedbackArchive.manager_id == _manager.id),
+    (_employee, FeedbackArchive.employee_id == _employee.id),
+])
+
+# GET /api/dashboard recent feedback, named after the other party
+MANAGER_RECENT = Schema({
+    'id': Feedback.id,
+    'employee_name': _employee.username,
+    'sentiment': Feedback.sentiment,
+    'created_at': Feedback.created_at,
+    'acknowledged': Feedback.acknowledged,
+}, joins=[(_employee, Feedback.employee_id == _employee.id)])
+
+EMPLOYEE_RECENT = Schema({
+    'id': Feedback.id,
+    'manager_name': _manager.username,
+    'sentiment': Feedback.sentiment,
+    'created_at': Feedback.created_at,
+    'acknowledged': Feedback.acknowledged,
+}, joins=[(_manager, Feedback.manager_id == _manager.id)])
+
+# GET /api/users
+USER = Schema({
+    'id': User.id,
+    'username': User.username,
+    'email': User.email,
+    'role': User.role,
+})
+
+# GET /api/all-employees; ?fields= picks a subset
+EMPLOYEE = Schema({
+    'id': User.id,
+    'username': User.username,
+    'email': User.email,
+    'role': User.role,
+    'manager_id': User.manager_id,
+})
+
+# GET /api/feedback-requests
+FEEDBACK_REQUEST = Schema({
+    'id': FeedbackRequest.id,
+    'employee_id': FeedbackRequest.employee_id,
+    'employee_name': _employee.username,
+    'message': FeedbackRequest.message,
+    'created_at': FeedbackRequest.created_at,
+}, joins=[(_employee, FeedbackRequest.employee_id == _employee.id)])
+
+
+def _default(o):
+    # ISO 8601 like the routes always sent, not Flask's HTTP date format
+    if isinstance(o, date):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+def dumps(obj):
+    """Compact JSON text with keys in insertion order, e.g. for NDJSON lines."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, default=_default, separators=(',', ':'))
+
+
+def response_mimetype():
+    """The representation the current request asked for: JSON, unless
+    msgpack is installed and Accept prefers it (JSON wins ties)."""
+    if msgpack is None or not has_request_context():
+        return JSON_MIMETYPE
+    best = request.accept_mimetypes.best_match(
+        [JSON_MIMETYPE, MSGPACK_MIMETYPE, 'application/x-msgpack'], default=JSON_MIMETYPE)
+    return JSON_MIMETYPE if best == JSON_MIMETYPE else MSGPACK_MIMETYPE
+
+
+def packb(obj):
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """jsonify() through orjson when it is installed, or as MessagePack when
+    the client asks for it. JSON output matches the default provider apart
+    from whitespace."""
+
+    default = staticmethod(_default)
+
+    def _orjson(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return self._orjson(obj, indent=bool(kwargs.get('indent'))).decode()
+
+    def response(self, *args, **kwargs):
+        if response_mimetype() == MSGPACK_MIMETYPE:
+            response = self._app.response_class(packb(self._prepare_response_obj(args, kwargs)),
+                                                mimetype=MSGPACK_MIMETYPE)
+        elif orjson is None:
+            response = super().response(*args, **kwargs)
+        else:
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            response = self._app.response_class(self._orjson(obj, indent) + b'\n', mimetype=self.mimetype)
+        if msgpack is not None:
+            response.vary.add('Accept')
+        return response
+
+
+def init_app(app):
+    app.json = JSONProvider(app)
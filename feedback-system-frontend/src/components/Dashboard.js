@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import axios from 'axios';
+import useServerEvents from '../useServerEvents';
 import { 
   Users, 
   MessageSquare, 
@@ -34,8 +35,15 @@ const Dashboard = ({ user }) => {
     }
   }, []);
 
-  const fetchDashboardData = async (employeeId = null) => {
-    setLoading(true);
+  useServerEvents(
+    ['feedback_created', 'feedback_updated', 'feedback_acknowledged'],
+    () => fetchDashboardData(null, false)
+  );
+
+  const fetchDashboardData = async (employeeId = null, showSpinner = true) => {
+    if (showSpinner) {
+      setLoading(true);
+    }
     try {
       let url = '/dashboard';
       if (employeeId) {
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import { 
   MessageSquare, 
@@ -19,22 +19,35 @@ import {
 } from 'lucide-react';
 import axios from 'axios';
 import FeedbackModal from './FeedbackModal';
+import useServerEvents from '../useServerEvents';
+
+// Rows per request; the API pages its feedback listing
+const PAGE_SIZE = 50;
 
 const FeedbackList = ({ user }) => {
   const [feedback, setFeedback] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [editingFeedback, setEditingFeedback] = useState(null);
   const [showModal, setShowModal] = useState(false);
+  const loadedCount = useRef(0);
 
   useEffect(() => {
     fetchFeedback();
   }, []);
 
+  useServerEvents(['feedback_created', 'feedback_updated', 'feedback_acknowledged'], () => fetchFeedback());
+
+  // Reload from the start, keeping as many rows as are already shown
   const fetchFeedback = async () => {
     try {
-      const response = await axios.get('/feedback');
+      const limit = Math.max(PAGE_SIZE, loadedCount.current);
+      const response = await axios.get('/feedback', { params: { limit } });
+      loadedCount.current = response.data.feedback.length;
       setFeedback(response.data.feedback);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       setError('Failed to load feedback');
       console.error('Feedback error:', error);
@@ -43,6 +56,20 @@ const FeedbackList = ({ user }) => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await axios.get('/feedback', { params: { limit: PAGE_SIZE, after: nextCursor } });
+      loadedCount.current += response.data.feedback.length;
+      setFeedback((current) => [...current, ...response.data.feedback]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Feedback error:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleAcknowledge = async (feedbackId) => {
     try {
       await axios.post(`/feedback/${feedbackId}/acknowledge`);
@@ -276,6 +303,17 @@ const FeedbackList = ({ user }) => {
                 </div>
               </div>
             ))}
+            {nextCursor && (
+              <div className="flex justify-center">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="px-6 py-3 bg-white/10 text-white font-medium rounded-xl border border-white/20 hover:bg-white/20 focus:outline-none focus:ring-2 focus:ring-white/50 transition-all duration-200 disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more'}
+                </button>
+              </div>
+            )}
           </div>
         )}
 
@@ -14,6 +14,7 @@ import {
 } from 'lucide-react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
+import useServerEvents from '../useServerEvents';
 
 const FeedbackRequests = () => {
   const [requests, setRequests] = useState([]);
@@ -26,8 +27,13 @@ const FeedbackRequests = () => {
     fetchRequests();
   }, []);
 
-  const fetchRequests = async () => {
-    setLoading(true);
+  // New requests are pushed by the server instead of polled for
+  useServerEvents(['feedback_requested'], () => fetchRequests(false));
+
+  const fetchRequests = async (showSpinner = true) => {
+    if (showSpinner) {
+      setLoading(true);
+    }
     setError('');
     try {
       const res = await axios.get('/feedback-requests', { withCredentials: true });
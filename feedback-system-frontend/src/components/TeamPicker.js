@@ -1,6 +1,11 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
-import { Users, CheckCircle, AlertCircle, UserPlus, Mail, Shield } from 'lucide-react';
+import { Users, CheckCircle, AlertCircle, UserPlus, Mail, Shield, Search } from 'lucide-react';
+
+// The directory can hold tens of thousands of employees, so it is fetched a
+// page at a time with only the columns this picker shows
+const PAGE_SIZE = 50;
+const FIELDS = 'id,username,email,manager_id';
 
 const TeamPicker = () => {
   const [employees, setEmployees] = useState([]);
@@ -8,23 +13,45 @@ const TeamPicker = () => {
   const [loading, setLoading] = useState(true);
   const [success, setSuccess] = useState('');
   const [error, setError] = useState('');
+  const [query, setQuery] = useState('');
+  const [unassignedOnly, setUnassignedOnly] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
-    fetchEmployees();
-  }, []);
+    // Wait for a pause in typing before searching
+    const timer = setTimeout(() => fetchEmployees(), 300);
+    return () => clearTimeout(timer);
+  }, [query, unassignedOnly]);
 
-  const fetchEmployees = async () => {
-    setLoading(true);
+  const fetchEmployees = async (after = null) => {
+    const params = { limit: PAGE_SIZE, fields: FIELDS };
+    if (query.trim()) {
+      params.q = query.trim();
+    }
+    if (unassignedOnly) {
+      params.unassigned = 1;
+    }
+    if (after) {
+      params.after = after;
+    }
     try {
-      const res = await axios.get('/all-employees', { withCredentials: true });
-      setEmployees(res.data.employees);
+      const res = await axios.get('/all-employees', { params, withCredentials: true });
+      setEmployees((prev) => (after ? [...prev, ...res.data.employees] : res.data.employees));
+      setNextCursor(res.data.next_cursor);
     } catch (err) {
       setError('Failed to fetch employees');
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
+  const handleLoadMore = () => {
+    setLoadingMore(true);
+    fetchEmployees(nextCursor);
+  };
+
   const handleSelect = (id) => {
     setSelected((prev) =>
       prev.includes(id) ? prev.filter((sid) => sid !== id) : [...prev, id]
@@ -115,6 +142,28 @@ const TeamPicker = () => {
             </div>
           )}
 
+          {/* Search and Filters */}
+          <div className="mb-6 flex items-center space-x-4">
+            <div className="relative flex-1">
+              <Search className="w-4 h-4 text-gray-400 absolute left-3 top-1/2 transform -translate-y-1/2" />
+              <input
+                type="text"
+                value={query}
+                onChange={(e) => setQuery(e.target.value)}
+                placeholder="Search by username or email"
+                className="w-full pl-10 pr-4 py-2 bg-white/5 border border-white/20 rounded-lg text-white placeholder-gray-400 focus:outline-none focus:ring-2 focus:ring-slate-500"
+              />
+            </div>
+            <label className="flex items-center space-x-2 text-gray-300 text-sm cursor-pointer">
+              <input
+                type="checkbox"
+                checked={unassignedOnly}
+                onChange={(e) => setUnassignedOnly(e.target.checked)}
+              />
+              <span>Unassigned only</span>
+            </label>
+          </div>
+
           {/* Employee List */}
           <div className="space-y-3 mb-6">
             {employees.length === 0 ? (
@@ -195,6 +244,18 @@ const TeamPicker = () => {
             )}
           </div>
 
+          {nextCursor && (
+            <div className="flex justify-center mb-6">
+              <button
+                onClick={handleLoadMore}
+                disabled={loadingMore}
+                className="px-4 py-2 bg-white/10 border border-white/20 rounded-lg text-gray-300 hover:bg-white/20 transition-all duration-200 disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
+
           {/* Action Button */}
           <div className="flex justify-center">
             <button
@@ -0,0 +1,77 @@
+import { useEffect, useRef } from 'react';
+import axios from 'axios';
+
+// One EventSource on /api/events, shared by every mounted component that
+// listens, and closed when the last one unmounts.
+let source = null;
+let retryTimer = null;
+// [type, listener] pairs of every mounted component, re-added on reopen
+const subscriptions = new Set();
+
+// The browser reconnects by itself when a stream drops, but gives up when the
+// server refuses one (503 while the worker has EVENTS_MAX_STREAMS open)
+const REOPEN_DELAY_MS = 30000;
+
+const open = () => {
+  source = new EventSource(`${axios.defaults.baseURL}/events`, { withCredentials: true });
+  subscriptions.forEach(([type, listener]) => source.addEventListener(type, listener));
+  source.onerror = () => {
+    if (source && source.readyState === EventSource.CLOSED) {
+      source = null;
+      retryTimer = setTimeout(() => {
+        retryTimer = null;
+        if (subscriptions.size > 0) {
+          open();
+        }
+      }, REOPEN_DELAY_MS);
+    }
+  };
+};
+
+const subscribe = (pairs) => {
+  pairs.forEach((pair) => {
+    subscriptions.add(pair);
+    if (source) {
+      source.addEventListener(...pair);
+    }
+  });
+  if (!source && !retryTimer) {
+    open();
+  }
+};
+
+const unsubscribe = (pairs) => {
+  pairs.forEach((pair) => {
+    subscriptions.delete(pair);
+    if (source) {
+      source.removeEventListener(...pair);
+    }
+  });
+  if (subscriptions.size === 0) {
+    if (source) {
+      source.close();
+      source = null;
+    }
+    clearTimeout(retryTimer);
+    retryTimer = null;
+  }
+};
+
+// Calls onEvent(type, data) whenever the server pushes one of `types`
+const useServerEvents = (types, onEvent) => {
+  const handler = useRef(onEvent);
+  handler.current = onEvent;
+  const key = types.join(',');
+
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') {
+      return undefined;
+    }
+    const listener = (event) => handler.current(event.type, JSON.parse(event.data));
+    const pairs = key.split(',').map((type) => [type, listener]);
+    subscribe(pairs);
+    return () => unsubscribe(pairs);
+  }, [key]);
+};
+
+export default useServerEvents;